@@ -0,0 +1,69 @@
+"""
+Benchmark Django admin changelist load time for the Transaction table
+
+Usage (PostgreSQL recommended, the row estimate is PostgreSQL-only):
+    DATABASE_URL=postgres://... python benchmarks/admin_changelist.py [rows]
+
+Seeds a benchmark user up to the requested number of rows (default 10M) and
+times the changelist unfiltered, filtered by user and filtered by category.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from finances.models import Transaction
+from finances.seeding import seed_transactions, seed_user
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+REPEAT = 5
+
+
+def timed_get(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return min(timings), sorted(timings)[len(timings) // 2], len(queries)
+
+
+settings.ALLOWED_HOSTS.append('testserver')
+user = seed_user('bench')
+existing = Transaction.objects.filter(user=user).count()
+if existing < ROWS:
+    print(f"Seeding {ROWS - existing:,} transactions...")
+    seed_transactions(user, ROWS - existing, seed=existing)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE finances_transaction')
+
+admin_user, _ = User.objects.get_or_create(username='bench-admin', defaults={'is_staff': True, 'is_superuser': True})
+client = Client()
+client.force_login(admin_user)
+category = user.categories.first()
+
+print("=" * 50)
+print(f"ADMIN CHANGELIST ({connection.vendor}, {ROWS:,} rows)")
+print("=" * 50)
+for label, url in [
+    ('unfiltered', '/admin/finances/transaction/'),
+    ('by username', '/admin/finances/transaction/?username=bench'),
+    ('by category', f'/admin/finances/transaction/?username=bench&category={category.id}'),
+    ('page 50', '/admin/finances/transaction/?p=50'),
+]:
+    best, median, queries = timed_get(client, url)
+    print(f"{label:<14} best {best * 1000:8.1f} ms   median {median * 1000:8.1f} ms   {queries} queries")
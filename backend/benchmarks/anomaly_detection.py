@@ -0,0 +1,58 @@
+"""
+Benchmark the duplicate and outlier detection job
+
+Usage:
+    DATABASE_URL=postgres://... python benchmarks/anomaly_detection.py [rows]
+
+Seeds a benchmark user up to the requested number of rows (default 10M), copies
+about 1% of them a day later to plant duplicates, then times a full
+detect_anomalies run and reports throughput.
+"""
+import os
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+django.setup()
+
+from django.db import connection
+from finances.anomalies import detect_anomalies
+from finances.models import Transaction, TransactionFlag
+from finances.seeding import seed_transactions, seed_user
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+PLANTED_EVERY = 100
+
+user = seed_user('bench-anomalies')
+existing = Transaction.objects.filter(user=user).count()
+if existing < ROWS:
+    print(f"Seeding {ROWS - existing:,} transactions...")
+    seed_transactions(user, ROWS - existing, seed=existing)
+    originals = Transaction.objects.filter(user=user).order_by('id')[::PLANTED_EVERY]
+    Transaction.objects.bulk_create([
+        Transaction(
+            user=user, ledger_id=row.ledger_id, type=row.type, category_id=row.category_id, amount=row.amount,
+            currency=row.currency, date=row.date + timedelta(days=1), description=row.description,
+        )
+        for row in originals
+    ], batch_size=50_000)
+
+TransactionFlag.objects.filter(user=user).delete()
+queryset = Transaction.objects.filter(user=user)
+
+start = time.perf_counter()
+rows, duplicates, outliers = detect_anomalies(queryset)
+elapsed = time.perf_counter() - start
+
+print("=" * 50)
+print(f"ANOMALY DETECTION ({connection.vendor}, {rows:,} rows)")
+print("=" * 50)
+print(f"elapsed     {elapsed:10.1f} s")
+print(f"throughput  {rows / elapsed:10,.0f} rows/s")
+print(f"duplicates  {duplicates:10,}")
+print(f"outliers    {outliers:10,}")
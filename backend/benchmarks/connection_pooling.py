@@ -0,0 +1,107 @@
+"""
+Benchmark API throughput with per-request, persistent and pooled connections
+
+Usage:
+    DATABASE_URL=postgres://... python benchmarks/connection_pooling.py [requests] [threads]
+
+Sends the same authenticated requests (default 2,000 across 8 threads) through
+Django's full request cycle in each configuration. Settings read the connection
+options from the environment, so every configuration runs in a fresh process:
+
+    per-request  DB_CONN_MAX_AGE=0, a new connection for every request
+    persistent   DB_CONN_MAX_AGE=60 with health checks
+    pool         DB_POOL_MAX_SIZE=<threads>, psycopg's pool (PostgreSQL with
+                 psycopg 3 and psycopg-pool installed)
+
+Opening a connection is nearly free on SQLite; run this against PostgreSQL,
+preferably over TCP, to see what connection setup costs.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import django
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+# Measure connection handling, not the per-user request throttle
+os.environ.setdefault('THROTTLE_USER_RATE', '1000000/min')
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+URLS = ['/api/categories/', '/api/transactions/', '/api/budgets/current_month/']
+MODES = {
+    'per-request': {'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'True'},
+    'pool': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_MAX_SIZE': str(THREADS)},
+}
+
+
+def run_requests(token):
+    """Child process: fire REQUESTS requests from THREADS threads and print requests/s"""
+    from rest_framework.test import APIClient
+
+    errors = []
+
+    def worker(count):
+        client = APIClient(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token}')
+        for i in range(count):
+            response = client.get(URLS[i % len(URLS)])
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(REQUESTS // THREADS,)) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f'{REQUESTS // THREADS * THREADS / elapsed:.0f} {len(errors)}')
+
+
+def pool_available():
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    from django.db import connection
+    return connection.vendor == 'postgresql'
+
+
+if __name__ == '__main__' and len(sys.argv) > 3 and sys.argv[3] == '--child':
+    django.setup()
+    run_requests(sys.argv[4])
+    sys.exit()
+
+django.setup()
+
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from finances.seeding import seed_transactions, seed_user
+from finances.models import Transaction
+
+user = seed_user('bench_pooling')
+if not Transaction.objects.filter(user=user).exists():
+    seed_transactions(user, 10_000)
+token, _ = Token.objects.get_or_create(user=user)
+has_pool = pool_available()
+connection.close()
+
+print("=" * 50)
+print(f"CONNECTION MODES ({connection.vendor}, {REQUESTS:,} requests, {THREADS} threads)")
+print("=" * 50)
+for mode, env in MODES.items():
+    if mode == 'pool' and not has_pool:
+        print(f"{mode:>12}: skipped (needs PostgreSQL with psycopg 3 and psycopg-pool)")
+        continue
+    output = subprocess.run(
+        [sys.executable, __file__, str(REQUESTS), str(THREADS), '--child', token.key],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    rate, errors = output[-2:]
+    print(f"{mode:>12}: {rate:>6} requests/s" + (f" ({errors} errors)" if errors != '0' else ''))
@@ -0,0 +1,52 @@
+"""
+Benchmark job queue throughput across worker processes
+
+Usage:
+    DATABASE_URL=postgres://... python benchmarks/job_queue.py [jobs] [processes ...]
+
+Enqueues no-op jobs (default 5,000) and drains them with 1, 2 and 4
+``runworker --burst`` processes by default, reporting jobs per second. No-op
+jobs make this a measure of claim/complete overhead, not handler speed.
+"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import django
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+django.setup()
+
+from django.db import connection
+from finances.models import Job
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+PROCESSES = [int(arg) for arg in sys.argv[2:]] or [1, 2, 4]
+
+print("=" * 50)
+print(f"JOB QUEUE ({connection.vendor}, {JOBS:,} no-op jobs)")
+print("=" * 50)
+for processes in PROCESSES:
+    Job.objects.filter(kind='noop').delete()
+    Job.objects.bulk_create([Job(kind='noop') for _ in range(JOBS)], batch_size=5_000)
+    connection.close()
+
+    start = time.perf_counter()
+    workers = [
+        subprocess.Popen(
+            [sys.executable, 'manage.py', 'runworker', '--burst', '--kind', 'noop'],
+            cwd=BACKEND, stdout=subprocess.DEVNULL
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.wait()
+    elapsed = time.perf_counter() - start
+
+    done = Job.objects.filter(kind='noop', status='succeeded').count()
+    print(f"{processes} process(es)  {elapsed:7.2f} s   {done / elapsed:8,.0f} jobs/s   {done:,} succeeded")
+Job.objects.filter(kind='noop').delete()
@@ -0,0 +1,78 @@
+"""
+Benchmark ledger access checks on shared-ledger reads
+
+Usage:
+    DATABASE_URL=postgres://... python benchmarks/ledger_permissions.py [rows ...]
+
+Seeds a shared ledger up to each row count (default 1k, 10k and 100k) and has
+an editor read it through the X-Ledger header. For every endpoint the query
+count must stay flat across sizes, with one memberships query on a cold cache
+and none once access is cached: access is checked per request, not per row.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+os.environ.setdefault('THROTTLE_USER_RATE', '1000000/min')
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from finances.category_ops import create_default_categories
+from finances.models import Ledger, LedgerMembership, Transaction
+from finances.seeding import seed_transactions, seed_user
+
+SIZES = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+URLS = [
+    '/api/transactions/',
+    '/api/transactions/summary/',
+    '/api/categories/',
+    '/api/sync/?limit=2000',
+]
+
+
+def measure(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.status_code
+    checks = sum('ledgermembership' in query['sql'] for query in queries.captured_queries)
+    return elapsed, len(queries), checks
+
+
+settings.ALLOWED_HOSTS.append('testserver')
+owner, member = seed_user('bench-owner'), seed_user('bench-member')
+ledger, created = Ledger.objects.get_or_create(owner=owner, name='Bench household', is_personal=False)
+if created:
+    LedgerMembership.objects.create(ledger=ledger, user=owner, role='owner')
+    LedgerMembership.objects.create(ledger=ledger, user=member, role='editor')
+    create_default_categories(owner, ledger)
+
+client = APIClient(HTTP_X_LEDGER=str(ledger.pk))
+client.force_authenticate(user=member)
+
+print("=" * 78)
+print(f"SHARED LEDGER READS ({connection.vendor})")
+print("=" * 78)
+print(f"{'rows':>9}  {'endpoint':<28} {'cold ms':>8} {'queries':>8} {'warm ms':>8} {'queries':>8} {'checks':>7}")
+for size in SIZES:
+    existing = Transaction.objects.filter(ledger=ledger).count()
+    if existing < size:
+        seed_transactions(owner, size - existing, seed=existing, ledger=ledger)
+    for url in URLS:
+        cache.clear()
+        cold, cold_queries, cold_checks = measure(client, url)
+        warm, warm_queries, warm_checks = measure(client, url)
+        print(
+            f"{size:>9,}  {url:<28} {cold * 1000:8.1f} {cold_queries:8} "
+            f"{warm * 1000:8.1f} {warm_queries:8} {cold_checks:>3}/{warm_checks}"
+        )
@@ -0,0 +1,73 @@
+"""
+Benchmark response encoding time and size for a large transaction page
+
+Usage:
+    DATABASE_URL=sqlite:///bench.sqlite3 python benchmarks/response_encoding.py [rows]
+
+Serializes one page of transactions (default 10,000 rows) with
+TransactionSerializer, then encodes it with DRF's JSONRenderer, the orjson
+renderer and (if installed) MessagePack, and compresses each body with gzip
+and (if installed) brotli. Reports the best of several runs.
+"""
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from finances.compression import BROTLI_QUALITY, brotli
+from finances.models import Transaction
+from finances.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from finances.seeding import seed_transactions, seed_user
+from finances.serializers import TransactionSerializer
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+REPEAT = 5
+
+
+def best_of(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+
+user = seed_user('bench_encoding')
+missing = ROWS - Transaction.objects.filter(user=user).count()
+if missing > 0:
+    seed_transactions(user, missing, seed=missing)
+
+request = Request(APIRequestFactory().get('/api/transactions/'))
+request.user = user
+rows = list(Transaction.objects.filter(user=user).select_related('category')[:ROWS])
+serialize_ms, data = best_of(lambda: TransactionSerializer(rows, many=True, context={'request': request}).data)
+page = {'count': ROWS, 'next': None, 'previous': None, 'results': data}
+
+renderers = {'DRF JSONRenderer': JSONRenderer(), 'orjson': ORJSONRenderer()}
+if msgpack is not None:
+    renderers['MessagePack'] = MessagePackRenderer()
+
+print("=" * 72)
+print(f"RESPONSE ENCODING ({ROWS:,} transactions, serializer {serialize_ms:.0f} ms)")
+print("=" * 72)
+print(f"{'format':<18}{'encode ms':>10}{'bytes':>12}{'gzip':>12}{'gzip ms':>9}{'br':>12}{'br ms':>8}")
+for name, renderer in renderers.items():
+    encode_ms, body = best_of(lambda: renderer.render(page))
+    gzip_ms, gzipped = best_of(lambda: gzip.compress(body, compresslevel=6))
+    line = f"{name:<18}{encode_ms:>10.1f}{len(body):>12,}{len(gzipped):>12,}{gzip_ms:>9.1f}"
+    if brotli is not None:
+        brotli_ms, compressed = best_of(lambda: brotli.compress(body, quality=BROTLI_QUALITY))
+        line += f"{len(compressed):>12,}{brotli_ms:>8.1f}"
+    print(line)
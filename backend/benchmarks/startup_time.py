@@ -0,0 +1,116 @@
+"""
+Benchmark backend cold start: import profile and time to first request
+
+Usage:
+    python benchmarks/startup_time.py [runs]
+
+Every measurement runs in fresh processes (default 5 runs, median reported):
+
+    import profile    ``python -X importtime`` of loading the WSGI application and
+                      its URLconf, i.e. everything a worker imports before it can
+                      answer; lists the packages that cost the most
+    cold worker       process start to the first response, as a worker started
+                      without ``preload_app`` sees it
+    preloaded worker  fork to the first response in a worker forked from a master
+                      that ran ``warm_up()``, as gunicorn.conf.py does with
+                      ``preload_app``
+
+The first request is an anonymous GET of the API root. It passes through every
+middleware, URL resolution and DRF's authentication without touching the database.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+ENV = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'budget_tracker.settings'}
+
+LOAD = 'from budget_tracker.wsgi import application; from django.urls import get_resolver; get_resolver().url_patterns'
+
+FIRST_REQUEST = '''
+from wsgiref.util import setup_testing_defaults
+from budget_tracker.wsgi import application
+
+def first_request():
+    environ = {'PATH_INFO': '/api/', 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    assert statuses[0].startswith(('200', '401')), statuses[0]
+'''
+
+COLD = FIRST_REQUEST.replace('from budget_tracker.wsgi import application\n', '') + '''
+from budget_tracker.wsgi import application
+first_request()
+'''
+
+PRELOADED = FIRST_REQUEST + '''
+import os, time
+from budget_tracker.warmup import warm_up
+warm_up()
+start = time.perf_counter()
+if os.fork() == 0:
+    first_request()
+    print(time.perf_counter() - start)
+    os._exit(0)
+os.wait()
+'''
+
+
+def python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND, env=ENV, capture_output=True, text=True, check=True
+    )
+
+
+def import_profile():
+    """(total seconds, {top-level package: seconds}) from one -X importtime run"""
+    stderr = python('-X', 'importtime', '-c', LOAD).stderr
+    packages = Counter()
+    for match in re.finditer(r'import time:\s+(\d+) \|\s+\d+ \| ( *)(\S+)', stderr):
+        packages[match.group(3).split('.')[0]] += int(match.group(1)) / 1e6
+    return sum(packages.values()), packages
+
+
+def cold_worker():
+    # The child starts timing before the interpreter does, so this includes its startup
+    start = time.perf_counter()
+    python('-c', COLD)
+    return time.perf_counter() - start
+
+
+def preloaded_worker():
+    return float(python('-c', PRELOADED).stdout.split()[-1])
+
+
+def median_ms(measure):
+    return statistics.median(measure() for _ in range(RUNS)) * 1000
+
+
+profiles = [import_profile() for _ in range(RUNS)]
+total = statistics.median(total for total, _ in profiles)
+packages = Counter()
+for _, counts in profiles:
+    packages.update(counts)
+
+print("=" * 50)
+print(f"IMPORT PROFILE (median of {RUNS} runs)")
+print("=" * 50)
+print(f"{'total':>24}: {total * 1000:7.1f} ms")
+for name, seconds in packages.most_common(12):
+    print(f"{name:>24}: {seconds / RUNS * 1000:7.1f} ms")
+
+print("=" * 50)
+print(f"TIME TO FIRST REQUEST (median of {RUNS} runs)")
+print("=" * 50)
+print(f"{'cold worker':>24}: {median_ms(cold_worker):7.1f} ms")
+if hasattr(os, 'fork'):
+    print(f"{'preloaded worker':>24}: {median_ms(preloaded_worker):7.1f} ms")
+else:
+    print(f"{'preloaded worker':>24}: skipped (needs os.fork)")
@@ -0,0 +1,75 @@
+"""
+Benchmark the summary endpoint with single- and mixed-currency transactions
+
+Usage:
+    DATABASE_URL=postgres://... python benchmarks/summary_currency.py [rows]
+
+Seeds two users with the same number of rows (default 1M), one with every
+transaction in the base currency and one spread over four currencies with a
+year of daily rates, then times the summary endpoint for each.
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from finances.models import ExchangeRate, Transaction
+from finances.seeding import seed_transactions, seed_user
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+REPEAT = 5
+CURRENCIES = [settings.DEFAULT_CURRENCY, 'EUR', 'GBP', 'JPY']
+
+
+def seed_rates(days=3 * 365):
+    start = date.today() - timedelta(days=days)
+    base_rates = {'EUR': Decimal('1.08'), 'GBP': Decimal('1.27'), 'JPY': Decimal('0.0067'), 'INR': Decimal('0.012')}
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency=currency, date=start + timedelta(days=offset), rate=rate)
+        for currency, rate in base_rates.items()
+        if currency != settings.FX_PIVOT_CURRENCY
+        for offset in range(days + 1)
+    ], ignore_conflicts=True)
+
+
+def timed_summary(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    timings = []
+    for _ in range(REPEAT):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get('/api/transactions/summary/')
+            timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return min(timings), sorted(timings)[len(timings) // 2], len(queries)
+
+
+settings.ALLOWED_HOSTS.append('testserver')
+seed_rates()
+for username, currencies in [('bench-single', None), ('bench-mixed', CURRENCIES)]:
+    user = seed_user(username)
+    existing = Transaction.objects.filter(user=user).count()
+    if existing < ROWS:
+        print(f"Seeding {ROWS - existing:,} transactions for {username}...")
+        seed_transactions(user, ROWS - existing, seed=existing, currencies=currencies)
+
+print("=" * 50)
+print(f"SUMMARY BY CURRENCY MIX ({connection.vendor}, {ROWS:,} rows per user)")
+print("=" * 50)
+for username in ['bench-single', 'bench-mixed']:
+    user = seed_user(username)
+    best, median, queries = timed_summary(user)
+    print(f"{username:<14} best {best * 1000:8.1f} ms   median {median * 1000:8.1f} ms   {queries} queries")
@@ -2,6 +2,8 @@
 ASGI config for budget_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the server-sent events stream are dispatched to
+``finances.sse.event_stream``; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -12,6 +14,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget_tracker.settings')
+# Read by the settings to default DB_CONN_MAX_AGE to 0
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
 
+from finances.sse import EVENTS_PATH, event_stream  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
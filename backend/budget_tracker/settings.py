@@ -2,9 +2,11 @@
 Django settings for budget_tracker project.
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'finances.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,6 +50,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'finances.replicas.StickyWritesMiddleware',
+    'finances.throttling.RateLimitHeadersMiddleware',
+    'finances.audit.AuditMiddleware',
 ]
 
 ROOT_URLCONF = 'budget_tracker.urls'
@@ -73,10 +79,85 @@ WSGI_APPLICATION = 'budget_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are reused for DB_CONN_MAX_AGE seconds and health-checked before
+# reuse. Setting DB_POOL_MAX_SIZE switches PostgreSQL to psycopg's connection pool
+# instead (needs psycopg 3 with psycopg-pool); Django requires CONN_MAX_AGE = 0 then.
+# Under ASGI (asgi.py sets SERVER_INTERFACE) requests are not pinned to one thread,
+# so reused connections would pile up per thread; there the default is 0.
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
 DATABASES = {
-    'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
+    'default': dj_database_url.config(
+        default=os.environ.get('DATABASE_URL'),
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '0' if SERVER_INTERFACE == 'asgi' else '60')),
+        conn_health_checks=os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    )
 }
 
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.postgresql' and os.environ.get('DB_POOL_MAX_SIZE'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }
+
+# Read replicas
+# Each URL in the comma-separated REPLICA_DATABASE_URLS becomes an alias replica_1,
+# replica_2, ...; views opt in to reading from them, and a user's reads stay on the
+# primary for REPLICA_STICKY_SECONDS after they write
+REPLICA_DATABASES = []
+for index, url in enumerate(filter(None, os.environ.get('REPLICA_DATABASE_URLS', '').split(',')), start=1):
+    replica = dj_database_url.parse(
+        url,
+        conn_max_age=DATABASES['default'].get('CONN_MAX_AGE', 0),
+        conn_health_checks=DATABASES['default'].get('CONN_HEALTH_CHECKS', False),
+    )
+    if 'pool' in DATABASES['default'].get('OPTIONS', {}):
+        replica.setdefault('OPTIONS', {})['pool'] = DATABASES['default']['OPTIONS']['pool']
+    # Tests read the replica aliases from the test copy of the primary
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{index}'] = replica
+    REPLICA_DATABASES.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['finances.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+
+# Queries behind the summary endpoints are cancelled after this many milliseconds
+# (PostgreSQL only; 0 disables the limit)
+SUMMARY_STATEMENT_TIMEOUT = int(os.environ.get('SUMMARY_STATEMENT_TIMEOUT_MS', '10000'))
+
+# SQLite test databases use a file so threaded concurrency tests get real file
+# locking (with a busy timeout) instead of shared-cache table locks
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', BASE_DIR / 'test_db.sqlite3')
+
+
+# Cache
+# Holds the per-user dashboard hot cache; set REDIS_URL (with the redis package
+# installed) to share it between processes instead of keeping one per process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Seconds a user's ledger memberships stay cached. A membership change drops the
+# entry at once, but from an in-process cache only in the process that made it,
+# so without Redis other processes keep a removed member's access this long
+LEDGER_ACCESS_CACHE_SECONDS = int(
+    os.environ.get('LEDGER_ACCESS_CACHE_SECONDS', '3600' if os.environ.get('REDIS_URL') else '5')
+)
+
+
+# Testing
+# Skips the perf-tagged suite unless it is requested with --tag perf
+TEST_RUNNER = 'finances.test_runner.FinanceTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,8 +217,54 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson for JSON, plus MessagePack (Accept: application/msgpack) when msgpack is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'finances.renderers.ORJSONRenderer',
+        *(['finances.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'finances.renderers.ORJSONParser',
+        *(['finances.renderers.MessagePackParser'] if find_spec('msgpack') else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Budgets in cost units per window (see THROTTLE_COSTS); counters live in the cache
+    'DEFAULT_THROTTLE_CLASSES': [
+        'finances.throttling.UserCostThrottle',
+        'finances.throttling.AnonCostThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get('THROTTLE_USER_RATE', '600/min'),
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '60/min'),
+        'auth': os.environ.get('THROTTLE_AUTH_RATE', '10/min'),
+    },
 }
 
+# Units a request marked with @throttle_cost spends; everything else costs 1
+THROTTLE_COSTS = {
+    'summary': 10,
+    'export': 10,
+    'job': 20,
+    'import': 20,
+}
+
+
+# Currency Settings
+# Transactions default to DEFAULT_CURRENCY; ExchangeRate rows are quoted against FX_PIVOT_CURRENCY
+DEFAULT_CURRENCY = os.environ.get('DEFAULT_CURRENCY', 'USD')
+FX_PIVOT_CURRENCY = os.environ.get('FX_PIVOT_CURRENCY', 'USD')
+
+
+# Live Events
+# Broker for /api/events/; the local broker only reaches clients of the same process
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'finances.events.LocalBroker')
+
+
+# Delta Sync
+# Tombstones of deleted rows are kept this long; older /api/sync/ tokens must start over
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
+
 
 # CORS Settings
 CORS_ALLOWED_ORIGINS = os.environ.get(
@@ -147,3 +274,6 @@ CORS_ALLOWED_ORIGINS = os.environ.get(
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Clients pick a shared ledger with the X-Ledger header
+CORS_ALLOW_HEADERS = (*default_headers, 'x-ledger')
+
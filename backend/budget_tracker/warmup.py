@@ -0,0 +1,17 @@
+"""
+Import up front what a process would otherwise import on its first request.
+
+Django loads the URLconf -- and with it every view module, DRF's generic views,
+routers and django-filter -- when the first request arrives, and NumPy waits
+for the first forecast. ``warm_up`` does both right away. Gunicorn calls it in
+the master when ``preload_app`` is on (see ``gunicorn.conf.py``), so forked
+workers start with everything imported, share those pages with the master, and
+answer their first request at warm speed.
+"""
+from django.urls import get_resolver
+
+
+def warm_up():
+    """Load the URLconf and the lazily imported modules. Makes no database queries."""
+    get_resolver().url_patterns
+    import numpy  # noqa: F401  (imported lazily by finances.forecasting)
@@ -1,25 +1,227 @@
+import csv
+from collections import defaultdict
+
 from django.contrib import admin
-from .models import Category, Transaction, Budget
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from . import audit
+from .models import AuditEntry, Category, Job, Ledger, LedgerMembership, SavingsGoal, Transaction, TransactionFlag, Budget
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids a full COUNT(*) on large unfiltered tables.
+
+    On PostgreSQL the planner's row estimate from pg_class.reltuples is used when
+    the changelist has no filters applied; filtered querysets and other database
+    backends fall back to an exact count.
+    """
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Free-text sidebar filter, used instead of listing every related object"""
+    template = 'admin/finances/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # A non-empty lookup list is required for the filter to be rendered
+        return ((),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        params = changelist.get_filters_params()
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, values in params.items() if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield all_choice
+
+
+class UsernameFilter(InputFilter):
+    title = 'username'
+    parameter_name = 'username'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(user__username=self.value())
+
+
+class CurrencyFilter(InputFilter):
+    # A plain 'currency' filter would read every distinct currency of the table
+    title = 'currency'
+    parameter_name = 'currency'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(currency=self.value().strip().upper())
+
+
+class UserCategoryFilter(admin.SimpleListFilter):
+    """Category choices for the selected user only, hidden until a user is picked"""
+    title = 'category'
+    parameter_name = 'category'
+
+    def lookups(self, request, model_admin):
+        username = request.GET.get(UsernameFilter.parameter_name)
+        if not username:
+            return []
+        return Category.objects.filter(user__username=username).values_list('id', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(category_id=self.value())
+
+
+class LedgerMembershipInline(admin.TabularInline):
+    model = LedgerMembership
+    autocomplete_fields = ['user']
+    extra = 0
+
+
+@admin.register(Ledger)
+class LedgerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'is_personal', 'created_at']
+    list_filter = ['is_personal', 'created_at']
+    list_select_related = ['owner']
+    search_fields = ['name', 'owner__username']
+    autocomplete_fields = ['owner']
+    inlines = [LedgerMembershipInline]
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'type', 'user', 'created_at']
-    list_filter = ['type', 'created_at']
+    list_display = ['name', 'type', 'parent', 'user', 'is_archived', 'created_at']
+    list_filter = ['type', 'is_archived', 'created_at']
+    list_select_related = ['parent', 'user']
     search_fields = ['name', 'user__username']
+    autocomplete_fields = ['user', 'ledger', 'parent']
+    actions = ['archive_categories', 'restore_categories']
+
+    @admin.action(description='Archive selected categories')
+    def archive_categories(self, request, queryset):
+        updated = self._set_archived(queryset, True)
+        self.message_user(request, f'{updated} categories archived.')
+
+    @admin.action(description='Restore selected categories')
+    def restore_categories(self, request, queryset):
+        updated = self._set_archived(queryset, False)
+        self.message_user(request, f'{updated} categories restored.')
+
+    def _set_archived(self, queryset, archived):
+        # A set-based UPDATE sends no signals, so the changed rows are logged here, per ledger
+        changing = queryset.exclude(is_archived=archived)
+        changes = defaultdict(dict)
+        for pk, ledger_id in changing.values_list('pk', 'ledger_id'):
+            changes[ledger_id][pk] = {'is_archived': [not archived, archived]}
+        with transaction.atomic():
+            updated = changing.update(is_archived=archived, updated_at=timezone.now())
+            for ledger_id, changes_by_id in changes.items():
+                audit.record_updated(Category, ledger_id, changes_by_id)
+        return updated
+
+
+class Echo:
+    """File-like object that hands each written row straight back to the caller"""
+    def write(self, value):
+        return value
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['date', 'type', 'amount', 'category', 'user', 'created_at']
-    list_filter = ['type', 'date', 'category', 'created_at']
-    search_fields = ['description', 'user__username', 'category__name']
-    date_hierarchy = 'date'
+    list_display = ['date', 'type', 'amount', 'currency', 'category', 'user', 'created_at']
+    list_filter = ['type', CurrencyFilter, 'date', UsernameFilter, UserCategoryFilter]
+    list_select_related = ['category', 'user']
+    search_fields = ['=user__username', '^category__name', 'description']
+    autocomplete_fields = ['user', 'ledger', 'category']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['export_as_csv']
+
+    @admin.action(description='Export selected transactions as CSV')
+    def export_as_csv(self, request, queryset):
+        writer = csv.writer(Echo())
+        columns = ['id', 'user__username', 'date', 'type', 'amount', 'currency', 'category__name', 'description']
+        
+        def rows():
+            yield writer.writerow(['id', 'user', 'date', 'type', 'amount', 'currency', 'category', 'description'])
+            for row in queryset.values_list(*columns).order_by('id').iterator(chunk_size=2000):
+                yield writer.writerow(row)
+        
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
+        return response
 
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
     list_display = ['user', 'month', 'year', 'amount', 'category', 'created_at']
     list_filter = ['year', 'month', 'created_at']
+    list_select_related = ['category', 'user']
     search_fields = ['user__username', 'category__name']
+    autocomplete_fields = ['user', 'ledger', 'category']
+
+
+@admin.register(SavingsGoal)
+class SavingsGoalAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'target_amount', 'saved', 'currency', 'deadline', 'is_stale']
+    list_filter = ['is_stale', 'deadline']
+    list_select_related = ['user']
+    search_fields = ['name', 'user__username']
+    autocomplete_fields = ['user', 'ledger', 'categories']
+    readonly_fields = ['saved', 'is_stale']
+
+
+@admin.register(TransactionFlag)
+class TransactionFlagAdmin(admin.ModelAdmin):
+    list_display = ['transaction', 'kind', 'score', 'status', 'user', 'created_at']
+    list_filter = ['kind', 'status', UsernameFilter]
+    list_select_related = ['transaction__category', 'user']
+    raw_id_fields = ['transaction', 'duplicate_of']
+    autocomplete_fields = ['user']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'status', 'progress', 'attempts', 'user', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+    readonly_fields = ['locked_by', 'locked_at', 'error']
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ['at', 'kind', 'object_id', 'action', 'actor', 'ledger']
+    list_filter = ['kind', 'action', 'at']
+    list_select_related = ['actor', 'ledger']
+    search_fields = ['=object_id', 'actor__username']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # The log is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
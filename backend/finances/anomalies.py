@@ -0,0 +1,227 @@
+"""
+Duplicate and outlier detection for transactions.
+
+Near-duplicates share a blocking key -- a hash of user, category, currency and
+amount -- and are only compared with rows in the same block dated within
+``DUPLICATE_WINDOW_DAYS``, so the work grows with block size rather than with
+the square of the table. Outliers are amounts far from the running mean of
+their category and currency, tracked with Welford's streaming algorithm.
+
+``detect_anomalies`` streams the whole table in two ordered passes;
+``check_transaction`` and ``check_transactions`` apply the same rules to new
+transactions as they are written, one at a time or as a bulk import.
+"""
+import hashlib
+import math
+from bisect import bisect_left
+from collections import deque
+from datetime import timedelta
+from decimal import Decimal
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import CategoryAmountStats, Transaction, TransactionFlag
+
+DUPLICATE_WINDOW_DAYS = 3
+SIMILARITY_THRESHOLD = 0.8
+OUTLIER_Z = 3.5
+OUTLIER_MIN_SAMPLES = 10
+FLAG_BATCH_SIZE = 5000
+
+
+def blocking_key(user_id, category_id, currency, amount):
+    """Hash of the fields two duplicates must share exactly"""
+    raw = f'{user_id}:{category_id}:{currency}:{amount}'
+    return hashlib.blake2b(raw.encode(), digest_size=8).digest()
+
+
+def description_similarity(first, second):
+    first, second = (first or '').strip().lower(), (second or '').strip().lower()
+    if first == second:
+        return 1.0
+    return SequenceMatcher(None, first, second).ratio()
+
+
+class Welford:
+    """Streaming mean and variance"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count, self.mean, self.m2 = count, mean, m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def z_score(self, value):
+        """Distance from the mean in standard deviations, or None with too little history"""
+        if self.count < OUTLIER_MIN_SAMPLES or not self.std:
+            return None
+        return (value - self.mean) / self.std
+
+
+def _flag(user_id, transaction_id, kind, score, duplicate_of=None):
+    return TransactionFlag(
+        user_id=user_id, transaction_id=transaction_id, kind=kind,
+        score=round(score, 4), duplicate_of_id=duplicate_of,
+    )
+
+
+def _save_flags(flags):
+    # Re-running the job keeps existing flags and their review status
+    TransactionFlag.objects.bulk_create(flags, batch_size=FLAG_BATCH_SIZE, ignore_conflicts=True)
+
+
+def _find_duplicates(queryset, window_days):
+    """Yield duplicate flags; rows arrive ordered so each block is contiguous and dated"""
+    window = timedelta(days=window_days)
+    rows = queryset.order_by('user_id', 'category_id', 'amount', 'date', 'id').values_list(
+        'id', 'user_id', 'category_id', 'currency', 'amount', 'date', 'description'
+    ).iterator(chunk_size=10_000)
+
+    run, blocks = None, {}
+    for pk, user_id, category_id, currency, amount, day, description in rows:
+        # A new (user, category, amount) run starts fresh blocks; currency splits it further
+        if run != (user_id, category_id, amount):
+            run, blocks = (user_id, category_id, amount), {}
+        recent = blocks.setdefault(blocking_key(user_id, category_id, currency, amount), deque())
+        while recent and day - recent[0][1] > window:
+            recent.popleft()
+        for other_pk, _, other_description in recent:
+            similarity = description_similarity(description, other_description)
+            if similarity >= SIMILARITY_THRESHOLD:
+                yield _flag(user_id, pk, 'duplicate', similarity, duplicate_of=other_pk)
+                break
+        recent.append((pk, day, description))
+
+
+def _find_outliers(queryset, stats):
+    """Yield outlier flags, scoring each row against the rows before it in its category"""
+    rows = queryset.order_by('category_id', 'currency', 'date', 'id').values_list(
+        'id', 'user_id', 'category_id', 'currency', 'amount'
+    ).iterator(chunk_size=10_000)
+    for pk, user_id, category_id, currency, amount in rows:
+        running = stats.setdefault((category_id, currency), Welford())
+        value = float(amount)
+        z = running.z_score(value)
+        if z is not None and abs(z) > OUTLIER_Z:
+            yield _flag(user_id, pk, 'outlier', z)
+        running.add(value)
+
+
+def _batched(flags):
+    batch = []
+    for flag in flags:
+        batch.append(flag)
+        if len(batch) >= FLAG_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detect_anomalies(queryset=None, window_days=DUPLICATE_WINDOW_DAYS):
+    """
+    Scan transactions for duplicates and outliers and store the flags.
+
+    Category statistics are rebuilt from the scanned rows, so the on-write
+    check starts from the same baseline. Returns (rows, duplicates, outliers).
+    """
+    queryset = queryset if queryset is not None else Transaction.objects.all()
+    counts = {'duplicate': 0, 'outlier': 0}
+    for batch in _batched(_find_duplicates(queryset, window_days)):
+        counts['duplicate'] += len(batch)
+        _save_flags(batch)
+
+    stats = {}
+    for batch in _batched(_find_outliers(queryset, stats)):
+        counts['outlier'] += len(batch)
+        _save_flags(batch)
+
+    with transaction.atomic():
+        CategoryAmountStats.objects.filter(
+            category_id__in={category_id for category_id, _ in stats}
+        ).delete()
+        CategoryAmountStats.objects.bulk_create([
+            CategoryAmountStats(
+                category_id=category_id, currency=currency,
+                count=running.count, mean=running.mean, m2=running.m2,
+            )
+            for (category_id, currency), running in stats.items()
+        ], batch_size=FLAG_BATCH_SIZE)
+    rows = sum(running.count for running in stats.values())
+    return rows, counts['duplicate'], counts['outlier']
+
+
+def check_transaction(instance, window_days=DUPLICATE_WINDOW_DAYS):
+    """Flag a newly written transaction and fold its amount into the category statistics"""
+    return check_transactions([instance], window_days)
+
+
+def _block(row):
+    return row.user_id, row.category_id, Decimal(row.amount), row.currency
+
+
+def check_transactions(instances, window_days=DUPLICATE_WINDOW_DAYS):
+    """
+    check_transaction for rows written together, e.g. by bulk_create, which sends
+    no signals. Candidates for every row come from one query, and each category
+    and currency locks its statistics once; rows are checked in insertion order,
+    each against the rows before it, so the outcome matches saving them one by one.
+    """
+    instances = sorted(instances, key=lambda row: row.pk)
+    if not instances:
+        return []
+    window = timedelta(days=window_days)
+    flags = []
+
+    # The dedupe index covers (user, category, amount, date), i.e. the blocks of these rows
+    blocks = {}
+    candidates = Transaction.objects.filter(
+        user_id__in={row.user_id for row in instances},
+        category_id__in={row.category_id for row in instances},
+        amount__in={row.amount for row in instances},
+        currency__in={row.currency for row in instances},
+        date__range=(min(row.date for row in instances) - window, max(row.date for row in instances) + window),
+    ).order_by('date', 'pk').values_list('user_id', 'category_id', 'amount', 'currency', 'date', 'pk', 'description')
+    for *block, day, pk, description in candidates:
+        blocks.setdefault(tuple(block), []).append((day, pk, description))
+    for instance in instances:
+        rows = blocks.get(_block(instance), [])
+        # Nearest first among the rows before this one
+        for day, other_pk, other_description in reversed(rows[:bisect_left(rows, (instance.date, instance.pk))]):
+            if instance.date - day > window:
+                break
+            similarity = description_similarity(instance.description, other_description)
+            if similarity >= SIMILARITY_THRESHOLD:
+                flags.append(_flag(instance.user_id, instance.pk, 'duplicate', similarity, duplicate_of=other_pk))
+                break
+
+    by_stats = {}
+    for instance in instances:
+        by_stats.setdefault((instance.category_id, instance.currency), []).append(instance)
+    with transaction.atomic():
+        for (category_id, currency), rows in by_stats.items():
+            stats, _ = CategoryAmountStats.objects.select_for_update().get_or_create(
+                category_id=category_id, currency=currency
+            )
+            running = Welford(stats.count, stats.mean, stats.m2)
+            for instance in rows:
+                value = float(instance.amount)
+                z = running.z_score(value)
+                if z is not None and abs(z) > OUTLIER_Z:
+                    flags.append(_flag(instance.user_id, instance.pk, 'outlier', z))
+                running.add(value)
+            stats.count, stats.mean, stats.m2 = running.count, running.mean, running.m2
+            stats.save(update_fields=['count', 'mean', 'm2', 'updated_at'])
+
+    if flags:
+        _save_flags(flags)
+    return flags
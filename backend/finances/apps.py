@@ -5,3 +5,5 @@ class FinancesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finances'
 
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,151 @@
+"""
+Cold storage for transactions from closed years.
+
+Archiving copies a user's old rows into ``ArchivedTransaction`` with a single
+``INSERT ... SELECT``, records per-month totals in ``ArchivedMonthlyTotal`` and
+removes the rows from the live table. Readers only touch the archive when the
+requested date range starts before the user's ``ArchiveBoundary``. Only a
+user's personal ledger is archived; shared ledgers stay live.
+"""
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Count, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from . import hot_cache
+from .events import publish_resync
+from .models import (
+    ArchiveBoundary, ArchivedMonthlyTotal, ArchivedTransaction, Ledger, Transaction, TransactionFlag,
+)
+from .summaries import MonthlyTotalSource, TransactionSource
+from .snapshots import mark_stale
+
+ARCHIVED_COLUMNS = [
+    'id', 'user_id', 'type', 'amount', 'currency', 'category_id', 'date', 'description', 'created_at'
+]
+
+
+def archived_before(user):
+    """Date before which the user's transactions are archived, or None"""
+    return ArchiveBoundary.objects.filter(user=user).values_list('archived_before', flat=True).first()
+
+
+def ledger_archived_before(ledger):
+    """Archive boundary behind a ledger; only personal ledgers have one"""
+    return archived_before(ledger.owner_id) if ledger.is_personal else None
+
+
+def needs_archive(boundary, start_date):
+    return boundary is not None and (start_date is None or start_date < boundary)
+
+
+def archive_user_transactions(user, cutoff):
+    """Move the transactions in the user's personal ledger dated before cutoff into the archive"""
+    ledger = Ledger.objects.personal_for(user.pk)
+    hot = Transaction.objects.filter(ledger=ledger, date__lt=cutoff)
+    with transaction.atomic():
+        totals = hot.annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date')
+        ).values('category_id', 'type', 'currency', 'year', 'month').annotate(
+            total=Sum('amount'), count=Count('id')
+        ).order_by()
+        ArchivedMonthlyTotal.objects.bulk_create([
+            ArchivedMonthlyTotal(user=user, **item) for item in totals
+        ])
+
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(column) for column in ARCHIVED_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(ArchivedTransaction._meta.db_table)} ({columns}) '
+                f'SELECT {columns} FROM {quote(Transaction._meta.db_table)} '
+                f'WHERE {quote("ledger_id")} = %s AND {quote("date")} < %s',
+                [ledger.pk, cutoff]
+            )
+            moved = cursor.rowcount
+        # Archived rows are read-only, so their review flags go; a flag is the only
+        # row pointing at a transaction, so the copied rows then go with one DELETE
+        # and no per-row signals. They keep their ids and stay listed, so sync
+        # clients keep their copy and no tombstones or delete events are needed.
+        TransactionFlag.objects.filter(Q(transaction__in=hot) | Q(duplicate_of__in=hot)).delete()
+        hot._raw_delete(hot.db)
+        # Archived months are converted from monthly totals from now on
+        mark_stale(ledger.pk, *{date(item['year'], item['month'], 1) for item in totals})
+
+        boundary, created = ArchiveBoundary.objects.get_or_create(
+            user=user, defaults={'archived_before': cutoff}
+        )
+        if not created and boundary.archived_before < cutoff:
+            boundary.archived_before = cutoff
+            boundary.save(update_fields=['archived_before', 'updated_at'])
+        publish_resync(ledger.pk)
+        hot_cache.invalidate(ledger.pk)
+    return moved
+
+
+def _month_aligned(start_date, end_date, last_archived):
+    starts_on_month = start_date is None or start_date.day == 1
+    ends_on_month = (
+        end_date is None or end_date >= last_archived or (end_date + timedelta(days=1)).day == 1
+    )
+    return starts_on_month and ends_on_month
+
+
+def archived_source(user, boundary, start_date=None, end_date=None, periods=()):
+    """
+    Cheapest archive source covering [start_date, end_date].
+
+    Month-aligned ranges are answered from the monthly totals; ranges that cut a
+    month in half fall back to the archived rows. Sub-ranges the caller will
+    aggregate separately are passed as ``periods`` and must be aligned too.
+    """
+    last_archived = boundary - timedelta(days=1)
+    ranges = [(start_date, end_date), *periods]
+
+    if all(_month_aligned(start, end, last_archived) for start, end in ranges):
+        queryset = ArchivedMonthlyTotal.objects.filter(user=user)
+        if start_date:
+            queryset = queryset.filter(
+                Q(year__gt=start_date.year) | Q(year=start_date.year, month__gte=start_date.month)
+            )
+        if end_date:
+            queryset = queryset.filter(
+                Q(year__lt=end_date.year) | Q(year=end_date.year, month__lte=end_date.month)
+            )
+        return MonthlyTotalSource(queryset)
+
+    queryset = ArchivedTransaction.objects.filter(user=user)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return TransactionSource(queryset)
+
+
+def _row_values(queryset, archived, updated_at, version):
+    return queryset.order_by().values(
+        *ARCHIVED_COLUMNS,
+        category_name=F('category__name'),
+        category_type=F('category__type'),
+        row_updated_at=updated_at,
+        row_version=version,
+        archived=Value(archived, output_field=BooleanField()),
+    )
+
+
+def _archived_values(queryset):
+    # Archived rows are never written again
+    return _row_values(queryset, True, F('created_at'), Value(1, output_field=IntegerField()))
+
+
+def archived_row(user, pk):
+    """One archived transaction of the user as a combined_rows dict, or None"""
+    return _archived_values(ArchivedTransaction.objects.filter(user=user, pk=pk)).first()
+
+
+def combined_rows(hot, cold, ordering):
+    """UNION ALL of live and archived rows as dicts, ordered after the union"""
+    return _row_values(hot, False, F('updated_at'), F('version')).union(
+        _archived_values(cold), all=True
+    ).order_by(*ordering)
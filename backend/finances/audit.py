@@ -0,0 +1,183 @@
+"""
+Append-only audit log of category, transaction and budget changes.
+
+Every save and delete of an audited model becomes one ``AuditEntry`` holding
+only the fields that changed. The old values are read in ``pre_save`` and only
+for updates -- for transactions by the read that already fetches the values
+snapshots and live clients need -- so rows loaded for reading cost nothing.
+
+Entries are not written as they happen. Each one joins the current request's
+buffer from ``transaction.on_commit``, so a write that rolls back never reaches
+the log, and ``AuditMiddleware`` writes the request's buffer with a single
+``bulk_create`` once its writes have committed. Outside a request (management
+commands, the worker) each entry is written when its transaction commits.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import transaction
+
+from .models import AuditEntry, Budget, Category, Transaction
+
+# Derived and bookkeeping columns (path, version, timestamps) are left out
+AUDITED_FIELDS = {
+    Category: ('name', 'type', 'parent', 'is_archived'),
+    Transaction: ('type', 'amount', 'currency', 'category', 'date', 'description'),
+    Budget: ('month', 'year', 'amount', 'category'),
+}
+KINDS = {model: model._meta.model_name for model in AUDITED_FIELDS}
+
+_buffer = ContextVar('finances_audit_buffer', default=None)
+_recording = ContextVar('finances_audit_recording', default=True)
+
+
+def _attnames(model):
+    return [(name, model._meta.get_field(name).attname) for name in AUDITED_FIELDS[model]]
+
+
+ATTNAMES = {model: _attnames(model) for model in AUDITED_FIELDS}
+
+
+def audited_values(instance):
+    """{field: value} of the audited fields already loaded on instance"""
+    loaded = instance.__dict__
+    # Deferred fields are skipped rather than fetched
+    return {name: loaded[attname] for name, attname in ATTNAMES[type(instance)] if attname in loaded}
+
+
+def read_previous(instance, update_fields=None, extra=()):
+    """
+    Read the stored audited values (only update_fields, if given) of a row about
+    to be updated, so record_saved can diff against them. Returns the stored
+    row, which also holds the extra columns asked for, or None.
+    """
+    names = [
+        (name, attname) for name, attname in ATTNAMES[type(instance)]
+        if update_fields is None or name in update_fields or attname in update_fields
+    ]
+    columns = {attname for _, attname in names} | set(extra)
+    row = type(instance)._base_manager.filter(pk=instance.pk).values(*columns).first() if columns else None
+    instance._audit_previous = {name: row[attname] for name, attname in names} if row else {}
+    return row
+
+
+def diff(before, after):
+    return {name: [before[name], value] for name, value in after.items() if name in before and before[name] != value}
+
+
+class AuditBuffer:
+    """Entries of one request, written together once its writes commit"""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.entries = []
+        self.flushed = False
+
+    def actor_id(self):
+        # DRF copies the user it authenticated onto the Django request
+        user = getattr(self.request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def add(self, entries):
+        if self.flushed:
+            # Committed after the request's flush, e.g. by an enclosing transaction
+            AuditEntry.objects.bulk_create(entries)
+        else:
+            self.entries.extend(entries)
+
+    def flush(self):
+        self.flushed = True
+        if self.entries:
+            AuditEntry.objects.bulk_create(self.entries)
+            self.entries = []
+
+
+def _write(buffer, entries):
+    if buffer is None:
+        AuditEntry.objects.bulk_create(entries)
+    else:
+        buffer.add(entries)
+
+
+def _record(model, changes_by_row):
+    """Log (ledger_id, object_id, action, changes) rows once the surrounding transaction commits"""
+    if not _recording.get():
+        return
+    buffer = _buffer.get()
+    actor_id = buffer.actor_id() if buffer else None
+    entries = [
+        AuditEntry(
+            ledger_id=ledger_id, actor_id=actor_id, kind=KINDS[model],
+            object_id=object_id, action=action, changes=changes,
+        )
+        for ledger_id, object_id, action, changes in changes_by_row
+    ]
+    if entries:
+        transaction.on_commit(partial(_write, buffer, entries))
+
+
+def _saved(instance, created):
+    after = audited_values(instance)
+    changes = after if created else diff(getattr(instance, '_audit_previous', {}), after)
+    if changes:
+        return instance.ledger_id, instance.pk, 'c' if created else 'u', changes
+    return None
+
+
+def record_saved(instance, created):
+    row = _saved(instance, created)
+    _record(type(instance), [row] if row else [])
+
+
+def record_deleted(instance):
+    _record(type(instance), [(instance.ledger_id, instance.pk, 'd', audited_values(instance))])
+
+
+def record_created(model, instances):
+    """Log rows inserted with bulk_create, which sends no signals"""
+    _record(model, [_saved(instance, created=True) for instance in instances])
+
+
+def record_updated(model, ledger_id, changes_by_id):
+    """Log a set-based UPDATE given {object_id: {field: [old, new]}}"""
+    _record(model, [(ledger_id, pk, 'u', changes) for pk, changes in changes_by_id.items()])
+
+
+def record_moved(model, ledger_id, ids, field, old, new):
+    """Log a set-based UPDATE that moved the rows in ids from old to new"""
+    record_updated(model, ledger_id, {pk: {field: [old, new]} for pk in ids})
+
+
+@contextmanager
+def collecting(request=None):
+    """Buffer the entries recorded in the block and write them with one INSERT once they commit"""
+    buffer = AuditBuffer(request)
+    token = _buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _buffer.reset(token)
+        # Queued behind the entries' own callbacks, so it runs after they joined the buffer
+        transaction.on_commit(buffer.flush)
+
+
+@contextmanager
+def unrecorded():
+    """Change rows without logging it, for rows that go away with their whole ledger"""
+    token = _recording.set(False)
+    try:
+        yield
+    finally:
+        _recording.reset(token)
+
+
+class AuditMiddleware:
+    """Collects the audit entries of a request and writes them in one batch"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collecting(request):
+            return self.get_response(request)
@@ -0,0 +1,160 @@
+"""
+Set-based category maintenance.
+
+Each operation issues a fixed number of ``UPDATE``/``DELETE`` statements keyed
+on ``category_id`` inside one database transaction, so the statement count
+does not grow with the number of transactions or budgets being moved.
+"""
+from django.db import transaction
+from django.db.models import CharField, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, Substr
+from django.utils import timezone
+
+from .models import ArchivedMonthlyTotal, ArchivedTransaction, Budget, Category, Ledger, Transaction
+from . import audit, goals, hot_cache
+from .events import publish_resync
+from .snapshots import mark_ledger_stale
+
+
+DEFAULT_CATEGORIES = [
+    ('Salary', 'income'),
+    ('Freelance', 'income'),
+    ('Investments', 'income'),
+    ('Other Income', 'income'),
+    ('Groceries', 'expense'),
+    ('Rent', 'expense'),
+    ('Utilities', 'expense'),
+    ('Transportation', 'expense'),
+    ('Entertainment', 'expense'),
+    ('Healthcare', 'expense'),
+    ('Dining Out', 'expense'),
+    ('Shopping', 'expense'),
+]
+
+
+class CategoryOperationError(Exception):
+    """Raised when two categories cannot be combined"""
+
+
+def create_default_categories(user, ledger=None):
+    """Give a new ledger (the user's personal one by default) the starter categories with one INSERT and one UPDATE"""
+    ledger = ledger or Ledger.objects.personal_for(user.pk)
+    with transaction.atomic():
+        created = Category.objects.bulk_create([
+            Category(user=user, ledger=ledger, name=name, type=cat_type) for name, cat_type in DEFAULT_CATEGORIES
+        ])
+        # bulk_create skips save(), which would set each top-level path to "/<id>/"
+        Category.objects.filter(pk__in=[category.pk for category in created]).update(
+            path=Concat(Value('/'), Cast('pk', CharField()), Value('/'))
+        )
+        audit.record_created(Category, created)
+    return created
+
+
+def _check_compatible(source, target):
+    if source.pk == target.pk:
+        raise CategoryOperationError('Source and target category must be different.')
+    if source.ledger_id != target.ledger_id:
+        raise CategoryOperationError('Invalid target category.')
+    if source.type != target.type:
+        raise CategoryOperationError(
+            f'Cannot move {source.type} transactions into {target.type} category.'
+        )
+    if target.is_archived:
+        raise CategoryOperationError('Target category is archived.')
+
+
+def _move_archived(source, target):
+    # Archived monthly totals are not unique per category, so they can be repointed as-is
+    ArchivedTransaction.objects.filter(category=source).update(category=target)
+    ArchivedMonthlyTotal.objects.filter(category=source).update(category=target)
+
+
+def _repoint(queryset, field, source, target, **updates):
+    """UPDATE queryset's field from source to target, logging each moved row"""
+    ids = list(queryset.values_list('pk', flat=True))
+    moved = queryset.update(**{field: target}, **updates)
+    audit.record_moved(queryset.model, source.ledger_id, ids, field, source.pk, target.pk)
+    return moved
+
+
+def reassign_transactions(source, target):
+    """Move every transaction from source to target with a single UPDATE"""
+    _check_compatible(source, target)
+    with transaction.atomic():
+        moved = _repoint(
+            Transaction.objects.filter(category=source), 'category', source, target,
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+        _move_archived(source, target)
+        mark_ledger_stale(source.ledger_id)
+        goals.mark_stale(source.ledger_id, [source.pk, target.pk])
+        publish_resync(source.ledger_id)
+        hot_cache.invalidate(source.ledger_id)
+    return {'transactions_moved': moved}
+
+
+def merge_categories(source, target):
+    """
+    Fold source into target and delete source.
+
+    Budgets that only exist on source are repointed. Where both categories have a
+    budget for the same month, the amounts are added onto the target budget and
+    the source budget is dropped, keeping ``unique_together`` intact.
+    Subcategories of source are re-parented under target with their subtrees.
+    """
+    _check_compatible(source, target)
+    if target.is_descendant_of(source):
+        raise CategoryOperationError('Cannot merge a category into its own subcategory.')
+
+    same_period = {'ledger': OuterRef('ledger'), 'month': OuterRef('month'), 'year': OuterRef('year')}
+    source_twin = Budget.objects.filter(category=source, **same_period)
+    target_twin = Budget.objects.filter(category=target, **same_period)
+
+    # Bulk updates skip auto_now, so they set updated_at for delta sync themselves
+    now = timezone.now()
+    with transaction.atomic():
+        folding = Budget.objects.filter(category=target).filter(Exists(source_twin))
+        folded = folding.annotate(added=Subquery(source_twin.values('amount')[:1])).values_list(
+            'pk', 'amount', 'added'
+        )
+        audit.record_updated(Budget, source.ledger_id, {
+            pk: {'amount': [amount, amount + added]} for pk, amount, added in folded
+        })
+        merged = folding.update(
+            amount=F('amount') + Subquery(source_twin.values('amount')[:1]),
+            version=F('version') + 1,
+            updated_at=now
+        )
+        Budget.objects.filter(category=source).filter(Exists(target_twin)).delete()
+        budgets_moved = _repoint(
+            Budget.objects.filter(category=source), 'category', source, target,
+            version=F('version') + 1, updated_at=now
+        )
+        moved = _repoint(
+            Transaction.objects.filter(category=source), 'category', source, target,
+            version=F('version') + 1, updated_at=now
+        )
+        _move_archived(source, target)
+        mark_ledger_stale(source.ledger_id)
+        goals.mark_stale(source.ledger_id, [source.pk, target.pk])
+        publish_resync(source.ledger_id)
+        hot_cache.invalidate(source.ledger_id)
+        Category.objects.filter(path__startswith=source.path).exclude(pk=source.pk).update(
+            path=Concat(Value(target.path), Substr('path', len(source.path) + 1)), updated_at=now
+        )
+        _repoint(Category.objects.filter(parent=source), 'parent', source, target, updated_at=now)
+        source.delete()
+
+    return {
+        'transactions_moved': moved,
+        'budgets_moved': budgets_moved,
+        'budgets_merged': merged,
+    }
+
+
+def set_archived(category, archived=True):
+    """Archive or restore a category without touching its history"""
+    category.is_archived = archived
+    category.save(update_fields=['is_archived', 'updated_at'])
+    return {'is_archived': archived}
@@ -0,0 +1,45 @@
+"""
+Response compression with brotli or gzip.
+
+Brotli is preferred when the client accepts ``br`` and the brotli package is
+installed; otherwise Django's gzip handling applies. Responses under
+``MIN_LENGTH`` bytes are sent as they are, since compressing them saves
+little and costs CPU on every small API call.
+"""
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_LENGTH = 1024
+BROTLI_QUALITY = 5
+_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < MIN_LENGTH:
+            return response
+        accepts = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or response.streaming or not _accepts_brotli.search(accepts):
+            return super().process_response(request, response)
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Compressed bytes differ from the original, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
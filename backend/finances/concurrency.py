@@ -0,0 +1,94 @@
+"""
+Optimistic concurrency helpers for the finance API.
+
+Versioned models carry an integer ``version`` column that is exposed as the
+resource ETag. Updates and deletes claim the row with a compare-and-swap
+``UPDATE ... WHERE version = <expected>`` so two devices editing the same
+transaction cannot silently overwrite each other.
+"""
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'This resource was changed by another request. Reload it and try again.'
+    default_code = 'precondition_failed'
+
+
+def parse_if_match(header):
+    """Return the version named by an If-Match header, None for absent or ``*``"""
+    if not header or header.strip() == '*':
+        return None
+    tag = header.split(',')[0].strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise PreconditionFailed('If-Match must be an ETag returned by this API.')
+
+
+def claim_version(instance, expected):
+    """
+    Atomically bump the stored version if it still equals ``expected``.
+
+    Must run inside a transaction; concurrent claimers block on the row lock and
+    then see the new version, so at most one of them succeeds.
+    """
+    claimed = type(instance).objects.filter(pk=instance.pk, version=expected).update(
+        version=F('version') + 1
+    )
+    if not claimed:
+        raise PreconditionFailed()
+    return expected + 1
+
+
+class VersionedModelMixin:
+    """
+    ViewSet mixin adding ETag headers and If-Match preconditions.
+
+    Without an If-Match header the version read at the start of the request is
+    used, so a write that races another one still fails with 412 instead of
+    overwriting it.
+    """
+    etag_actions = ('create', 'retrieve', 'update', 'partial_update')
+
+    def _expected_version(self, instance):
+        expected = parse_if_match(self.request.headers.get('If-Match'))
+        if expected is not None and expected != instance.version:
+            raise PreconditionFailed()
+        return instance.version
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        data = getattr(response, 'data', None)
+        if self.action in self.etag_actions and isinstance(data, dict) and 'version' in data:
+            response['ETag'] = f'"{data["version"]}"'
+        return response
+
+    def perform_update(self, serializer):
+        expected = self._expected_version(serializer.instance)
+        with transaction.atomic():
+            version = claim_version(serializer.instance, expected)
+            serializer.save(version=version)
+
+    def perform_destroy(self, instance):
+        expected = self._expected_version(instance)
+        with transaction.atomic():
+            claim_version(instance, expected)
+            instance.delete()
+
+
+@contextmanager
+def unique_violation_as_validation_error(errors):
+    """Let the database enforce a unique constraint and report violations as 400s"""
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError:
+        raise serializers.ValidationError(errors)
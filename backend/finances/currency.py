@@ -0,0 +1,130 @@
+"""
+Currency conversion for aggregates and per-row display.
+
+Rates live in the local ``ExchangeRate`` table, quoted as units of
+``FX_PIVOT_CURRENCY`` per unit of currency. Aggregates convert inside the query
+by joining the latest rate on or before each row's date; rows already in the
+target currency skip the lookup entirely. ``RateCache`` memoizes per
+(currency, date) lookups for Python-side conversion within one request.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, When
+
+from .models import ExchangeRate, Profile
+
+CONVERTED = DecimalField(max_digits=20, decimal_places=6)
+
+
+def base_currency_for(user):
+    return Profile.objects.filter(user=user).values_list(
+        'base_currency', flat=True
+    ).first() or settings.DEFAULT_CURRENCY
+
+
+def _rate_on(currency, on_or_before):
+    """Subquery for the latest rate of currency on or before a date"""
+    if currency == settings.FX_PIVOT_CURRENCY:
+        return None
+    return Subquery(
+        ExchangeRate.objects.filter(on_or_before, currency=currency)
+        .order_by('-date').values('rate')[:1]
+    )
+
+
+def _converted(amount, currency_field, base, on_or_before):
+    """Case expression converting ``amount`` from each row's currency into base"""
+    source_rate = Case(
+        When(**{currency_field: settings.FX_PIVOT_CURRENCY}, then=1),
+        default=Subquery(
+            ExchangeRate.objects.filter(on_or_before, currency=OuterRef(currency_field))
+            .order_by('-date').values('rate')[:1]
+        ),
+        output_field=CONVERTED,
+    )
+    base_rate = _rate_on(base, on_or_before)
+    value = F(amount) * source_rate
+    if base_rate is not None:
+        value = value / base_rate
+    return Case(
+        When(**{currency_field: base}, then=F(amount)),
+        default=ExpressionWrapper(value, output_field=CONVERTED),
+        output_field=CONVERTED,
+    )
+
+
+def converted_amount(base, amount='amount', currency='currency', date='date'):
+    """Row amount in base currency, using the rate in force on the row's date"""
+    return _converted(amount, currency, base, Q(date__lte=OuterRef(date)))
+
+
+def converted_monthly_total(base, amount='total', currency='currency'):
+    """Monthly total in base currency, using the last rate in force during that month"""
+    in_or_before_month = (
+        Q(date__year__lt=OuterRef('year'))
+        | Q(date__year=OuterRef('year'), date__month__lte=OuterRef('month'))
+    )
+    return _converted(amount, currency, base, in_or_before_month)
+
+
+class RateCache:
+    """Per-request memo of (currency, date) -> rate for converting single values"""
+
+    def __init__(self):
+        self._rates = {}
+
+    def rate(self, currency, on_date):
+        if currency == settings.FX_PIVOT_CURRENCY:
+            return Decimal('1')
+        key = (currency, on_date)
+        if key not in self._rates:
+            self._rates[key] = ExchangeRate.objects.filter(
+                currency=currency, date__lte=on_date
+            ).order_by('-date').values_list('rate', flat=True).first()
+        return self._rates[key]
+
+    def can_convert(self, currency, base, on_date):
+        """Whether rates for both currencies are in force on on_date"""
+        return currency == base or (
+            self.rate(currency, on_date) is not None and self.rate(base, on_date) is not None
+        )
+
+    def convert(self, amount, currency, base, on_date):
+        """Convert amount into base, or None when a rate is missing"""
+        if currency == base:
+            return amount
+        source, target = self.rate(currency, on_date), self.rate(base, on_date)
+        if source is None or target is None:
+            return None
+        # Halves round away from zero, as ROUND does in the database
+        return (amount * source / target).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def rate_cache_for(request):
+    """The RateCache attached to this request, created on first use"""
+    if not hasattr(request, '_rate_cache'):
+        request._rate_cache = RateCache()
+    return request._rate_cache
+
+
+def request_base_currency(request):
+    """The user's base currency, looked up once per request"""
+    if not hasattr(request, '_base_currency'):
+        request._base_currency = base_currency_for(request.user)
+    return request._base_currency
+
+
+def is_known_currency(code):
+    return code in (settings.FX_PIVOT_CURRENCY, settings.DEFAULT_CURRENCY) or (
+        ExchangeRate.objects.filter(currency=code).exists()
+    )
+
+
+def request_knows_currency(request, code):
+    """is_known_currency, checked once per currency per request"""
+    if not hasattr(request, '_known_currencies'):
+        request._known_currencies = {}
+    if code not in request._known_currencies:
+        request._known_currencies[code] = is_known_currency(code)
+    return request._known_currencies[code]
@@ -0,0 +1,56 @@
+"""
+Per-request database limits.
+
+``statement_timeout`` caps how long any single query may run, so one runaway
+aggregation over a large history cannot hold a connection (or a pool slot)
+indefinitely. Only PostgreSQL enforces it; elsewhere the block runs unlimited.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import current_read_alias
+
+QUERY_CANCELED = '57014'
+
+
+@contextmanager
+def statement_timeout(milliseconds, using=DEFAULT_DB_ALIAS):
+    """Run the block in a transaction whose queries are cancelled after milliseconds"""
+    connection = connections[using]
+    if not milliseconds or connection.vendor != 'postgresql':
+        yield
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            # set_config takes a bound parameter, unlike SET, and is_local scopes it to the transaction
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(int(milliseconds))])
+        yield
+
+
+def is_statement_timeout(exc):
+    cause = exc.__cause__
+    # psycopg 3 exposes the SQLSTATE as sqlstate, psycopg2 as pgcode
+    return getattr(cause, 'sqlstate', None) == QUERY_CANCELED or getattr(cause, 'pgcode', None) == QUERY_CANCELED
+
+
+def summary_timeout(view):
+    """Apply SUMMARY_STATEMENT_TIMEOUT to a view action and answer 503 when it is hit"""
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            # Limit the connection the action reads from, which may be a replica
+            with statement_timeout(settings.SUMMARY_STATEMENT_TIMEOUT, using=current_read_alias()):
+                return view(self, request, *args, **kwargs)
+        except OperationalError as exc:
+            if not is_statement_timeout(exc):
+                raise
+            return Response(
+                {'error': 'This summary took too long to compute. Try a shorter date range.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+    return wrapper
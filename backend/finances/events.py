@@ -0,0 +1,138 @@
+"""
+Per-user change events for live clients.
+
+Model signals turn every saved or deleted transaction, budget and category
+into a small delta, published to every member of the row's ledger after the
+surrounding database transaction commits. The broker class named by
+``settings.EVENTS_BACKEND`` fans events out to subscribers; the default
+``LocalBroker`` keeps them in memory and reaches clients connected to the same
+process only. A cross-process backend needs the same ``subscribe``,
+``unsubscribe`` and ``publish`` methods.
+"""
+import asyncio
+import itertools
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .ledgers import member_ids
+
+QUEUE_SIZE = 100
+RESYNC = {'type': 'resync'}
+
+
+class LocalBroker:
+    """In-process pub/sub; each subscriber owns a bounded asyncio queue on its event loop"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription[1]
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id, set())
+            subscriptions -= {entry for entry in subscriptions if entry[1] is queue}
+            if not subscriptions:
+                self._subscribers.pop(user_id, None)
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(entries) for entries in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        """Deliver to every subscriber of user_id; safe to call from any thread"""
+        event = {'id': next(self._ids), **event}
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscriptions:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down; it unsubscribes on its way out
+                pass
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # The client fell behind: drop its backlog and tell it to refetch
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENTS_BACKEND)()
+
+
+def publish(user_id, event):
+    """Publish once the current transaction commits, so clients never see rolled-back data"""
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def publish_to_ledger(ledger_id, event):
+    """Publish to every member of a ledger"""
+    for user_id in member_ids(ledger_id):
+        publish(user_id, event)
+
+
+def publish_resync(ledger_id):
+    """For bulk changes too broad to describe as deltas"""
+    publish_to_ledger(ledger_id, RESYNC)
+
+
+def transaction_delta(instance):
+    delta = {
+        'id': instance.pk,
+        'ledger': instance.ledger_id,
+        'type': instance.type,
+        'amount': instance.amount,
+        'currency': instance.currency,
+        'category': instance.category_id,
+        'category_name': instance.category.name,
+        'category_type': instance.category.type,
+        'date': instance.date,
+        'description': instance.description,
+        'version': instance.version,
+    }
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        delta['previous'] = previous
+    return delta
+
+
+def budget_delta(instance):
+    return {
+        'id': instance.pk,
+        'ledger': instance.ledger_id,
+        'month': instance.month,
+        'year': instance.year,
+        'amount': instance.amount,
+        'category': instance.category_id,
+        'version': instance.version,
+    }
+
+
+def category_delta(instance):
+    return {
+        'id': instance.pk,
+        'ledger': instance.ledger_id,
+        'name': instance.name,
+        'type': instance.type,
+        'parent': instance.parent_id,
+        'is_archived': instance.is_archived,
+    }
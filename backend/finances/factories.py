@@ -0,0 +1,50 @@
+"""
+Test data factories.
+
+Each factory fills in defaults so a test only spells out the fields it cares
+about. ``create_transactions`` writes all its rows with one ``bulk_create``,
+which skips model signals just like a bulk import does; use
+``Transaction.objects.create`` when a test exercises the on-write hooks.
+"""
+import itertools
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from .models import Budget, Category, Transaction
+
+_sequence = itertools.count(1)
+
+
+def create_user(username=None, password='testpass123', **fields):
+    username = username or f'user{next(_sequence)}'
+    return User.objects.create_user(username=username, password=password, **fields)
+
+
+def create_category(user, name=None, type='expense', **fields):
+    name = name or f'Category {next(_sequence)}'
+    return Category.objects.create(user=user, name=name, type=type, **fields)
+
+
+def build_transaction(user, category, amount='10.00', day=None, **fields):
+    return Transaction(
+        user=user, ledger_id=category.ledger_id, category=category, type=category.type, amount=Decimal(amount),
+        date=day or date(2024, 1, 1), **fields
+    )
+
+
+def create_transactions(user, rows):
+    """Insert (category, amount, date) or (category, amount, date, currency) rows"""
+    transactions = []
+    for category, amount, day, *currency in rows:
+        extra = {'currency': currency[0]} if currency else {}
+        transactions.append(build_transaction(user, category, amount, day, **extra))
+    return Transaction.objects.bulk_create(transactions)
+
+
+def create_budget(user, category, amount='100.00', month=1, year=2024, **fields):
+    fields.setdefault('ledger_id', category.ledger_id if category else None)
+    return Budget.objects.create(
+        user=user, category=category, amount=Decimal(amount), month=month, year=year, **fields
+    )
@@ -1,5 +1,5 @@
 from django_filters import rest_framework as filters
-from .models import Transaction
+from .models import AuditEntry, Category, Transaction
 
 
 class TransactionFilter(filters.FilterSet):
@@ -12,9 +12,31 @@ class TransactionFilter(filters.FilterSet):
     amount_min = filters.NumberFilter(field_name='amount', lookup_expr='gte')
     amount_max = filters.NumberFilter(field_name='amount', lookup_expr='lte')
     category = filters.NumberFilter(field_name='category__id')
+    category_tree = filters.NumberFilter(method='filter_category_tree')
     type = filters.ChoiceFilter(choices=Transaction.TRANSACTION_TYPES)
     
     class Meta:
         model = Transaction
-        fields = ['date_from', 'date_to', 'amount_min', 'amount_max', 'category', 'type']
+        fields = ['date_from', 'date_to', 'amount_min', 'amount_max', 'category', 'category_tree', 'type']
+    
+    def filter_category_tree(self, queryset, name, value):
+        """Match a category and all of its descendants with one indexed prefix scan"""
+        path = Category.objects.filter(pk=value).values_list('path', flat=True).first()
+        if path is None:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=path)
+
 
+class AuditEntryFilter(filters.FilterSet):
+    """
+    Filter for the audit log
+    Either the history of one object (kind and object_id) or activity in a window (since, until)
+    """
+    kind = filters.ChoiceFilter(choices=AuditEntry._meta.get_field('kind').choices)
+    object_id = filters.NumberFilter()
+    since = filters.IsoDateTimeFilter(field_name='at', lookup_expr='gte')
+    until = filters.IsoDateTimeFilter(field_name='at', lookup_expr='lt')
+    
+    class Meta:
+        model = AuditEntry
+        fields = ['kind', 'object_id', 'since', 'until']
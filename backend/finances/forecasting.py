@@ -0,0 +1,152 @@
+"""
+Month-end spend projection for budgets.
+
+Daily expense totals for the budget month and the same period of prior months
+are pulled in a single grouped query and laid out as a
+``(months, series, 31)`` NumPy array, so every projection below is computed
+for all budgets at once.
+
+NumPy is imported by the functions that use it: it is the largest import in the
+backend and only forecasts need it, so a worker that never forecasts never pays
+for it. ``budget_tracker.warmup`` imports it up front for preloaded servers.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear
+
+FORECAST_METHODS = ('linear', 'seasonal', 'smoothed')
+MAX_DAYS = 31
+
+
+def _month_start(year, month, offset=0):
+    """Return the first day of the month ``offset`` months before year/month"""
+    index = year * 12 + (month - 1) - offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _daily_spend(transactions, as_of, history, budget_paths, amount='amount'):
+    """
+    Build the per-day expense array for the budget month and ``history`` prior months.
+
+    Returns an array of shape ``(history + 1, len(budget_paths) + 1, 31)`` where
+    month offset 0 is the budget month and the last series is the overall total.
+    Each budget series includes spend in every descendant of its category.
+    """
+    import numpy as np
+
+    first = _month_start(as_of.year, as_of.month, history)
+    last = _month_start(as_of.year, as_of.month, -1)
+
+    rows = transactions.filter(
+        type='expense', date__gte=first, date__lt=last
+    ).annotate(
+        y=ExtractYear('date'), m=ExtractMonth('date'), d=ExtractDay('date')
+    ).values_list('y', 'm', 'd', 'category__path').annotate(
+        total=Sum(amount)
+    ).order_by()
+
+    daily = np.zeros((history + 1, len(budget_paths) + 1, MAX_DAYS))
+    rows = list(rows)
+    if not rows:
+        return daily
+
+    years, months, days, paths, totals = zip(*rows)
+    months = (as_of.year * 12 + as_of.month) - (np.array(years) * 12 + np.array(months))
+    days = np.array(days) - 1
+    totals = np.array([total or 0 for total in totals], dtype=float)
+
+    # Spend per distinct category path, then fold paths into every budget whose
+    # category is an ancestor-or-self via a prefix membership matrix
+    unique_paths, path_index = np.unique(np.array(paths), return_inverse=True)
+    by_path = np.zeros((history + 1, len(unique_paths), MAX_DAYS))
+    np.add.at(by_path, (months, path_index, days), totals)
+
+    daily[:, -1, :] = by_path.sum(axis=1)
+    if budget_paths:
+        membership = np.char.startswith(unique_paths[:, None], np.array(budget_paths)[None, :])
+        daily[:, :-1, :] = np.einsum('mpd,pb->mbd', by_path, membership.astype(float))
+    return daily
+
+
+def _smoothed_level(current, elapsed, alpha):
+    """Simple exponential smoothing level of the daily series after ``elapsed`` days"""
+    import numpy as np
+
+    steps = np.arange(elapsed)
+    weights = alpha * (1 - alpha) ** (elapsed - 1 - steps)
+    weights[0] = (1 - alpha) ** (elapsed - 1)
+    return current[:, :elapsed] @ weights
+
+
+def forecast_budgets(budgets, transactions, as_of, history=3, method='linear', alpha=0.3, amount='amount'):
+    """
+    Project month-end spend for ``budgets`` in the month containing ``as_of``.
+
+    ``transactions`` must already be scoped to the budget owner. Returns one dict
+    per budget with the three projections, the projection selected by ``method``
+    and the date on which that projection first exceeds the budget amount.
+    ``amount`` is the field or expression summed per day, e.g. a currency conversion.
+    """
+    budgets = list(budgets)
+    if not budgets:
+        return []
+
+    import numpy as np
+
+    budget_paths = sorted({b.category.path for b in budgets if b.category_id})
+    daily = _daily_spend(transactions, as_of, history, budget_paths, amount)
+
+    column = {path: i for i, path in enumerate(budget_paths)}
+    index = np.array([
+        column[b.category.path] if b.category_id else len(budget_paths) for b in budgets
+    ], dtype=int)
+    amounts = np.array([float(b.amount) for b in budgets])
+
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+    elapsed = min(as_of.day, days_in_month)
+    remaining_days = days_in_month - elapsed
+
+    current = daily[0, index, :days_in_month]
+    spent = current[:, :elapsed].sum(axis=1)
+
+    prior = daily[1:, index, :]
+    seasonal_rest = prior[:, :, elapsed:days_in_month].sum(axis=2).mean(axis=0) if history else np.zeros(len(budgets))
+    seasonal = spent + seasonal_rest
+
+    if elapsed:
+        linear = spent / elapsed * days_in_month
+        smoothed = spent + _smoothed_level(current, elapsed, alpha) * remaining_days
+    else:
+        linear = seasonal
+        smoothed = seasonal
+
+    projections = {'linear': linear, 'seasonal': seasonal, 'smoothed': smoothed}
+    projected = projections[method]
+
+    # Cumulative path: actual spend up to as_of, then a straight line to the projection
+    rate = np.divide(projected - spent, remaining_days) if remaining_days else np.zeros(len(budgets))
+    path = np.concatenate([
+        np.cumsum(current[:, :elapsed], axis=1),
+        spent[:, None] + rate[:, None] * np.arange(1, remaining_days + 1),
+    ], axis=1)
+    exceeded = path > amounts[:, None]
+    overspend_day = np.where(exceeded.any(axis=1), exceeded.argmax(axis=1) + 1, 0)
+
+    month_start = date(as_of.year, as_of.month, 1)
+    results = []
+    for i, budget in enumerate(budgets):
+        day = int(overspend_day[i])
+        results.append({
+            'budget_id': budget.id,
+            'category': budget.category_id,
+            'category_name': budget.category.name if budget.category else None,
+            'amount': float(budget.amount),
+            'spent_to_date': round(float(spent[i]), 2),
+            'projections': {name: round(float(values[i]), 2) for name, values in projections.items()},
+            'projected_spend': round(float(projected[i]), 2),
+            'projected_remaining': round(float(amounts[i] - projected[i]), 2),
+            'projected_overspend_date': month_start + timedelta(days=day - 1) if day else None,
+        })
+    return results
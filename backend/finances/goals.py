@@ -0,0 +1,154 @@
+"""
+Savings goals with incrementally maintained progress.
+
+A goal's ``saved`` column is moved by each transaction write instead of being
+summed from history on every read: the write converts its amount into the
+goal's currency and adds (or, for the old values of an update or delete,
+subtracts) it in the same database transaction. Which goals a category feeds
+is kept per ledger in one small cache entry, keyed by the number of the
+ledger's goals and their latest ``updated_at``. Checking that version costs
+each write one aggregate query. Links changed in any process are seen at once,
+because a stale entry would skip the new links' deltas for good. Re-linking a
+goal's categories bumps its ``updated_at``.
+
+Each row's converted amount is rounded to cents before it is added, by the
+increment and by ``recompute`` alike, so both arrive at the same ``saved``.
+
+Writes the increment cannot follow -- a missing exchange rate, category merges
+and reassignments -- mark the goal stale instead, and the next progress read
+recomputes it from live and archived transactions.
+"""
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .currency import RateCache, converted_amount
+from .models import ArchivedTransaction, SavingsGoal, Transaction
+
+TIMEOUT = 60 * 60
+DAYS_PER_MONTH = Decimal('30.436875')
+CENTS = Decimal('0.01')
+
+
+def goal_links(ledger_id):
+    """{category_id: [(goal_id, currency, start_date)]} for the ledger's goals"""
+    version = SavingsGoal.objects.filter(ledger_id=ledger_id).aggregate(
+        count=Count('pk'), changed=Max('updated_at')
+    )
+    if not version['count']:
+        return {}
+    key = f"finances:goal-links:{ledger_id}:{version['count']}:{version['changed'].timestamp()}"
+    links = cache.get(key)
+    if links is None:
+        links = defaultdict(list)
+        rows = SavingsGoal.categories.through.objects.filter(savingsgoal__ledger_id=ledger_id).values_list(
+            'category_id', 'savingsgoal_id', 'savingsgoal__currency', 'savingsgoal__start_date'
+        )
+        for category_id, *goal in rows:
+            links[category_id].append(tuple(goal))
+        links = dict(links)
+        cache.set(key, links, TIMEOUT)
+    return links
+
+
+def saved_amount(currency):
+    """Row amount in the goal's currency, rounded to cents as the increment rounds it"""
+    return Round(converted_amount(currency), 2)
+
+
+def touch(goal_ids):
+    """Mark the goals changed after their categories were re-linked, so goal_links re-reads them"""
+    SavingsGoal.objects.filter(pk__in=goal_ids).update(updated_at=timezone.now())
+
+
+def _apply(ledger_id, rows):
+    """Fold (category_id, amount, currency, date, sign) rows into the goals they feed"""
+    links = goal_links(ledger_id)
+    rows = [row for row in rows if row[0] in links]
+    if not rows:
+        return
+    rates = RateCache()
+    deltas, stale = defaultdict(Decimal), set()
+    for category_id, amount, currency, on_date, sign in rows:
+        for goal_id, goal_currency, start_date in links[category_id]:
+            if on_date < start_date:
+                continue
+            value = rates.convert(Decimal(amount), currency, goal_currency, on_date)
+            if value is None:
+                stale.add(goal_id)
+            else:
+                deltas[goal_id] += sign * value
+    for goal_id, delta in deltas.items():
+        if delta and goal_id not in stale:
+            SavingsGoal.objects.filter(pk=goal_id).update(saved=F('saved') + delta)
+    if stale:
+        SavingsGoal.objects.filter(pk__in=stale).update(is_stale=True)
+
+
+def transaction_saved(instance):
+    rows = [(instance.category_id, instance.amount, instance.currency, instance.date, 1)]
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        rows.append((previous['category'], previous['amount'], previous['currency'], previous['date'], -1))
+    _apply(instance.ledger_id, rows)
+
+
+def transaction_deleted(instance):
+    _apply(instance.ledger_id, [(instance.category_id, instance.amount, instance.currency, instance.date, -1)])
+
+
+def transactions_created(ledger_id, instances):
+    """Fold rows inserted with bulk_create, which sends no signals"""
+    _apply(ledger_id, [(row.category_id, row.amount, row.currency, row.date, 1) for row in instances])
+
+
+def mark_stale(ledger_id, category_ids):
+    """Flag the goals fed by category_ids after a set-based change to their transactions"""
+    SavingsGoal.objects.filter(ledger_id=ledger_id, categories__in=category_ids).update(is_stale=True)
+
+
+def recompute(goal):
+    """Sum the goal's transactions from live and archived storage and store the result"""
+    categories = goal.categories.values('pk')
+    total = Decimal('0')
+    for model, scope in ((Transaction, {'ledger_id': goal.ledger_id}), (ArchivedTransaction, {})):
+        total += model.objects.filter(
+            category__in=categories, date__gte=goal.start_date, **scope
+        ).aggregate(total=Sum(saved_amount(goal.currency)))['total'] or 0
+    goal.saved = Decimal(total).quantize(CENTS)
+    goal.is_stale = False
+    SavingsGoal.objects.filter(pk=goal.pk).update(saved=goal.saved, is_stale=False)
+    return goal
+
+
+def progress(goal, today=None):
+    """
+    Progress of a goal as of today.
+
+    The required pace spreads what is left over the months to the deadline (the
+    whole remainder once less than a month is left); the projected completion
+    date extends the average daily pace since ``start_date`` and is null once the
+    goal is reached or while nothing has been saved.
+    """
+    today = today or timezone.localdate()
+    remaining = max(goal.target_amount - goal.saved, Decimal('0'))
+    months_left = max(Decimal((goal.deadline - today).days) / DAYS_PER_MONTH, Decimal('1'))
+    projected = None
+    if remaining and goal.saved > 0:
+        daily = goal.saved / max((today - goal.start_date).days + 1, 1)
+        days = math.ceil(remaining / daily)
+        if days <= (date.max - today).days:
+            projected = today + timedelta(days=days)
+    return {
+        'remaining': remaining,
+        'percent': min(round(goal.saved / goal.target_amount * 100, 2), Decimal('100')),
+        'required_monthly': (remaining / months_left).quantize(CENTS),
+        'projected_completion': projected,
+        'on_track': not remaining or (projected is not None and projected <= goal.deadline),
+    }
@@ -0,0 +1,224 @@
+"""
+Per-ledger hot cache behind the recent-transactions and top-categories widgets.
+
+Each ledger has one small entry in the default cache backend: the newest
+transactions as ready-to-serve rows (a bounded deque, newest first) and
+all-time expense totals per category in the owner's base currency, from which
+the top K are picked with a heap. Single writes patch the entry after their
+database transaction commits; bulk operations and anything the patch cannot
+follow drop it, and the next read rebuilds it from the database.
+
+A patch is a read-modify-write, so it only runs while holding a short per-ledger
+lock taken with ``cache.add``; a writer that finds the lock taken drops the
+entry instead. Dropping moves the ledger to a new generation, which is part of
+the entry's key, so a slower writer still holding an old copy stores it under a
+key nobody reads any more. A rebuild starts a new generation before it reads the
+database, and a patch that finds no entry starts another, so a rebuild that a
+write overtook stores its result where it is never read. Reads pay one extra
+cache round trip for the generation.
+"""
+import heapq
+import time
+from collections import deque
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from . import archive
+from .currency import RateCache, base_currency_for
+from .models import Transaction
+from .summaries import TransactionSource
+
+RECENT_SIZE = 20
+TOP_CATEGORIES = 5
+TIMEOUT = 6 * 60 * 60
+LOCK_TIMEOUT = 5
+KEY_VERSION = 3
+
+
+def cache_key(ledger_id, generation):
+    return f'finances:hot:v{KEY_VERSION}:{ledger_id}:{generation}'
+
+
+def generation_key(ledger_id):
+    return f'finances:hot:v{KEY_VERSION}:{ledger_id}:generation'
+
+
+def lock_key(ledger_id):
+    return f'finances:hot:v{KEY_VERSION}:{ledger_id}:lock'
+
+
+def _generation(ledger_id):
+    key = generation_key(ledger_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Seeded from the clock, so a lost counter cannot point back at old entries
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _next_generation(ledger_id):
+    """Move the ledger to a new generation, orphaning every entry stored before"""
+    try:
+        return cache.incr(generation_key(ledger_id))
+    except ValueError:
+        return _generation(ledger_id)
+
+
+def _row(instance):
+    return {
+        'id': instance.pk,
+        'type': instance.type,
+        'amount': str(instance.amount),
+        'currency': instance.currency,
+        'category': instance.category_id,
+        'category_name': instance.category.name,
+        'category_type': instance.category.type,
+        'date': instance.date.isoformat(),
+        'description': instance.description,
+        'version': instance.version,
+        'created_at': instance.created_at.isoformat(),
+    }
+
+
+def _sort_key(row):
+    # ISO dates and timestamps order correctly as strings
+    return (row['date'], row['created_at'])
+
+
+def build(ledger):
+    """Compute a ledger's entry from the database and store it"""
+    generation = _next_generation(ledger.id)
+    base = base_currency_for(ledger.owner_id)
+    rows = list(
+        Transaction.objects.filter(ledger_id=ledger.id).select_related('category')
+        .order_by('-date', '-created_at')[:RECENT_SIZE + 1]
+    )
+
+    sources = [TransactionSource(Transaction.objects.filter(ledger_id=ledger.id))]
+    boundary = archive.ledger_archived_before(ledger)
+    if boundary:
+        sources.append(archive.archived_source(ledger.owner_id, boundary))
+    totals = {}
+    for source in (source.in_currency(base) for source in sources):
+        grouped = source.queryset.filter(type='expense').values(
+            'category__id', 'category__name'
+        ).annotate(total=Sum(source.amount)).order_by()
+        for item in grouped:
+            entry = totals.setdefault(item['category__id'], [item['category__name'], Decimal('0')])
+            entry[1] += item['total'] or Decimal('0')
+
+    entry = {
+        'currency': base,
+        'recent': deque((_row(row) for row in rows[:RECENT_SIZE]), maxlen=RECENT_SIZE),
+        'has_more': len(rows) > RECENT_SIZE,
+        'totals': totals,
+    }
+    cache.set(cache_key(ledger.id, generation), entry, TIMEOUT)
+    return entry
+
+
+def _entry(ledger):
+    entry = cache.get(cache_key(ledger.id, _generation(ledger.id)))
+    if entry is None or entry['currency'] != base_currency_for(ledger.owner_id):
+        entry = build(ledger)
+    return entry
+
+
+def recent_transactions(ledger, limit=RECENT_SIZE):
+    """The ledger's newest transactions, newest first"""
+    entry = _entry(ledger)
+    if len(entry['recent']) < limit and entry['has_more']:
+        # Deletes have drained the deque below what was asked for
+        entry = build(ledger)
+    return list(entry['recent'])[:limit]
+
+
+def top_categories(ledger, limit=TOP_CATEGORIES):
+    """(currency, rows) for the ledger's largest all-time expense categories"""
+    entry = _entry(ledger)
+    largest = heapq.nlargest(limit, entry['totals'].items(), key=lambda item: item[1][1])
+    return entry['currency'], [
+        {'category_id': category_id, 'category': name, 'amount': float(total)}
+        for category_id, (name, total) in largest if total > 0
+    ]
+
+
+def invalidate(ledger_id):
+    """Drop the entry once the current transaction commits"""
+    transaction.on_commit(lambda: _next_generation(ledger_id))
+
+
+def _patch(ledger_id, change):
+    def apply():
+        if not cache.add(lock_key(ledger_id), 1, LOCK_TIMEOUT):
+            # Another writer is patching; its copy would not include this change
+            _next_generation(ledger_id)
+            return
+        try:
+            key = cache_key(ledger_id, _generation(ledger_id))
+            entry = cache.get(key)
+            if entry is None or change(entry) is False:
+                # Also orphans a rebuild that read the database before this write committed
+                _next_generation(ledger_id)
+            else:
+                cache.set(key, entry, TIMEOUT)
+        finally:
+            cache.delete(lock_key(ledger_id))
+    transaction.on_commit(apply)
+
+
+def _add_total(entry, rates, category_id, name, amount, currency, on_date, sign):
+    value = rates.convert(Decimal(amount), currency, entry['currency'], on_date)
+    if value is None:
+        return False
+    total = entry['totals'].setdefault(category_id, [name, Decimal('0')])
+    total[0] = name or total[0]
+    total[1] += sign * value
+    return True
+
+
+def transaction_saved(instance):
+    """Fold a created or updated transaction into its ledger's entry"""
+    row, previous = _row(instance), getattr(instance, '_previous', None)
+
+    def change(entry):
+        recent = [item for item in entry['recent'] if item['id'] != row['id']]
+        if not (entry['has_more'] and recent and _sort_key(row) < _sort_key(recent[-1])):
+            # Rows older than the cached ones only fit when nothing else is uncached
+            recent.append(row)
+            recent.sort(key=_sort_key, reverse=True)
+            entry['has_more'] = entry['has_more'] or len(recent) > RECENT_SIZE
+        entry['recent'] = deque(recent[:RECENT_SIZE], maxlen=RECENT_SIZE)
+
+        rates = RateCache()
+        if previous and previous['type'] == 'expense' and not _add_total(
+            entry, rates, previous['category'], None,
+            previous['amount'], previous['currency'], previous['date'], -1
+        ):
+            return False
+        if instance.type == 'expense':
+            return _add_total(
+                entry, rates, instance.category_id, instance.category.name,
+                instance.amount, instance.currency, instance.date, 1
+            )
+    _patch(instance.ledger_id, change)
+
+
+def transaction_deleted(instance):
+    # Django clears the primary key once the delete finishes
+    pk = instance.pk
+
+    def change(entry):
+        entry['recent'] = deque(
+            (item for item in entry['recent'] if item['id'] != pk), maxlen=RECENT_SIZE
+        )
+        if instance.type == 'expense':
+            return _add_total(
+                entry, RateCache(), instance.category_id, instance.category.name,
+                instance.amount, instance.currency, instance.date, -1
+            )
+    _patch(instance.ledger_id, change)
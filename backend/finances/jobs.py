@@ -0,0 +1,168 @@
+"""
+Database-backed job queue.
+
+Jobs are rows in ``Job``; ``manage.py runworker`` claims and runs them, so no
+broker is needed. On PostgreSQL a worker claims the oldest ready job with
+``SELECT ... FOR UPDATE SKIP LOCKED``, letting many workers poll without
+blocking each other. Databases without SKIP LOCKED (SQLite) fall back to a
+compare-and-swap ``UPDATE ... WHERE status = 'queued'`` on a candidate row.
+
+Handlers are registered with ``@handler('kind')`` and called as
+``fn(job, report)``; ``report(done, total, message)`` records progress. A
+handler raising ``JobError`` fails the job at once, any other exception is
+retried with exponential backoff until ``max_attempts`` is reached.
+
+While a job runs, a side thread refreshes its ``locked_at`` every
+``HEARTBEAT_INTERVAL``, so ``requeue_stale`` only returns jobs whose worker has
+stopped for ``LOCK_TIMEOUT``, however long a live job takes. A worker that
+stalled that long loses the job: its progress and outcome are no longer
+recorded once another worker has claimed it.
+"""
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+HANDLERS = {}
+CLAIM_CANDIDATES = 10
+LOCK_TIMEOUT = timedelta(minutes=30)
+# Running jobs refresh locked_at this often, so only jobs of dead workers go stale
+HEARTBEAT_INTERVAL = LOCK_TIMEOUT / 6
+RETRY_BASE_SECONDS = 5
+
+
+class JobError(Exception):
+    """A failure that retrying cannot fix, such as invalid parameters"""
+
+
+def handler(kind):
+    """Register a function as the handler for jobs of this kind"""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, user=None, params=None, max_attempts=3):
+    if kind not in HANDLERS:
+        raise JobError(f'Unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, user=user, params=params or {}, max_attempts=max_attempts)
+
+
+def _claim_fields(worker_id, now):
+    return {
+        'status': 'running',
+        'locked_by': worker_id,
+        'locked_at': now,
+        'attempts': F('attempts') + 1,
+    }
+
+
+def claim_next(worker_id, kinds=None):
+    """Atomically take the oldest ready job for this worker, or None if the queue is empty"""
+    now = timezone.now()
+    ready = Job.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+    if kinds:
+        ready = ready.filter(kind__in=kinds)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = ready.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            Job.objects.filter(pk=pk).update(**_claim_fields(worker_id, now))
+        return Job.objects.get(pk=pk)
+
+    # Another worker may win the race for a candidate; try the next one
+    for pk in ready.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        if Job.objects.filter(pk=pk, status='queued').update(**_claim_fields(worker_id, now)):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _reporter(job):
+    def report(done, total=100, message=''):
+        job.progress = min(100, int(done * 100 / total)) if total else 100
+        Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+            progress=job.progress, message=message[:255]
+        )
+    return report
+
+
+@contextmanager
+def _heartbeat(job):
+    """Refresh the job's locked_at from a side thread while the block runs"""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT_INTERVAL.total_seconds()):
+                Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+                    locked_at=timezone.now()
+                )
+        finally:
+            # The thread's own connection
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome"""
+    # A job requeued from under this worker belongs to whoever claimed it next
+    owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise JobError(f'No handler registered for {job.kind}')
+        with _heartbeat(job):
+            result = fn(job, _reporter(job))
+    except Exception as exc:
+        retry = not isinstance(exc, JobError) and job.attempts < job.max_attempts
+        fields = {'error': traceback.format_exc()[-4000:], 'locked_by': '', 'locked_at': None}
+        if retry:
+            delay = timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+            fields.update(status='queued', run_after=timezone.now() + delay)
+        else:
+            fields.update(status='failed', finished_at=timezone.now(), message=str(exc)[:255])
+        owned.update(**fields)
+        return False
+
+    owned.update(
+        status='succeeded', progress=100, result=result, error='',
+        locked_by='', locked_at=None, finished_at=timezone.now()
+    )
+    return True
+
+
+def requeue_stale(timeout=LOCK_TIMEOUT):
+    """
+    Return jobs whose worker died mid-run to the queue, failing those out of
+    attempts. A live worker's heartbeat keeps its jobs' locked_at recent however
+    long they run.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timeout)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', message='Worker stopped responding', finished_at=now, locked_by='', locked_at=None
+    )
+    return stale.update(status='queued', locked_by='', locked_at=None)
+
+
+def cancel(job):
+    """Cancel a job that has not started yet; returns whether it was cancelled"""
+    return bool(Job.objects.filter(pk=job.pk, status='queued').update(
+        status='cancelled', finished_at=timezone.now()
+    ))
@@ -0,0 +1,147 @@
+"""
+Shared ledgers and per-request access resolution.
+
+Categories, transactions and budgets belong to a ``Ledger``. Every user has a
+personal ledger, which a request works on unless it names another one in the
+``X-Ledger`` header. Ledgers are shared through ``LedgerMembership`` roles:
+
+    owner   edits the ledger's data and manages its members
+    editor  edits categories, transactions and budgets
+    viewer  reads only
+
+A user's memberships are one small ``{ledger_id: access}`` map in the Django
+cache, dropped whenever one of them changes, and ``request_ledger`` picks the
+request's ledger out of it once. A drop only reaches other processes through a
+shared cache, so without one entries live ``LEDGER_ACCESS_CACHE_SECONDS`` (a
+few seconds by default) and a removed member loses access within that time.
+Views then filter on ``ledger_id`` through indexes that lead with it, so access
+is decided per request, never per row.
+Likewise ``request_categories`` loads the ledger's categories once per request,
+so serializers check every item's category in memory.
+"""
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+from .models import Category, Ledger, LedgerMembership
+
+LEDGER_HEADER = 'X-Ledger'
+WRITE_ROLES = {'owner', 'editor'}
+
+
+class LedgerAccess(NamedTuple):
+    id: int
+    role: str
+    is_personal: bool
+    owner_id: int
+
+    @property
+    def can_write(self):
+        return self.role in WRITE_ROLES
+
+    @property
+    def is_owner(self):
+        return self.role == 'owner'
+
+
+def _memberships_key(user_id):
+    return f'finances:ledgers:{user_id}'
+
+
+def _members_key(ledger_id):
+    return f'finances:ledger-members:{ledger_id}'
+
+
+def memberships(user_id):
+    """{ledger_id: LedgerAccess} for every ledger the user belongs to, including the personal one"""
+    key = _memberships_key(user_id)
+    access = cache.get(key)
+    if access is None:
+        rows = LedgerMembership.objects.filter(user_id=user_id).values_list(
+            'ledger_id', 'role', 'ledger__is_personal', 'ledger__owner_id'
+        )
+        access = {row[0]: LedgerAccess(*row) for row in rows}
+        if not any(ledger.is_personal for ledger in access.values()):
+            personal = Ledger.objects.personal_for(user_id)
+            access[personal.pk] = LedgerAccess(personal.pk, 'owner', True, user_id)
+        cache.set(key, access, settings.LEDGER_ACCESS_CACHE_SECONDS)
+    return access
+
+
+def personal_ledger(user_id):
+    return next(ledger for ledger in memberships(user_id).values() if ledger.is_personal)
+
+
+def member_ids(ledger_id):
+    """Ids of the users who can see the ledger"""
+    key = _members_key(ledger_id)
+    members = cache.get(key)
+    if members is None:
+        members = list(
+            LedgerMembership.objects.filter(ledger_id=ledger_id).order_by().values_list('user_id', flat=True)
+        )
+        cache.set(key, members, settings.LEDGER_ACCESS_CACHE_SECONDS)
+    return members
+
+
+def forget(user_id, ledger_id):
+    """Drop cached access after a membership of user_id in ledger_id changes"""
+    transaction.on_commit(lambda: cache.delete_many([_memberships_key(user_id), _members_key(ledger_id)]))
+
+
+def request_ledger(request):
+    """The ledger the request works on, looked up once per request"""
+    if not hasattr(request, '_ledger'):
+        access = memberships(request.user.pk)
+        requested = request.headers.get(LEDGER_HEADER, '')
+        if not requested:
+            request._ledger = personal_ledger(request.user.pk)
+        elif requested.isdigit() and int(requested) in access:
+            request._ledger = access[int(requested)]
+        else:
+            raise NotFound('Ledger not found.')
+    return request._ledger
+
+
+class CategoryRegistry:
+    """A ledger's categories by id and by name, loaded with one query on first use"""
+
+    def __init__(self, ledger_id):
+        self.ledger_id = ledger_id
+        self._by_id = None
+
+    def _load(self):
+        if self._by_id is None:
+            categories = Category.objects.filter(ledger_id=self.ledger_id).order_by()
+            self._by_id = {category.pk: category for category in categories}
+            self._by_name = {category.name: category for category in self._by_id.values()}
+
+    def get(self, pk):
+        self._load()
+        return self._by_id.get(pk)
+
+    def name_taken(self, name, exclude=None):
+        self._load()
+        category = self._by_name.get(name)
+        return category is not None and category != exclude
+
+
+def request_categories(request):
+    """Category registry of the request's ledger, shared by every serializer in the request"""
+    if not hasattr(request, '_categories'):
+        request._categories = CategoryRegistry(request_ledger(request).id)
+    return request._categories
+
+
+class LedgerPermission(BasePermission):
+    """Members may read the request's ledger; owners and editors may also change it"""
+    message = 'Viewers cannot change this ledger.'
+
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return request.method in SAFE_METHODS or request_ledger(request).can_write
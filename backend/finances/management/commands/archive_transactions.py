@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.archive import archive_user_transactions
+
+
+class Command(BaseCommand):
+    help = 'Move transactions from closed years into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before-year', type=int, required=True,
+            help='Archive every transaction dated before 1 January of this year'
+        )
+        parser.add_argument('--user', help='Only archive this username')
+
+    def handle(self, *args, **options):
+        year = options['before_year']
+        if year > date.today().year:
+            raise CommandError('Only closed years can be archived.')
+        cutoff = date(year, 1, 1)
+
+        users = User.objects.filter(transactions__date__lt=cutoff).distinct()
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        total = 0
+        for user in users.iterator():
+            moved = archive_user_transactions(user, cutoff)
+            total += moved
+            self.stdout.write(f'{user.username}: archived {moved} transactions')
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} transactions before {cutoff}'))
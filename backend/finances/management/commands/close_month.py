@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.snapshots import close_month, is_closed
+
+
+class Command(BaseCommand):
+    help = 'Freeze budget results for a closed month (defaults to last month)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int)
+        parser.add_argument('--month', type=int)
+        parser.add_argument('--user', help='Only snapshot this username')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        default = today.replace(day=1) - timedelta(days=1)
+        year = options['year'] or default.year
+        month = options['month'] or default.month
+        if not 1 <= month <= 12:
+            raise CommandError('Month must be between 1 and 12.')
+        if not is_closed(year, month, today):
+            raise CommandError('Only months that have ended can be closed.')
+
+        users = None
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+
+        written = close_month(year, month, users)
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {written} budgets for {year}-{month:02d}'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from finances.anomalies import DUPLICATE_WINDOW_DAYS, detect_anomalies
+from finances.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Flag near-duplicate and unusually large or small transactions for review'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only scan this username')
+        parser.add_argument(
+            '--window-days', type=int, default=DUPLICATE_WINDOW_DAYS,
+            help='How many days apart two transactions may be and still count as duplicates'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Transaction.objects.all()
+        if options['user']:
+            queryset = queryset.filter(user__username=options['user'])
+
+        start = time.perf_counter()
+        rows, duplicates, outliers = detect_anomalies(queryset, options['window_days'])
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {rows} transactions in {elapsed:.1f}s ({rate:,.0f} rows/s): '
+            f'{duplicates} duplicates, {outliers} outliers flagged'
+        ))
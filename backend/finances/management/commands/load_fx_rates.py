@@ -0,0 +1,48 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.models import ExchangeRate
+from finances.snapshots import mark_stale_from
+
+
+class Command(BaseCommand):
+    help = 'Load daily exchange rates from a CSV file with date,currency,rate columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file; rate is units of the pivot currency per unit')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='') as handle:
+                rates = [self._parse(row) for row in csv.DictReader(handle)]
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        # Re-loading a day overwrites its rate instead of failing on the unique constraint
+        ExchangeRate.objects.bulk_create(
+            rates,
+            batch_size=options['batch_size'],
+            update_conflicts=True,
+            unique_fields=['currency', 'date'],
+            update_fields=['rate'],
+        )
+        # Closed months converted with the old rates are recomputed on their next read
+        stale = mark_stale_from(min(rate.date for rate in rates)) if rates else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(rates)} rates against {settings.FX_PIVOT_CURRENCY}; {stale} budget snapshots to recompute'
+        ))
+
+    def _parse(self, row):
+        try:
+            return ExchangeRate(
+                date=date.fromisoformat(row['date']),
+                currency=row['currency'].strip().upper(),
+                rate=Decimal(row['rate']),
+            )
+        except (KeyError, ValueError, InvalidOperation):
+            raise CommandError(f'Invalid rate row: {row}')
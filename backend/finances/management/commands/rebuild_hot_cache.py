@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.hot_cache import build
+from finances.models import Ledger
+
+# Backends whose entries only this process can read
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-ledger recent transactions and top categories cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild ledgers owned by this username')
+
+    def handle(self, *args, **options):
+        if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+            raise CommandError(
+                'The cache is local to this process, so no server would read the rebuilt entries; '
+                'set REDIS_URL to share it.'
+            )
+        ledgers = Ledger.objects.filter(owner__is_active=True)
+        if options['user']:
+            ledgers = ledgers.filter(owner__username=options['user'])
+            if not ledgers.exists():
+                raise CommandError(f'No active user named {options["user"]}.')
+
+        rebuilt = 0
+        for ledger in ledgers.iterator():
+            build(ledger)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the hot cache for {rebuilt} ledgers'))
@@ -0,0 +1,76 @@
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from finances.jobs import claim_next, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Jobs to run at once in this process, each on its own thread and connection'
+        )
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument('--kind', action='append', dest='kinds', help='Only run jobs of this kind')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        requeue_stale()
+
+        def work(index):
+            worker_id = f'{name}:{index}'
+            processed = 0
+            while not stop.is_set():
+                # Drop broken or expired connections between jobs, as a request would
+                if not connection.in_atomic_block:
+                    close_old_connections()
+                job = claim_next(worker_id, options['kinds'])
+                if job is None:
+                    if options['burst']:
+                        break
+                    stop.wait(options['poll_interval'])
+                    continue
+                run_job(job)
+                processed += 1
+            return processed
+
+        if options['concurrency'] <= 1:
+            try:
+                processed = work(0)
+            except KeyboardInterrupt:
+                processed = 0
+            self.stdout.write(self.style.SUCCESS(f'Worker {name} processed {processed} jobs'))
+            return
+
+        counts = []
+
+        def thread_main(index):
+            try:
+                counts.append(work(index))
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=thread_main, args=(index,), daemon=True)
+            for index in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Let running jobs finish; queued ones stay for the next worker
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f'Worker {name} processed {sum(counts)} jobs'))
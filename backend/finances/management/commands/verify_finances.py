@@ -0,0 +1,100 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from finances.verification import CHECKS, verify_range, verify_users
+
+MAX_REPORTED = 20
+
+
+def describe(key):
+    user_id, *month = key
+    return f'user {user_id} {month[0]}-{month[1]:02d}' if month else f'user {user_id}'
+
+
+class Command(BaseCommand):
+    help = 'Check derived finance data against fresh aggregates, optionally repairing what does not match'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='append', dest='checks', choices=sorted(CHECKS), help='Only run this check'
+        )
+        parser.add_argument('--user', help='Only verify this username')
+        parser.add_argument('--repair', action='store_true', help='Repair the mismatched months')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users per unit of work')
+        parser.add_argument('--workers', type=int, default=1, help='Processes verifying chunks in parallel')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        names = options['checks'] or list(CHECKS)
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be at least 1.')
+        if options['workers'] > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--workers needs a platform that can fork; run with --workers 1.')
+
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('pk', flat=True))
+            if not user_ids:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            results = [verify_users(user_ids, names, options['repair'])]
+        else:
+            results = self.verify_all(names, options['repair'], options['chunk_size'], options['workers'])
+
+        # Fold chunk results as they arrive; only counts and a sample of keys are kept
+        checked = dict.fromkeys(names, 0)
+        mismatched = dict.fromkeys(names, 0)
+        samples = {name: [] for name in names}
+        for result in results:
+            for name, (count, keys) in result.items():
+                checked[name] += count
+                mismatched[name] += len(keys)
+                samples[name].extend(keys[:MAX_REPORTED - len(samples[name])])
+
+        for name in names:
+            line = f'{name}: {checked[name]} checked, {mismatched[name]} mismatched'
+            if mismatched[name] and options['repair']:
+                line += ', repaired'
+            self.stdout.write(line)
+            for key in samples[name]:
+                self.stdout.write(self.style.WARNING(f'  {describe(key)}'))
+            if mismatched[name] > len(samples[name]):
+                self.stdout.write(self.style.WARNING(f'  ... and {mismatched[name] - len(samples[name])} more'))
+
+        total = sum(mismatched.values())
+        if total and not options['repair']:
+            raise CommandError(f'{total} mismatches found; run with --repair to fix them.')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Verified {sum(checked.values())} keys in {elapsed:.2f}s, repaired {total if options["repair"] else 0}'
+        ))
+
+    def verify_all(self, names, repair, chunk_size, workers):
+        """Yield the results of every chunk of users, as ranges of ids"""
+        bounds = User.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return
+        ranges = ((first, first + chunk_size) for first in range(bounds['first'], bounds['last'] + 1, chunk_size))
+        if workers == 1:
+            for first, end in ranges:
+                yield verify_range(first, end, names, repair)
+            return
+
+        # Forked workers must not inherit an open connection, so the parent
+        # makes no queries from here on; each worker opens its own
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            pending = set()
+            for first, end in ranges:
+                # A couple of chunks per worker in flight keeps them busy without queueing every range
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(verify_range, first, end, names, repair))
+            for future in as_completed(pending):
+                yield future.result()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='is_archived',
+            field=models.BooleanField(default=False, help_text='Archived categories are hidden from new entries'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0007_multi_currency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryAmountStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('duplicate', 'Possible duplicate'), ('outlier', 'Unusual amount')], max_length=10)),
+                ('score', models.FloatField(help_text='Description similarity for duplicates, z-score for outliers')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Dismissed'), ('confirmed', 'Confirmed')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'amount', 'date'], name='transaction_dedupe_idx'),
+        ),
+        migrations.AddField(
+            model_name='categoryamountstats',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amount_stats', to='finances.category'),
+        ),
+        migrations.AddField(
+            model_name='transactionflag',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_flags', to='finances.transaction'),
+        ),
+        migrations.AddField(
+            model_name='transactionflag',
+            name='transaction',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flags', to='finances.transaction'),
+        ),
+        migrations.AddField(
+            model_name='transactionflag',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_flags', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryamountstats',
+            unique_together={('category', 'currency')},
+        ),
+        migrations.AddIndex(
+            model_name='transactionflag',
+            index=models.Index(fields=['user', 'status'], name='flag_user_status_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transactionflag',
+            unique_together={('transaction', 'kind')},
+        ),
+    ]
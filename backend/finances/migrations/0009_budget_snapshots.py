@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0008_anomaly_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetSnapshot',
+            fields=[
+                ('budget', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='finances.budget')),
+                ('actual_expenses', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('currency', models.CharField(max_length=3)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
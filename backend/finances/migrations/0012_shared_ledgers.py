@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def ledger_field(related_name, null=False):
+    return models.ForeignKey(
+        null=null, on_delete=django.db.models.deletion.CASCADE, related_name=related_name, to='finances.ledger'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0011_delta_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Schema, backfill and NOT NULL are separate migrations: PostgreSQL refuses to
+    # ALTER a table with pending trigger events from rows updated in the same transaction
+    operations = [
+        migrations.CreateModel(
+            name='Ledger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('is_personal', models.BooleanField(default=False, help_text='Every user has exactly one personal ledger')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owned_ledgers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-is_personal', 'name'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_personal', True)), fields=('owner',), name='one_personal_ledger')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('owner', 'Owner'), ('editor', 'Editor'), ('viewer', 'Viewer')], default='editor', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ledger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='finances.ledger')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'unique_together': {('user', 'ledger')},
+            },
+        ),
+        migrations.AddField(model_name='category', name='ledger', field=ledger_field('categories', null=True)),
+        migrations.AddField(model_name='transaction', name='ledger', field=ledger_field('transactions', null=True)),
+        migrations.AddField(model_name='budget', name='ledger', field=ledger_field('budgets', null=True)),
+        migrations.AddField(model_name='tombstone', name='ledger', field=ledger_field('tombstones', null=True)),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to=settings.AUTH_USER_MODEL
+            ),
+        ),
+    ]
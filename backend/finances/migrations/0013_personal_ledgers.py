@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+LEDGER_SCOPED = ['Category', 'Transaction', 'Budget', 'Tombstone']
+
+
+def create_personal_ledgers(apps, schema_editor):
+    # Every existing user gets a personal ledger holding all of their rows
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Ledger = apps.get_model('finances', 'Ledger')
+    LedgerMembership = apps.get_model('finances', 'LedgerMembership')
+
+    Ledger.objects.bulk_create([
+        Ledger(owner_id=user_id, name='Personal', is_personal=True)
+        for user_id in User.objects.values_list('id', flat=True).iterator()
+    ], batch_size=1000)
+    personal = Ledger.objects.filter(is_personal=True)
+    LedgerMembership.objects.bulk_create([
+        LedgerMembership(ledger_id=ledger_id, user_id=owner_id, role='owner')
+        for ledger_id, owner_id in personal.values_list('id', 'owner_id').iterator()
+    ], batch_size=1000)
+
+    owners_ledger = Subquery(personal.filter(owner_id=OuterRef('user_id')).values('id')[:1])
+    for name in LEDGER_SCOPED:
+        apps.get_model('finances', name).objects.update(ledger=owners_ledger)
+
+
+def restore_tombstone_users(apps, schema_editor):
+    # Reversing: tombstones go back to the owner of their ledger
+    Tombstone = apps.get_model('finances', 'Tombstone')
+    Ledger = apps.get_model('finances', 'Ledger')
+    Tombstone.objects.update(user=Subquery(Ledger.objects.filter(pk=OuterRef('ledger_id')).values('owner_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0012_shared_ledgers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_personal_ledgers, restore_tombstone_users),
+    ]
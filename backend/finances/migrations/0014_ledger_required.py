@@ -0,0 +1,70 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def ledger_field(related_name):
+    return models.ForeignKey(
+        on_delete=django.db.models.deletion.CASCADE, related_name=related_name, to='finances.ledger'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0013_personal_ledgers'),
+    ]
+
+    operations = [
+        migrations.AlterField(model_name='category', name='ledger', field=ledger_field('categories')),
+        migrations.AlterField(model_name='transaction', name='ledger', field=ledger_field('transactions')),
+        migrations.AlterField(model_name='budget', name='ledger', field=ledger_field('budgets')),
+        migrations.AlterField(model_name='tombstone', name='ledger', field=ledger_field('tombstones')),
+        migrations.RemoveIndex(
+            model_name='budget',
+            name='budget_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tombstone',
+            name='tombstone_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_sync_idx',
+        ),
+        migrations.RemoveField(
+            model_name='tombstone',
+            name='user',
+        ),
+        migrations.AlterUniqueTogether(
+            name='budget',
+            unique_together={('ledger', 'month', 'year', 'category')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together={('name', 'ledger')},
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['ledger', 'updated_at', 'id'], name='budget_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['ledger', 'updated_at', 'id'], name='category_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['ledger', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ledger', '-date', '-created_at'], name='transaction_ledger_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ledger', 'updated_at', 'id'], name='transaction_sync_idx'),
+        ),
+    ]
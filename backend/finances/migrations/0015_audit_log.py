@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0014_ledger_required'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Category'), ('transaction', 'Transaction'), ('budget', 'Budget')], max_length=11)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('c', 'created'), ('u', 'updated'), ('d', 'deleted')], max_length=1)),
+                ('changes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ledger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_entries', to='finances.ledger')),
+            ],
+            options={
+                'verbose_name_plural': 'audit entries',
+                'ordering': ['-at', '-id'],
+                'indexes': [models.Index(fields=['ledger', 'kind', 'object_id', 'at'], name='audit_object_idx'), models.Index(fields=['ledger', 'at'], name='audit_activity_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:07
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0015_audit_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavingsGoal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('target_amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('start_date', models.DateField(default=django.utils.timezone.localdate)),
+                ('deadline', models.DateField()),
+                ('saved', models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=14)),
+                ('is_stale', models.BooleanField(default=False, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('categories', models.ManyToManyField(related_name='savings_goals', to='finances.category')),
+                ('ledger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='savings_goals', to='finances.ledger')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='savings_goals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['deadline', 'id'],
+            },
+        ),
+    ]
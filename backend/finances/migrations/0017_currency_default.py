@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:52
+
+import finances.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0016_savings_goals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedmonthlytotal',
+            name='currency',
+            field=models.CharField(default=finances.models.default_currency, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='archivedtransaction',
+            name='currency',
+            field=models.CharField(default=finances.models.default_currency, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='base_currency',
+            field=models.CharField(default=finances.models.default_currency, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='savingsgoal',
+            name='currency',
+            field=models.CharField(default=finances.models.default_currency, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default=finances.models.default_currency, max_length=3),
+        ),
+    ]
@@ -1,9 +1,75 @@
-from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
 
+def default_currency():
+    # A callable, so migrations do not record the DEFAULT_CURRENCY of whoever generated them
+    return settings.DEFAULT_CURRENCY
+
+
+class LedgerManager(models.Manager):
+    def personal_for(self, user_id):
+        """The user's personal ledger, created with its owner membership on first use"""
+        ledger = self.filter(owner_id=user_id, is_personal=True).first()
+        if ledger is None:
+            with transaction.atomic():
+                ledger, created = self.get_or_create(
+                    owner_id=user_id, is_personal=True, defaults={'name': 'Personal'}
+                )
+                if created:
+                    LedgerMembership.objects.create(ledger=ledger, user_id=user_id, role='owner')
+        return ledger
+
+
+class Ledger(models.Model):
+    """A book of categories, transactions and budgets that one or more users share"""
+    name = models.CharField(max_length=100)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_ledgers')
+    is_personal = models.BooleanField(default=False, help_text="Every user has exactly one personal ledger")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = LedgerManager()
+    
+    class Meta:
+        ordering = ['-is_personal', 'name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner'], condition=models.Q(is_personal=True), name='one_personal_ledger'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.owner})"
+
+
+class LedgerMembership(models.Model):
+    """A user's role in a ledger"""
+    ROLES = [
+        ('owner', 'Owner'),
+        ('editor', 'Editor'),
+        ('viewer', 'Viewer'),
+    ]
+    
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_memberships')
+    role = models.CharField(max_length=10, choices=ROLES, default='editor')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        unique_together = ['user', 'ledger']
+    
+    def __str__(self):
+        return f"{self.user} is {self.role} of {self.ledger.name}"
+
+
 class Category(models.Model):
     """Category model for classifying transactions"""
     TRANSACTION_TYPES = [
@@ -13,16 +79,52 @@ class Category(models.Model):
     
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='categories')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        related_name='children',
+        null=True,
+        blank=True,
+        help_text="Leave blank for a top-level category"
+    )
+    # Materialized path of ancestor ids including this one, e.g. "/3/17/"
+    path = models.CharField(max_length=255, db_index=True, editable=False, blank=True)
+    is_archived = models.BooleanField(default=False, help_text="Archived categories are hidden from new entries")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
-        unique_together = ['name', 'user']
+        unique_together = ['name', 'ledger']
+        indexes = [
+            models.Index(fields=['ledger', 'updated_at', 'id'], name='category_sync_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.type})"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields and self.path:
+            return
+        
+        path = f"{self.parent.path if self.parent_id else '/'}{self.pk}/"
+        if path != self.path:
+            old_path, self.path = self.path, path
+            Category.objects.filter(pk=self.pk).update(path=path)
+            if old_path:
+                # Re-root the whole subtree in one statement
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                    updated_at=timezone.now()
+                )
+    
+    def is_descendant_of(self, other):
+        return bool(other.path) and self.path.startswith(other.path)
 
 
 class Transaction(models.Model):
@@ -32,6 +134,7 @@ class Transaction(models.Model):
         ('expense', 'Expense'),
     ]
     
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='transactions')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(
@@ -39,14 +142,22 @@ class Transaction(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
+    currency = models.CharField(max_length=3, default=default_currency)
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='transactions')
     date = models.DateField()
     description = models.TextField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['-date', '-created_at'], name='transaction_recent_idx'),
+            models.Index(fields=['ledger', '-date', '-created_at'], name='transaction_ledger_idx'),
+            models.Index(fields=['user', 'category', 'amount', 'date'], name='transaction_dedupe_idx'),
+            models.Index(fields=['ledger', 'updated_at', 'id'], name='transaction_sync_idx'),
+        ]
     
     def __str__(self):
         return f"{self.type.capitalize()}: {self.amount} - {self.category.name} ({self.date})"
@@ -54,6 +165,7 @@ class Transaction(models.Model):
 
 class Budget(models.Model):
     """Budget model for setting monthly spending limits"""
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='budgets')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
     month = models.IntegerField(validators=[MinValueValidator(1)])  # 1-12
     year = models.IntegerField(validators=[MinValueValidator(2000)])
@@ -70,14 +182,299 @@ class Budget(models.Model):
         blank=True,
         help_text="Leave blank for overall budget"
     )
+    version = models.PositiveIntegerField(default=1, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-year', '-month']
-        unique_together = ['user', 'month', 'year', 'category']
+        unique_together = ['ledger', 'month', 'year', 'category']
+        indexes = [
+            models.Index(fields=['ledger', 'updated_at', 'id'], name='budget_sync_idx'),
+        ]
     
     def __str__(self):
         category_str = f" - {self.category.name}" if self.category else " (Overall)"
         return f"Budget {self.year}-{self.month:02d}{category_str}: {self.amount}"
 
+
+class SavingsGoal(models.Model):
+    """
+    A target amount to save by a deadline. Transactions in the linked categories
+    dated from ``start_date`` count toward it; ``saved`` is kept up to date as
+    they are written.
+    """
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='savings_goals')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='savings_goals')
+    name = models.CharField(max_length=100)
+    target_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    currency = models.CharField(max_length=3, default=default_currency)
+    start_date = models.DateField(default=timezone.localdate)
+    deadline = models.DateField()
+    categories = models.ManyToManyField(Category, related_name='savings_goals')
+    saved = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'), editable=False)
+    # Set when a write could not be folded into saved; the next read recomputes it
+    is_stale = models.BooleanField(default=False, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['deadline', 'id']
+
+    def __str__(self):
+        return f"{self.name}: {self.saved}/{self.target_amount} {self.currency} by {self.deadline}"
+
+
+class Tombstone(models.Model):
+    """A deleted category, transaction or budget, kept so sync clients can drop their copy"""
+    KINDS = [
+        ('category', 'Category'),
+        ('transaction', 'Transaction'),
+        ('budget', 'Budget'),
+    ]
+    
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='tombstones')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['ledger', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id} ({self.deleted_at})"
+
+
+class ArchivedTransaction(models.Model):
+    """Compact cold copy of a transaction from a closed year"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_transactions')
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=default_currency)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='archived_transactions')
+    date = models.DateField()
+    description = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='archived_user_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived {self.type}: {self.amount} ({self.date})"
+
+
+class ArchivedMonthlyTotal(models.Model):
+    """Pre-aggregated monthly totals of archived transactions, used by summaries and budgets"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_totals')
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='archived_totals')
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    currency = models.CharField(max_length=3, default=default_currency)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField()
+    
+    class Meta:
+        # Not unique: category merges repoint rows and aggregates sum duplicates
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='archived_total_period_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.type} {self.category_id}: {self.total}"
+
+
+class ArchiveBoundary(models.Model):
+    """Per-user watermark: every transaction dated before archived_before lives in the archive"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='archive_boundary')
+    archived_before = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user} archived before {self.archived_before}"
+
+
+class ExchangeRate(models.Model):
+    """Daily FX rate: units of FX_PIVOT_CURRENCY per one unit of currency"""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    
+    class Meta:
+        ordering = ['currency', '-date']
+        unique_together = ['currency', 'date']
+    
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+
+class Profile(models.Model):
+    """Per-user finance preferences"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='finance_profile')
+    base_currency = models.CharField(max_length=3, default=default_currency)
+    
+    def __str__(self):
+        return f"{self.user} ({self.base_currency})"
+
+
+class TransactionFlag(models.Model):
+    """A suspected duplicate or outlier transaction, waiting for the user to review it"""
+    KINDS = [
+        ('duplicate', 'Possible duplicate'),
+        ('outlier', 'Unusual amount'),
+    ]
+    STATUSES = [
+        ('open', 'Open'),
+        ('dismissed', 'Dismissed'),
+        ('confirmed', 'Confirmed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction_flags')
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='flags')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    duplicate_of = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='duplicate_flags',
+        null=True,
+        blank=True
+    )
+    score = models.FloatField(help_text="Description similarity for duplicates, z-score for outliers")
+    status = models.CharField(max_length=10, choices=STATUSES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['transaction', 'kind']
+        indexes = [
+            models.Index(fields=['user', 'status'], name='flag_user_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: transaction {self.transaction_id} ({self.status})"
+
+
+class CategoryAmountStats(models.Model):
+    """Running mean and variance (Welford) of transaction amounts per category and currency"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='amount_stats')
+    currency = models.CharField(max_length=3)
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['category', 'currency']
+    
+    def __str__(self):
+        return f"{self.category_id} {self.currency}: n={self.count} mean={self.mean:.2f}"
+
+
+class BudgetSnapshot(models.Model):
+    """Actual spend of a budget in a closed month, frozen by the close_month job"""
+    budget = models.OneToOneField(Budget, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    actual_expenses = models.DecimalField(max_digits=14, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    is_stale = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        state = 'stale' if self.is_stale else 'fresh'
+        return f"Snapshot of budget {self.budget_id}: {self.actual_expenses} {self.currency} ({state})"
+
+
+class Job(models.Model):
+    """Background job run by ``manage.py runworker``"""
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_ready_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class AuditEntryQuerySet(models.QuerySet):
+    def delete(self):
+        # Deleting a ledger still takes its entries: cascades delete in SQL, not through here
+        raise TypeError('Audit entries are append-only.')
+
+
+class AuditEntry(models.Model):
+    """
+    One change to a category, transaction or budget, written once and never changed.
+
+    ``changes`` holds only what changed: ``{field: [old, new]}`` for an update and
+    ``{field: value}`` for a create or delete.
+    """
+    ACTIONS = [
+        ('c', 'created'),
+        ('u', 'updated'),
+        ('d', 'deleted'),
+    ]
+    
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name='audit_entries')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=11, choices=Tombstone.KINDS)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=1, choices=ACTIONS)
+    changes = models.JSONField(encoder=DjangoJSONEncoder)
+    at = models.DateTimeField(default=timezone.now)
+    
+    objects = AuditEntryQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-at', '-id']
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            models.Index(fields=['ledger', 'kind', 'object_id', 'at'], name='audit_object_idx'),
+            models.Index(fields=['ledger', 'at'], name='audit_activity_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError('Audit entries are append-only.')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise TypeError('Audit entries are append-only.')
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {self.get_action_display()} ({self.at})"
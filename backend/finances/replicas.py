@@ -0,0 +1,95 @@
+"""
+Read-replica routing.
+
+Replica aliases are listed in ``settings.REPLICA_DATABASES``. Reads stay on the
+primary unless a view opts in through ``ReplicaReadsMixin.replica_actions``;
+those actions read from a randomly chosen replica. Writes always go to the
+primary. After a user writes, ``StickyWritesMiddleware`` keeps that user's
+reads on the primary for ``REPLICA_STICKY_SECONDS`` so a change they just made
+cannot vanish while the replicas catch up.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_read_alias = ContextVar('finances_read_alias', default=None)
+
+
+def sticky_key(user_id):
+    return f'finances:sticky:{user_id}'
+
+
+def mark_recent_write(user_id):
+    cache.set(sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def wrote_recently(user_id):
+    return cache.get(sticky_key(user_id)) is not None
+
+
+def current_read_alias():
+    """The alias reads are routed to in the current context"""
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Routes reads to the replica chosen for the current view, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary, so rows from any alias may relate
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadsMixin:
+    """ViewSet mixin sending the reads of ``replica_actions`` to a replica"""
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.action in self.replica_actions
+            and settings.REPLICA_DATABASES
+            and not wrote_recently(request.user.id)
+        ):
+            self._replica_token = _read_alias.set(random.choice(settings.REPLICA_DATABASES))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = self.__dict__.pop('_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class StickyWritesMiddleware:
+    """Pins a user's reads to the primary for a short while after a successful write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the user it authenticated (token or session) onto the Django request
+        user = getattr(request, 'user', None)
+        if (
+            settings.REPLICA_DATABASES
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            mark_recent_write(user.pk)
+        return response
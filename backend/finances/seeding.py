@@ -0,0 +1,55 @@
+"""
+Bulk data generators for benchmarks and scale tests.
+
+Rows are written with ``bulk_create`` in batches so seeding millions of
+transactions stays bounded in memory. Generation is deterministic for a given
+seed so benchmark runs are comparable.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from .category_ops import create_default_categories
+from .models import Category, Ledger, Transaction
+
+
+def seed_user(username, password='benchpass123'):
+    """Get or create a user with the default category set"""
+    user, created = User.objects.get_or_create(username=username)
+    if created:
+        user.set_password(password)
+        user.save()
+        create_default_categories(user)
+    return user
+
+
+def seed_transactions(
+    user, count, start=None, days=3 * 365, batch_size=50_000, seed=0, currencies=None, ledger=None
+):
+    """Insert ``count`` random transactions by ``user`` into ``ledger`` (their personal one) spread over ``days`` days"""
+    rng = random.Random(seed)
+    currencies = currencies or [settings.DEFAULT_CURRENCY]
+    start = start or date.today() - timedelta(days=days)
+    categories = list(Category.objects.filter(ledger=ledger or Ledger.objects.personal_for(user.pk)))
+
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(batch_size, count - created)):
+            category = rng.choice(categories)
+            batch.append(Transaction(
+                user=user,
+                ledger_id=category.ledger_id,
+                type=category.type,
+                category=category,
+                amount=Decimal(rng.randint(100, 50_000)) / 100,
+                currency=rng.choice(currencies),
+                date=start + timedelta(days=rng.randrange(days)),
+                description=f'Seeded {category.name.lower()} #{created + len(batch)}',
+            ))
+        Transaction.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
@@ -1,67 +1,135 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, Transaction, Budget
+from .currency import (
+    base_currency_for, rate_cache_for, request_base_currency, request_knows_currency,
+)
+from .archive import ledger_archived_before
+from .ledgers import request_categories
+from .models import (
+    AuditEntry, Category, Job, Ledger, LedgerMembership, SavingsGoal, Transaction, TransactionFlag,
+    Budget, default_currency
+)
+from .goals import progress
+from .snapshots import budget_actual
+from .tasks import USER_JOB_KINDS
 from decimal import Decimal
 
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model"""
+    base_currency = serializers.SerializerMethodField()
+    
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'base_currency']
         read_only_fields = ['id']
+    
+    def get_base_currency(self, obj):
+        return base_currency_for(obj)
+
+
+class LedgerCategoryField(serializers.PrimaryKeyRelatedField):
+    """A category of the request's ledger, looked up in the request's category registry"""
+    default_error_messages = {
+        'does_not_exist': 'Invalid category selection.',
+        'incorrect_type': 'Incorrect type. Expected pk value, received {data_type}.',
+    }
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Category.objects.all())
+        super().__init__(**kwargs)
+    
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        category = request_categories(self.context['request']).get(pk)
+        if category is None:
+            self.fail('does_not_exist')
+        return category
 
 
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for Category model"""
-    user = serializers.ReadOnlyField(source='user.id')
+    user = serializers.ReadOnlyField(source='user_id')
+    parent = LedgerCategoryField(required=False, allow_null=True)
     
     class Meta:
         model = Category
-        fields = ['id', 'name', 'type', 'user', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
+        fields = ['id', 'name', 'type', 'parent', 'path', 'user', 'is_archived', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'path', 'user', 'is_archived', 'created_at', 'updated_at']
     
     def validate(self, data):
-        # Ensure the user can't create duplicate categories
-        user = self.context['request'].user
-        name = data.get('name')
+        # Names are checked against the ledger's categories in memory; the
+        # (name, ledger) constraint still catches a concurrent duplicate at save time
+        categories = request_categories(self.context['request'])
+        if 'name' in data and categories.name_taken(data['name'], exclude=self.instance):
+            raise serializers.ValidationError({'name': 'This ledger already has a category with this name.'})
         
-        if self.instance:  # Update
-            if Category.objects.filter(user=user, name=name).exclude(id=self.instance.id).exists():
-                raise serializers.ValidationError({'name': 'You already have a category with this name.'})
-        else:  # Create
-            if Category.objects.filter(user=user, name=name).exists():
-                raise serializers.ValidationError({'name': 'You already have a category with this name.'})
+        # Parent must be a category of the same ledger (see LedgerCategoryField) and type, outside this subtree
+        parent = data.get('parent')
+        if parent:
+            category_type = data.get('type', getattr(self.instance, 'type', None))
+            if parent.type != category_type:
+                raise serializers.ValidationError({'parent': 'Parent category must have the same type.'})
+            if self.instance and parent.is_descendant_of(self.instance):
+                raise serializers.ValidationError({'parent': 'A category cannot be nested under itself.'})
         
         return data
 
 
+def amount_in_base(request, amount, currency, on_date):
+    converted = rate_cache_for(request).convert(amount, currency, request_base_currency(request), on_date)
+    return str(converted) if converted is not None else None
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     """Serializer for Transaction model"""
-    user = serializers.ReadOnlyField(source='user.id')
+    user = serializers.ReadOnlyField(source='user_id')
     category_name = serializers.ReadOnlyField(source='category.name')
     category_type = serializers.ReadOnlyField(source='category.type')
+    category = LedgerCategoryField()
+    amount_in_base = serializers.SerializerMethodField()
+    # Live rows; archived ones come from TransactionRowSerializer with the same fields
+    archived = serializers.SerializerMethodField()
     
     class Meta:
         model = Transaction
         fields = [
-            'id', 'user', 'type', 'amount', 'category', 'category_name',
-            'category_type', 'date', 'description', 'created_at', 'updated_at'
+            'id', 'user', 'type', 'amount', 'currency', 'amount_in_base', 'category',
+            'category_name', 'category_type', 'date', 'description', 'version',
+            'created_at', 'updated_at', 'archived'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'version', 'created_at', 'updated_at']
     
     def validate_amount(self, value):
         if value <= 0:
             raise serializers.ValidationError("Amount must be greater than zero.")
         return value
     
+    def validate_currency(self, value):
+        value = value.upper()
+        if not request_knows_currency(self.context['request'], value):
+            raise serializers.ValidationError("No exchange rates are loaded for this currency.")
+        return value
+    
+    def get_amount_in_base(self, obj):
+        """Amount in the user's base currency, or null while a rate is missing"""
+        return amount_in_base(self.context['request'], obj.amount, obj.currency, obj.date)
+    
+    def get_archived(self, obj):
+        return False
+    
     def validate(self, data):
-        # Ensure category belongs to the user
-        user = self.context['request'].user
+        # LedgerCategoryField has already checked the category belongs to the request's ledger
         category = data.get('category')
         
-        if category and category.user != user:
-            raise serializers.ValidationError({'category': 'Invalid category selection.'})
+        # Archived categories keep their history but take no new transactions
+        if category and category.is_archived and (not self.instance or self.instance.category_id != category.id):
+            raise serializers.ValidationError({'category': 'This category is archived.'})
         
         # Validate that transaction type matches category type
         transaction_type = data.get('type')
@@ -70,13 +138,79 @@ class TransactionSerializer(serializers.ModelSerializer):
                 'category': f'Selected category is for {category.type}, but transaction type is {transaction_type}.'
             })
         
+        # A row no rate converts would drop out of every total summed in the base currency
+        request = self.context['request']
+        currency = data.get('currency', self.instance.currency if self.instance else default_currency())
+        on_date = data.get('date', self.instance.date if self.instance else None)
+        base = request_base_currency(request)
+        if on_date and not rate_cache_for(request).can_convert(currency, base, on_date):
+            raise serializers.ValidationError({
+                'date': f'No {currency} to {base} exchange rate is loaded on or before this date.'
+            })
+        
         return data
 
 
+class TransactionRowSerializer(serializers.Serializer):
+    """
+    Read-only serializer for transaction rows combined from live and archived
+    storage, with the same fields as TransactionSerializer
+    """
+    id = serializers.IntegerField()
+    user = serializers.IntegerField(source='user_id')
+    type = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    currency = serializers.CharField()
+    amount_in_base = serializers.SerializerMethodField()
+    category = serializers.IntegerField(source='category_id')
+    category_name = serializers.CharField()
+    category_type = serializers.CharField()
+    date = serializers.DateField()
+    description = serializers.CharField(allow_null=True)
+    version = serializers.IntegerField(source='row_version')
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField(source='row_updated_at')
+    archived = serializers.BooleanField()
+    
+    def get_amount_in_base(self, row):
+        return amount_in_base(self.context['request'], row['amount'], row['currency'], row['date'])
+
+
+class TransactionFlagSerializer(serializers.ModelSerializer):
+    """Serializer for review flags; only the status can be changed"""
+    transaction = TransactionSerializer(read_only=True)
+    
+    class Meta:
+        model = TransactionFlag
+        fields = ['id', 'kind', 'transaction', 'duplicate_of', 'score', 'status', 'created_at', 'reviewed_at']
+        read_only_fields = ['id', 'kind', 'duplicate_of', 'score', 'created_at', 'reviewed_at']
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background jobs; only kind and params are set by the client"""
+    kind = serializers.ChoiceField(choices=USER_JOB_KINDS)
+    
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'message', 'result',
+            'attempts', 'created_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'progress', 'message', 'result', 'attempts', 'created_at', 'finished_at'
+        ]
+    
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Params must be an object.")
+        return value
+
+
 class BudgetSerializer(serializers.ModelSerializer):
     """Serializer for Budget model"""
-    user = serializers.ReadOnlyField(source='user.id')
+    user = serializers.ReadOnlyField(source='user_id')
     category_name = serializers.ReadOnlyField(source='category.name')
+    category = LedgerCategoryField(required=False, allow_null=True)
     actual_expenses = serializers.SerializerMethodField()
     remaining = serializers.SerializerMethodField()
     percentage_used = serializers.SerializerMethodField()
@@ -86,9 +220,9 @@ class BudgetSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'month', 'year', 'amount', 'category',
             'category_name', 'actual_expenses', 'remaining',
-            'percentage_used', 'created_at', 'updated_at'
+            'percentage_used', 'version', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'version', 'created_at', 'updated_at']
     
     def validate_month(self, value):
         if not 1 <= value <= 12:
@@ -106,13 +240,9 @@ class BudgetSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, data):
-        # Ensure category belongs to the user (if provided)
-        user = self.context['request'].user
+        # LedgerCategoryField has already checked the category belongs to the request's ledger
         category = data.get('category')
         
-        if category and category.user != user:
-            raise serializers.ValidationError({'category': 'Invalid category selection.'})
-        
         # Ensure category is expense type (if provided)
         if category and category.type != 'expense':
             raise serializers.ValidationError({'category': 'Budget can only be set for expense categories.'})
@@ -120,29 +250,36 @@ class BudgetSerializer(serializers.ModelSerializer):
         return data
     
     def get_actual_expenses(self, obj):
-        """Calculate actual expenses for the budget period"""
-        from django.db.models import Sum
-        from datetime import date
-        
-        start_date = date(obj.year, obj.month, 1)
-        if obj.month == 12:
-            end_date = date(obj.year + 1, 1, 1)
-        else:
-            end_date = date(obj.year, obj.month + 1, 1)
-        
-        filters = {
-            'user': obj.user,
-            'type': 'expense',
-            'date__gte': start_date,
-            'date__lt': end_date,
-        }
-        
-        if obj.category:
-            filters['category'] = obj.category
+        """Actual expenses for the budget period, computed once per budget per response"""
+        actuals = self.__dict__.setdefault('_actuals', {})
+        if obj.pk not in actuals:
+            actuals[obj.pk] = self._actual_expenses(obj)
+        return actuals[obj.pk]
+    
+    def _actual_expenses(self, obj):
+        # Closed months are served from their snapshot until a write marks it stale;
+        # the refresh_snapshots job stores the new value, never this read
+        base = self._base_currency(obj.user_id)
+        snapshot = getattr(obj, 'snapshot', None) if obj.pk else None
+        if snapshot and not snapshot.is_stale and snapshot.currency == base:
+            return float(snapshot.actual_expenses)
         
-        total = Transaction.objects.filter(**filters).aggregate(total=Sum('amount'))['total']
+        total = budget_actual(obj, base, self._archived_before(obj.ledger))
         return float(total) if total else 0.0
     
+    def _base_currency(self, user_id):
+        request = self.context.get('request')
+        if request is not None and request.user.id == user_id:
+            return request_base_currency(request)
+        return base_currency_for(user_id)
+    
+    def _archived_before(self, ledger):
+        """Archive boundary per ledger, looked up once per serializer"""
+        boundaries = self.__dict__.setdefault('_boundaries', {})
+        if ledger.pk not in boundaries:
+            boundaries[ledger.pk] = ledger_archived_before(ledger)
+        return boundaries[ledger.pk]
+    
     def get_remaining(self, obj):
         """Calculate remaining budget"""
         actual = self.get_actual_expenses(obj)
@@ -156,8 +293,133 @@ class BudgetSerializer(serializers.ModelSerializer):
         return 0.0
 
 
+class SavingsGoalSerializer(serializers.ModelSerializer):
+    """Serializer for savings goals; progress is kept up to date by transaction writes"""
+    user = serializers.ReadOnlyField(source='user_id')
+    categories = LedgerCategoryField(many=True, allow_empty=False)
+    
+    class Meta:
+        model = SavingsGoal
+        fields = [
+            'id', 'user', 'name', 'target_amount', 'currency', 'start_date', 'deadline',
+            'categories', 'saved', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'user', 'currency', 'saved', 'created_at', 'updated_at']
+    
+    def validate_target_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Target amount must be greater than zero.")
+        return value
+    
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        deadline = data.get('deadline', getattr(self.instance, 'deadline', None))
+        if start_date and deadline and deadline <= start_date:
+            raise serializers.ValidationError({'deadline': 'Deadline must be after the start date.'})
+        return data
+
+
+class GoalProgressSerializer(serializers.ModelSerializer):
+    """Progress of a savings goal: what is left, the monthly pace it needs and when it will be reached"""
+    remaining = serializers.SerializerMethodField()
+    percent = serializers.SerializerMethodField()
+    required_monthly = serializers.SerializerMethodField()
+    projected_completion = serializers.SerializerMethodField()
+    on_track = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = SavingsGoal
+        fields = [
+            'id', 'name', 'currency', 'target_amount', 'saved', 'deadline', 'remaining', 'percent',
+            'required_monthly', 'projected_completion', 'on_track'
+        ]
+        read_only_fields = fields
+    
+    def _progress(self, obj):
+        """Progress of each goal, computed once per goal per response"""
+        computed = self.__dict__.setdefault('_computed', {})
+        if obj.pk not in computed:
+            computed[obj.pk] = progress(obj)
+        return computed[obj.pk]
+    
+    def get_remaining(self, obj):
+        return str(self._progress(obj)['remaining'])
+    
+    def get_percent(self, obj):
+        return float(self._progress(obj)['percent'])
+    
+    def get_required_monthly(self, obj):
+        return str(self._progress(obj)['required_monthly'])
+    
+    def get_projected_completion(self, obj):
+        projected = self._progress(obj)['projected_completion']
+        return projected.isoformat() if projected else None
+    
+    def get_on_track(self, obj):
+        return self._progress(obj)['on_track']
+
+
+class SyncBudgetSerializer(serializers.ModelSerializer):
+    """Stored budget fields for delta sync; spend changes without touching the budget row"""
+    user = serializers.ReadOnlyField(source='user_id')
+    category_name = serializers.ReadOnlyField(source='category.name')
+    
+    class Meta:
+        model = Budget
+        fields = [
+            'id', 'user', 'month', 'year', 'amount', 'category', 'category_name',
+            'version', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class LedgerSerializer(serializers.ModelSerializer):
+    """Serializer for ledgers, with the requesting user's role"""
+    owner = serializers.ReadOnlyField(source='owner_id')
+    role = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Ledger
+        fields = ['id', 'name', 'owner', 'is_personal', 'role', 'created_at']
+        read_only_fields = ['id', 'owner', 'is_personal', 'role', 'created_at']
+
+    def get_role(self, obj):
+        access = self.context.get('access', {}).get(obj.pk)
+        return access.role if access else 'owner'
+
+
+class LedgerMemberSerializer(serializers.ModelSerializer):
+    """Serializer for ledger members; new members are added by username"""
+    user = serializers.ReadOnlyField(source='user_id')
+    username = serializers.SlugRelatedField(
+        source='user', slug_field='username', queryset=User.objects.filter(is_active=True)
+    )
+
+    class Meta:
+        model = LedgerMembership
+        fields = ['id', 'user', 'username', 'role', 'created_at']
+        read_only_fields = ['id', 'user', 'created_at']
+
+    def validate_role(self, value):
+        if value == 'owner':
+            raise serializers.ValidationError("A ledger has exactly one owner.")
+        return value
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    """Read-only serializer for audit log entries"""
+    actor = serializers.ReadOnlyField(source='actor_id')
+    action = serializers.ReadOnlyField(source='get_action_display')
+    
+    class Meta:
+        model = AuditEntry
+        fields = ['id', 'kind', 'object_id', 'action', 'changes', 'actor', 'at']
+        read_only_fields = fields
+
+
 class FinancialSummarySerializer(serializers.Serializer):
     """Serializer for financial summary data"""
+    currency = serializers.CharField()
     total_income = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_expenses = serializers.DecimalField(max_digits=10, decimal_places=2)
     balance = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -0,0 +1,186 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .anomalies import check_transaction
+from . import audit, goals, hot_cache, ledgers, sync
+from .events import budget_delta, category_delta, publish_to_ledger, transaction_delta
+from .models import Budget, BudgetSnapshot, Category, Ledger, LedgerMembership, SavingsGoal, Transaction
+from .snapshots import invalidate, mark_ledger_stale, mark_stale
+
+# Stored before an update so snapshots and live clients can undo the old values
+PREVIOUS_FIELDS = ('type', 'amount', 'currency', 'category_id', 'date')
+
+
+@receiver(post_save, sender=User)
+def create_personal_ledger(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Ledger.objects.personal_for(instance.pk)
+
+
+def default_to_personal_ledger(sender, instance, raw=False, **kwargs):
+    # Rows created without a ledger, as before ledgers existed, go to their user's personal one
+    if instance.ledger_id is None and instance.user_id is not None and not raw:
+        instance.ledger_id = ledgers.personal_ledger(instance.user_id).id
+
+
+for model in (Category, Transaction, Budget):
+    pre_save.connect(default_to_personal_ledger, sender=model, dispatch_uid=f'default_ledger_{model.__name__}')
+
+
+@receiver(post_save, sender=LedgerMembership)
+@receiver(post_delete, sender=LedgerMembership)
+def forget_ledger_access(sender, instance, **kwargs):
+    ledgers.forget(instance.user_id, instance.ledger_id)
+
+
+@receiver(post_save, sender=Transaction)
+def flag_new_transaction(sender, instance, created, raw=False, **kwargs):
+    """Check single writes as they happen; the bulk endpoint checks its rows together"""
+    if created and not raw:
+        check_transaction(instance)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    if not instance._state.adding and not raw:
+        # The same read gives the audit log its old values
+        row = audit.read_previous(instance, extra=PREVIOUS_FIELDS)
+        previous = None
+        if row:
+            previous = {field: row[field] for field in PREVIOUS_FIELDS}
+            previous['category'] = previous.pop('category_id')
+        instance._previous = previous
+
+
+@receiver(post_save, sender=Transaction)
+def invalidate_snapshots_on_save(sender, instance, raw=False, **kwargs):
+    # A transaction moved out of a closed month invalidates that month too
+    if not raw:
+        previous = getattr(instance, '_previous', None) or {}
+        mark_stale(instance.ledger_id, instance.date, previous.get('date'))
+
+
+@receiver(post_delete, sender=Transaction)
+def invalidate_snapshots_on_delete(sender, instance, **kwargs):
+    # Set-based deletes mark their months stale once (or take the budgets with them)
+    if sync.deletions_recorded():
+        mark_stale(instance.ledger_id, instance.date)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_snapshots_on_move(sender, instance, created, raw=False, **kwargs):
+    # Budgets count their category's subtree, so moving a category changes past
+    # actuals; the old parent was read for the audit log in pre_save
+    previous = getattr(instance, '_audit_previous', {})
+    if not created and not raw and 'parent' in previous and previous['parent'] != instance.parent_id:
+        mark_ledger_stale(instance.ledger_id)
+
+
+@receiver(post_save, sender=Budget)
+def invalidate_budget_snapshot(sender, instance, created, raw=False, **kwargs):
+    # An edit may change the category or period the snapshot measured
+    if not created and not raw:
+        invalidate(BudgetSnapshot.objects.filter(budget=instance))
+
+
+@receiver(post_save, sender=Transaction)
+def update_hot_cache_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        hot_cache.transaction_saved(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_hot_cache_on_delete(sender, instance, **kwargs):
+    # Set-based deletes drop the ledger's entry once instead
+    if sync.deletions_recorded():
+        hot_cache.transaction_deleted(instance)
+
+
+@receiver(post_save, sender=Transaction)
+def update_goals_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        goals.transaction_saved(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_goals_on_delete(sender, instance, **kwargs):
+    # Archived rows still count toward their goals (recompute reads the archive)
+    if sync.deletions_recorded():
+        goals.transaction_deleted(instance)
+
+
+@receiver(m2m_changed, sender=SavingsGoal.categories.through)
+def touch_relinked_goals(sender, instance, action, reverse, pk_set, **kwargs):
+    # Category deletions remove links without signals; the cached entry then
+    # only names a category no transaction can use any more
+    if action in ('post_add', 'post_remove'):
+        goals.touch(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear':
+        goals.touch(list(instance.savings_goals.values_list('pk', flat=True)) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def invalidate_hot_cache_on_category(sender, instance, created, raw=False, **kwargs):
+    # Cached rows and totals carry category names
+    if not created and not raw:
+        hot_cache.invalidate(instance.ledger_id)
+
+
+DELTAS = {
+    Transaction: ('transaction', transaction_delta),
+    Budget: ('budget', budget_delta),
+    Category: ('category', category_delta),
+}
+
+
+def publish_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        name, delta = DELTAS[sender]
+        action = 'created' if created else 'updated'
+        publish_to_ledger(instance.ledger_id, {'type': f'{name}.{action}', 'data': delta(instance)})
+
+
+def publish_deleted(sender, instance, **kwargs):
+    # Set-based deletes that keep the rows elsewhere publish one resync instead
+    if not sync.deletions_recorded():
+        return
+    name, delta = DELTAS[sender]
+    publish_to_ledger(instance.ledger_id, {'type': f'{name}.deleted', 'data': delta(instance)})
+
+
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # Deleting the account takes the user's tombstones with it
+    if not isinstance(origin, User):
+        sync.record_deletion(instance)
+
+
+for model in DELTAS:
+    post_save.connect(publish_saved, sender=model, dispatch_uid=f'publish_saved_{model.__name__}')
+    post_delete.connect(publish_deleted, sender=model, dispatch_uid=f'publish_deleted_{model.__name__}')
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'record_tombstone_{model.__name__}')
+
+
+def remember_audited_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not instance._state.adding and not raw:
+        audit.read_previous(instance, update_fields)
+
+
+def audit_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        audit.record_saved(instance, created)
+
+
+def audit_deleted(sender, instance, origin=None, **kwargs):
+    # The account's ledgers, and with them their log, are going too; archived
+    # rows are moved rather than deleted
+    if not isinstance(origin, User) and sync.deletions_recorded():
+        audit.record_deleted(instance)
+
+
+# Transactions are read by remember_previous_values
+for model in (Category, Budget):
+    pre_save.connect(remember_audited_values, sender=model, dispatch_uid=f'audit_previous_{model.__name__}')
+for model in audit.AUDITED_FIELDS:
+    post_save.connect(audit_saved, sender=model, dispatch_uid=f'audit_saved_{model.__name__}')
+    post_delete.connect(audit_deleted, sender=model, dispatch_uid=f'audit_deleted_{model.__name__}')
@@ -0,0 +1,130 @@
+"""
+Frozen budget results for closed months.
+
+A month is closed once the calendar has moved past it. ``close_month`` stores
+each budget's actual spend in ``BudgetSnapshot`` and the budget serializer
+serves that value instead of aggregating transactions again. Writes that land
+in a closed month -- back-dated transactions, category merges and moves,
+exchange rates loaded for past days -- mark the affected snapshots stale and
+queue a ``refresh_snapshots`` job, which recomputes every stale snapshot with
+the rows locked. Until it has run, reads aggregate the month themselves; they
+never write, so they can be served by a replica.
+"""
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .currency import base_currency_for, converted_amount, converted_monthly_total
+from .jobs import enqueue
+from .models import ArchiveBoundary, ArchivedMonthlyTotal, Budget, BudgetSnapshot, Transaction
+
+
+def month_bounds(year, month):
+    """First day of the month and first day of the next month"""
+    start = date(year, month, 1)
+    return start, date(year + month // 12, month % 12 + 1, 1)
+
+
+def is_closed(year, month, today=None):
+    today = today or date.today()
+    return date(year, month, 1) < today.replace(day=1)
+
+
+def budget_actual(budget, base, boundary):
+    """Spend against the budget in its month, in base currency, from live and archived data"""
+    start_date, end_date = month_bounds(budget.year, budget.month)
+    filters = {'type': 'expense'}
+    if budget.category_id:
+        # Parent budgets count spend in every descendant category
+        filters['category__path__startswith'] = budget.category.path
+    
+    total = Transaction.objects.filter(
+        ledger_id=budget.ledger_id, date__gte=start_date, date__lt=end_date, **filters
+    ).aggregate(total=Sum(converted_amount(base)))['total'] or 0
+    
+    # Months in closed years are answered from the archived monthly totals;
+    # boundary is only set for personal ledgers, whose archive is the owner's
+    if boundary and start_date < boundary:
+        total += ArchivedMonthlyTotal.objects.filter(
+            user_id=budget.user_id, year=budget.year, month=budget.month, **filters
+        ).aggregate(total=Sum(converted_monthly_total(base)))['total'] or 0
+    return round(total, 2)
+
+
+def store_snapshots(snapshots):
+    BudgetSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['budget'],
+        update_fields=['actual_expenses', 'currency', 'is_stale', 'computed_at'],
+    )
+
+
+def _snapshot(budgets):
+    """Compute and store the snapshots of budgets; returns the number written"""
+    bases, boundaries, snapshots = {}, {}, []
+    for budget in budgets.select_related('category', 'ledger').iterator():
+        if budget.user_id not in bases:
+            bases[budget.user_id] = base_currency_for(budget.user_id)
+        if budget.ledger_id not in boundaries:
+            boundaries[budget.ledger_id] = ArchiveBoundary.objects.filter(
+                user_id=budget.ledger.owner_id
+            ).values_list('archived_before', flat=True).first() if budget.ledger.is_personal else None
+        base = bases[budget.user_id]
+        snapshots.append(BudgetSnapshot(
+            budget=budget,
+            actual_expenses=budget_actual(budget, base, boundaries[budget.ledger_id]),
+            currency=base,
+        ))
+    store_snapshots(snapshots)
+    return len(snapshots)
+
+
+def close_month(year, month, users=None):
+    """Snapshot every budget of a closed month; returns the number of snapshots written"""
+    budgets = Budget.objects.filter(year=year, month=month)
+    if users is not None:
+        budgets = budgets.filter(user__in=users)
+    return _snapshot(budgets)
+
+
+def refresh_stale():
+    """Recompute every stale snapshot; returns the number refreshed"""
+    with transaction.atomic():
+        # A write marking one stale again waits for this transaction, so its mark is never lost
+        budget_ids = list(
+            BudgetSnapshot.objects.select_for_update().filter(is_stale=True).values_list('budget_id', flat=True)
+        )
+        return _snapshot(Budget.objects.filter(pk__in=budget_ids)) if budget_ids else 0
+
+
+def invalidate(snapshots):
+    """Mark the fresh snapshots of a queryset stale and queue their refresh; returns the number marked"""
+    marked = snapshots.filter(is_stale=False).update(is_stale=True)
+    if marked:
+        transaction.on_commit(lambda: enqueue('refresh_snapshots'))
+    return marked
+
+
+def mark_stale(ledger_id, *dates):
+    """Invalidate the ledger's snapshots for the closed months containing dates"""
+    months = {(day.year, day.month) for day in dates if day and is_closed(day.year, day.month)}
+    if not months:
+        return 0
+    in_months = Q()
+    for year, month in months:
+        in_months |= Q(budget__year=year, budget__month=month)
+    return invalidate(BudgetSnapshot.objects.filter(in_months, budget__ledger_id=ledger_id))
+
+
+def mark_ledger_stale(ledger_id):
+    """Invalidate every snapshot of a ledger, after changes that can touch any month"""
+    return invalidate(BudgetSnapshot.objects.filter(budget__ledger_id=ledger_id))
+
+
+def mark_stale_from(day):
+    """Invalidate the snapshots of every month ending on or after day, after the exchange rates from day on change"""
+    return invalidate(BudgetSnapshot.objects.filter(
+        Q(budget__year__gt=day.year) | Q(budget__year=day.year, budget__month__gte=day.month)
+    ))
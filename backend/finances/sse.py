@@ -0,0 +1,94 @@
+"""
+Server-sent events endpoint, mounted by ``budget_tracker.asgi`` at ``/api/events/``.
+
+This is a bare ASGI app rather than a Django view so an idle connection costs
+one coroutine and one queue, not a worker thread. Browsers' ``EventSource``
+cannot send headers, so the auth token comes in the ``token`` query parameter.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.authtoken.models import Token
+
+from .events import get_broker
+
+EVENTS_PATH = '/api/events/'
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+@sync_to_async
+def _user_id_for_token(key):
+    return Token.objects.filter(key=key, user__is_active=True).values_list('user_id', flat=True).first()
+
+
+def _cors_headers(scope):
+    origin = dict(scope.get('headers', [])).get(b'origin', b'')
+    if origin and origin.decode() in settings.CORS_ALLOWED_ORIGINS:
+        return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+    return []
+
+
+def format_event(event):
+    payload = json.dumps(event, cls=DjangoJSONEncoder)
+    event_id = f'id: {event["id"]}\n' if 'id' in event else ''
+    return f'{event_id}event: {event["type"]}\ndata: {payload}\n\n'.encode()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send):
+    key = parse_qs(scope.get('query_string', b'').decode()).get('token', [''])[0]
+    user_id = await _user_id_for_token(key) if key else None
+    if user_id is None:
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json'), *_cors_headers(scope)],
+        })
+        await send({'type': 'http.response.body', 'body': b'{"detail": "Invalid token."}'})
+        return
+
+    broker = get_broker()
+    queue = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *_cors_headers(scope),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(),
+            'more_body': True,
+        })
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                break
+            if getter in done:
+                chunk = format_event(getter.result())
+            else:
+                getter.cancel()
+                chunk = b': ping\n\n'
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        broker.unsubscribe(user_id, queue)
+        disconnected.cancel()
@@ -0,0 +1,221 @@
+"""
+Aggregation helpers behind the summary endpoint.
+
+A summary may need to combine several row sources: the live transaction table
+and, for date ranges reaching into closed years, either the archived copy or
+its pre-aggregated monthly totals. Each source runs its own grouped query and
+the (small) grouped results are merged here. Sources can be switched to sum
+in a base currency, converting inside each query.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Q, Sum, Value, When
+from django.db.models.functions import StrIndex, Substr, TruncMonth
+
+from .currency import CONVERTED, converted_amount, converted_monthly_total
+from .models import Category
+
+
+class TransactionSource:
+    """Row-level source: the transaction table or the archived copy"""
+    amount_field = 'amount'
+
+    def __init__(self, queryset, amount=None):
+        self.queryset = queryset
+        self.amount = amount if amount is not None else self.amount_field
+
+    def filter(self, *args, **kwargs):
+        return type(self)(self.queryset.filter(*args, **kwargs), self.amount)
+
+    def in_currency(self, base):
+        """Same rows, summed in base currency"""
+        return type(self)(self.queryset, converted_amount(base, self.amount_field))
+
+    def period(self, start, end):
+        """Condition selecting rows dated within [start, end]"""
+        return Q(date__range=(start, end))
+
+    def monthly(self):
+        rows = self.queryset.annotate(
+            month=TruncMonth('date')
+        ).values('month', 'type').annotate(
+            total=Sum(self.amount)
+        ).order_by()
+        return [(item['month'].strftime('%Y-%m'), item['type'], item['total']) for item in rows]
+
+
+class MonthlyTotalSource(TransactionSource):
+    """Pre-aggregated source: archived monthly totals per category and currency"""
+    amount_field = 'total'
+
+    def in_currency(self, base):
+        return type(self)(self.queryset, converted_monthly_total(base, self.amount_field))
+
+    def period(self, start, end):
+        """Condition selecting the months overlapping [start, end]"""
+        return (
+            (Q(year__gt=start.year) | Q(year=start.year, month__gte=start.month))
+            & (Q(year__lt=end.year) | Q(year=end.year, month__lte=end.month))
+        )
+
+    def monthly(self):
+        rows = self.queryset.values('year', 'month', 'type').annotate(
+            total=Sum(self.amount)
+        ).order_by()
+        return [(f"{item['year']}-{item['month']:02d}", item['type'], item['total']) for item in rows]
+
+
+def totals_by_type(sources):
+    """Income and expense totals across all sources"""
+    totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+    for source in sources:
+        rows = source.queryset.values('type').annotate(total=Sum(source.amount)).order_by()
+        for item in rows:
+            totals[item['type']] += item['total'] or Decimal('0')
+    return totals
+
+
+def _merge_ranked(groups):
+    """Sort merged {key: [label, total]} groups by total, largest first"""
+    ranked = sorted(groups.items(), key=lambda item: item[1][1], reverse=True)
+    return [
+        {'category': label, 'category_id': key, 'amount': float(total)}
+        for key, (label, total) in ranked
+    ]
+
+
+def category_breakdown(sources, transaction_type):
+    """Totals per leaf category"""
+    groups = {}
+    for source in sources:
+        rows = source.queryset.filter(type=transaction_type).values(
+            'category__id', 'category__name'
+        ).annotate(total=Sum(source.amount)).order_by()
+        for item in rows:
+            group = groups.setdefault(item['category__id'], [item['category__name'], Decimal('0')])
+            group[1] += item['total'] or Decimal('0')
+    return _merge_ranked(groups)
+
+
+def subtree_breakdown(sources, transaction_type, ledger_id, parent=None):
+    """
+    Subtree totals for each direct child of parent (or each top-level category)
+
+    Each row is grouped by the prefix of its category path one level below
+    parent, so the rollup is a single GROUP BY over the indexed path per source.
+    """
+    prefix = parent.path if parent else '/'
+    depth = len(prefix)
+    group_path = Substr(
+        'category__path', 1,
+        depth + StrIndex(Substr('category__path', depth + 1), Value('/'))
+    )
+
+    totals = {}
+    for source in sources:
+        rows = source.queryset.filter(type=transaction_type).annotate(
+            group_path=group_path
+        ).values('group_path').annotate(total=Sum(source.amount)).order_by()
+        for item in rows:
+            totals[item['group_path']] = totals.get(item['group_path'], Decimal('0')) + (item['total'] or 0)
+
+    names = dict(Category.objects.filter(ledger_id=ledger_id, path__in=totals).values_list('path', 'name'))
+    groups = {
+        int(path.strip('/').rsplit('/', 1)[-1]): [names.get(path), total]
+        for path, total in totals.items()
+    }
+    return _merge_ranked(groups)
+
+
+def monthly_trend(sources):
+    """Income and expense per month, oldest first"""
+    months = {}
+    for source in sources:
+        for month, transaction_type, total in source.monthly():
+            entry = months.setdefault(month, {'month': month, 'income': 0, 'expense': 0})
+            entry[transaction_type] += float(total or 0)
+    return [months[month] for month in sorted(months)]
+
+
+COMPARE_PRESETS = {'mom': 1, 'yoy': 12}
+
+
+def preset_periods(preset, as_of, count=2):
+    """
+    Whole-month periods ending with the month of as_of, oldest (the baseline) first
+
+    ``mom`` steps back one month at a time, ``yoy`` takes the same month in
+    earlier years.
+    """
+    step = COMPARE_PRESETS[preset]
+    last = as_of.year * 12 + as_of.month - 1
+    periods = []
+    for offset in reversed(range(count)):
+        year, month = divmod(last - step * offset, 12)
+        start = date(year, month + 1, 1)
+        next_start = date(year + (month + 1) // 12, (month + 1) % 12 + 1, 1)
+        periods.append((start, next_start - timedelta(days=1)))
+    return periods
+
+
+def _changes(totals):
+    """Delta and percentage change of each period against the baseline (first) period"""
+    baseline = totals[0]
+    return [
+        {
+            'delta': round(float(total - baseline), 2),
+            'percent': round(float((total - baseline) / baseline * 100), 2) if baseline else None,
+        }
+        for total in totals[1:]
+    ]
+
+
+def compare_periods(sources, periods):
+    """
+    Per-category and per-period totals for every (start, end) period
+
+    Each period is a conditional SUM over one grouped scan, so a source costs a
+    single query however many periods are compared. Changes are measured
+    against the first period.
+    """
+    groups = {}
+    for source in sources:
+        conditions = [source.period(start, end) for start, end in periods]
+        columns = {
+            f'period_{index}': Sum(Case(When(condition, then=source.amount), output_field=CONVERTED))
+            for index, condition in enumerate(conditions)
+        }
+        rows = source.queryset.filter(reduce(or_, conditions)).values(
+            'category__id', 'category__name', 'type'
+        ).annotate(**columns).order_by()
+        for item in rows:
+            group = groups.setdefault(item['category__id'], {
+                'category_id': item['category__id'],
+                'category': item['category__name'],
+                'type': item['type'],
+                'totals': [Decimal('0')] * len(periods),
+            })
+            for index in range(len(periods)):
+                group['totals'][index] += item[f'period_{index}'] or Decimal('0')
+
+    summary = []
+    for index, (start, end) in enumerate(periods):
+        totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+        for group in groups.values():
+            totals[group['type']] += group['totals'][index]
+        summary.append({
+            'start': start,
+            'end': end,
+            'income': float(totals['income']),
+            'expense': float(totals['expense']),
+            'balance': float(totals['income'] - totals['expense']),
+        })
+
+    categories = sorted(groups.values(), key=lambda group: max(group['totals']), reverse=True)
+    for group in categories:
+        group['changes'] = _changes(group['totals'])
+        group['totals'] = [float(total) for total in group['totals']]
+    return summary, categories
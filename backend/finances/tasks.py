@@ -0,0 +1,91 @@
+"""
+Job handlers for the background queue.
+
+Each handler works on ``job.user``'s data when the job has a user, which is
+always the case for jobs created through the API. Forecasts read the user's
+personal ledger.
+"""
+from datetime import date
+
+from .anomalies import DUPLICATE_WINDOW_DAYS, detect_anomalies
+from .archive import archive_user_transactions
+from .currency import base_currency_for, converted_amount
+from .forecasting import FORECAST_METHODS, forecast_budgets
+from .jobs import JobError, handler
+from .models import Budget, Ledger, Transaction
+from .snapshots import close_month, is_closed, refresh_stale
+
+# Kinds users may enqueue through /api/jobs/
+USER_JOB_KINDS = ('detect_anomalies', 'forecast', 'close_month', 'archive_transactions')
+
+
+def _int_param(job, name, default=None):
+    try:
+        return int(job.params.get(name, default))
+    except (TypeError, ValueError):
+        raise JobError(f'{name} must be an integer')
+
+
+@handler('noop')
+def noop(job, report):
+    """Does nothing; measures queue overhead"""
+    return {}
+
+
+@handler('detect_anomalies')
+def run_detect_anomalies(job, report):
+    queryset = Transaction.objects.all()
+    if job.user_id:
+        queryset = queryset.filter(user_id=job.user_id)
+    report(0, message='Scanning transactions')
+    rows, duplicates, outliers = detect_anomalies(
+        queryset, _int_param(job, 'window_days', DUPLICATE_WINDOW_DAYS)
+    )
+    return {'rows': rows, 'duplicates': duplicates, 'outliers': outliers}
+
+
+@handler('close_month')
+def run_close_month(job, report):
+    year, month = _int_param(job, 'year'), _int_param(job, 'month')
+    if not 1 <= month <= 12 or not is_closed(year, month):
+        raise JobError('Only months that have ended can be closed.')
+    users = [job.user_id] if job.user_id else None
+    return {'snapshots': close_month(year, month, users)}
+
+
+@handler('refresh_snapshots')
+def run_refresh_snapshots(job, report):
+    """Queued whenever snapshots are marked stale"""
+    return {'snapshots': refresh_stale()}
+
+
+@handler('archive_transactions')
+def run_archive_transactions(job, report):
+    year = _int_param(job, 'before_year')
+    if job.user is None or year > date.today().year:
+        raise JobError('Archiving needs a user and a closed year.')
+    return {'archived': archive_user_transactions(job.user, date(year, 1, 1))}
+
+
+@handler('forecast')
+def run_forecast(job, report):
+    try:
+        as_of = date.fromisoformat(job.params.get('as_of') or date.today().isoformat())
+    except ValueError:
+        raise JobError('as_of must be YYYY-MM-DD')
+    method = job.params.get('method', 'linear')
+    if method not in FORECAST_METHODS or job.user is None:
+        raise JobError(f'method must be one of: {", ".join(FORECAST_METHODS)}')
+    
+    ledger = Ledger.objects.personal_for(job.user_id)
+    budgets = Budget.objects.filter(
+        ledger=ledger, month=as_of.month, year=as_of.year
+    ).select_related('category')
+    report(10, message='Loading spend history')
+    forecasts = forecast_budgets(
+        budgets, Transaction.objects.filter(ledger=ledger), as_of,
+        history=min(max(_int_param(job, 'history', 3), 0), 24),
+        method=method,
+        amount=converted_amount(base_currency_for(job.user)),
+    )
+    return {'as_of': as_of, 'method': method, 'budgets': forecasts}
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+PERF_TAG = 'perf'
+REPLICA_ALIAS = 'replica'
+
+
+class FinanceTestRunner(DiscoverRunner):
+    """
+    Default test runner for the project.
+
+    The perf suite seeds large datasets, so it only runs when asked for with
+    ``--tag perf``. Passwords are hashed with a fast hasher while testing.
+    A ``replica`` alias mirrors the primary so replica routing can be tested
+    without a second server; as a separate connection it only sees committed rows.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if PERF_TAG not in (tags or ()):
+            exclude_tags = {*(exclude_tags or ()), PERF_TAG}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        if REPLICA_ALIAS not in connections.settings:
+            primary = connections.settings['default']
+            connections.settings[REPLICA_ALIAS] = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': 'default'}}
+        super().setup_test_environment(**kwargs)
@@ -1,15 +1,70 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.management import CommandError, call_command
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
-from datetime import date
-from .models import Category, Transaction, Budget
+from datetime import date, timedelta
+from django.utils import timezone
+from .anomalies import Welford, detect_anomalies
+from .archive import archive_user_transactions
+from .goals import recompute as recompute_goal
+from .category_ops import create_default_categories
+from .factories import create_budget, create_category, create_transactions, create_user
+from .compression import brotli
+from .currency import RateCache
+from .renderers import ORJSONRenderer, msgpack
+from .events import get_broker
+from .sse import event_stream
+from .verification import CHECKS, verify_users
+from .sync import deletions_unrecorded
+from . import hot_cache
+from .jobs import HANDLERS, claim_next, enqueue, handler, requeue_stale, run_job
+from .models import (
+    ArchiveBoundary, ArchivedMonthlyTotal, ArchivedTransaction, AuditEntry, BudgetSnapshot, Category, CategoryAmountStats,
+    ExchangeRate, Job, Ledger, LedgerMembership, SavingsGoal, Tombstone, Transaction, TransactionFlag, Budget
+)
 
 
-class CategoryModelTest(TestCase):
+class FinanceAPITestCase(TestCase):
+    """
+    Creates the user once per class; each test gets a fresh authenticated client
+    and an empty cache, since cached state (hot cache, throttle counters) is keyed
+    by user ids that the next test reuses
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('testuser')
+        
     def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
+class CategoryModelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('testuser')
         
     def test_create_category(self):
         category = Category.objects.create(
@@ -23,13 +78,10 @@ class CategoryModelTest(TestCase):
 
 
 class TransactionModelTest(TestCase):
-    def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
-        self.category = Category.objects.create(
-            user=self.user,
-            name='Groceries',
-            type='expense'
-        )
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('testuser')
+        cls.category = create_category(cls.user, 'Groceries')
         
     def test_create_transaction(self):
         transaction = Transaction.objects.create(
@@ -45,8 +97,9 @@ class TransactionModelTest(TestCase):
 
 
 class BudgetModelTest(TestCase):
-    def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('testuser')
         
     def test_create_budget(self):
         budget = Budget.objects.create(
@@ -60,9 +113,12 @@ class BudgetModelTest(TestCase):
 
 
 class AuthenticationAPITest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('testuser')
+        
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
         
     def test_login_success(self):
         response = self.client.post('/api/auth/login/', {
@@ -79,14 +135,16 @@ class AuthenticationAPITest(TestCase):
             'password': 'wrongpass'
         })
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+    def test_register_creates_default_categories_in_bulk(self):
+        response = self.client.post('/api/auth/register/', {'username': 'newuser', 'password': 'newpass123'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        categories = Category.objects.filter(user__username='newuser')
+        self.assertEqual(categories.count(), 12)
+        self.assertTrue(all(category.path == f'/{category.pk}/' for category in categories))
 
 
-class CategoryAPITest(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
-        self.client.force_authenticate(user=self.user)
-        
+class CategoryAPITest(FinanceAPITestCase):
     def test_create_category(self):
         response = self.client.post('/api/categories/', {
             'name': 'Test Category',
@@ -104,16 +162,11 @@ class CategoryAPITest(TestCase):
         self.assertEqual(len(response.data), 2)
 
 
-class TransactionAPITest(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
-        self.client.force_authenticate(user=self.user)
-        self.category = Category.objects.create(
-            user=self.user,
-            name='Test Category',
-            type='expense'
-        )
+class TransactionAPITest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.category = create_category(cls.user, 'Test Category')
         
     def test_create_transaction(self):
         response = self.client.post('/api/transactions/', {
@@ -136,14 +189,42 @@ class TransactionAPITest(TestCase):
         
         response = self.client.get('/api/transactions/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    def test_bulk_create_1000_items_without_per_item_queries(self):
+        items = [
+            {'type': 'expense', 'amount': '1.50', 'category': self.category.id, 'date': f'2024-01-{n % 28 + 1:02}'}
+            for n in range(1000)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/transactions/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 1000)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1000)
+        
+        # Memberships, the ledger's categories, its goal links, its members (for the live
+        # event) and the base currency are read once for the whole batch, plus the savepoint
+        # pair and one snapshot UPDATE. The anomaly check reads its duplicate candidates
+        # once and locks and updates the category's statistics under two more savepoint
+        # pairs; the rest are INSERTs in the backend's batch size
+        others = [query['sql'] for query in queries.captured_queries if not query['sql'].startswith('INSERT')]
+        self.assertEqual(len(others), 15, '\n'.join(others))
+        
+    def test_bulk_create_is_all_or_none(self):
+        other = create_category(create_user(), 'Elsewhere')
+        response = self.client.post('/api/transactions/bulk/', [
+            {'type': 'expense', 'amount': '5.00', 'category': self.category.id, 'date': '2024-01-01'},
+            {'type': 'expense', 'amount': '5.00', 'category': other.id, 'date': '2024-01-01'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[1]['category'], ['Invalid category selection.'])
+        self.assertFalse(Transaction.objects.exists())
+        
+        too_many = [{'type': 'expense', 'amount': '1.00', 'category': self.category.id, 'date': '2024-01-01'}] * 1001
+        response = self.client.post('/api/transactions/bulk/', too_many, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class BudgetAPITest(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
-        self.client.force_authenticate(user=self.user)
-        
+class BudgetAPITest(FinanceAPITestCase):
     def test_create_budget(self):
         response = self.client.post('/api/budgets/', {
             'month': 1,
@@ -165,3 +246,1716 @@ class BudgetAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+
+
+class BudgetForecastAPITest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.category = create_category(cls.user, 'Groceries')
+        cls.budget = create_budget(cls.user, cls.category, '300.00', month=3)
+        create_transactions(cls.user, [
+            *((cls.category, '20.00', date(2024, 3, day)) for day in range(1, 11)),
+            (cls.category, '10.00', date(2024, 2, 20)),
+        ])
+        
+    def test_forecast_projections(self):
+        response = self.client.get('/api/budgets/forecast/', {'as_of': '2024-03-10', 'history': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        forecast = response.data['budgets'][0]
+        self.assertEqual(forecast['spent_to_date'], 200.0)
+        self.assertEqual(forecast['projections'], {'linear': 620.0, 'seasonal': 210.0, 'smoothed': 620.0})
+        self.assertEqual(forecast['projected_overspend_date'], date(2024, 3, 16))
+        
+    def test_forecast_no_overspend(self):
+        response = self.client.get('/api/budgets/forecast/', {
+            'as_of': '2024-03-10', 'history': 1, 'method': 'seasonal'
+        })
+        self.assertIsNone(response.data['budgets'][0]['projected_overspend_date'])
+        
+    def test_forecast_invalid_method(self):
+        response = self.client.get('/api/budgets/forecast/', {'method': 'magic'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_forecast_overall_budget_single_query(self):
+        Budget.objects.create(user=self.user, month=3, year=2024, amount=Decimal('1000.00'))
+        # Base currency, budgets, then one grouped spend query for every budget
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/budgets/forecast/', {'as_of': '2024-03-10'})
+        overall = [b for b in response.data['budgets'] if b['category'] is None][0]
+        self.assertEqual(overall['spent_to_date'], 200.0)
+        self.assertIsNone(overall['projected_overspend_date'])
+
+
+class CategoryOperationsAPITest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.source = create_category(cls.user, 'Food')
+        cls.target = create_category(cls.user, 'Groceries')
+        create_transactions(cls.user, [(cls.source, '10.00', date(2024, 1, day)) for day in range(1, 6)])
+        
+    def test_merge_moves_transactions_and_resolves_budget_conflicts(self):
+        Budget.objects.create(user=self.user, month=1, year=2024, amount=Decimal('100.00'), category=self.source)
+        Budget.objects.create(user=self.user, month=1, year=2024, amount=Decimal('50.00'), category=self.target)
+        Budget.objects.create(user=self.user, month=2, year=2024, amount=Decimal('80.00'), category=self.source)
+        
+        response = self.client.post(f'/api/categories/{self.source.id}/merge/', {'target': self.target.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'transactions_moved': 5, 'budgets_moved': 1, 'budgets_merged': 1})
+        self.assertFalse(Category.objects.filter(id=self.source.id).exists())
+        self.assertEqual(Transaction.objects.filter(category=self.target).count(), 5)
+        budgets = dict(Budget.objects.filter(category=self.target).values_list('month', 'amount'))
+        self.assertEqual(budgets, {1: Decimal('150.00'), 2: Decimal('80.00')})
+        
+    def test_merge_query_count_independent_of_transactions(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(f'/api/categories/{self.source.id}/merge/', {'target': self.target.id})
+        
+        source = Category.objects.create(user=self.user, name='Takeaway', type='expense')
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, ledger_id=source.ledger_id, type='expense', amount=Decimal('1.00'),
+                        category=source, date=date(2024, 1, 1))
+            for _ in range(200)
+        ])
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(f'/api/categories/{source.id}/merge/', {'target': self.target.id})
+        self.assertEqual(len(small), len(large))
+        
+    def test_reassign_rejects_type_mismatch(self):
+        income = Category.objects.create(user=self.user, name='Salary', type='income')
+        response = self.client.post(f'/api/categories/{self.source.id}/reassign/', {'target': income.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_archive_hides_category_and_blocks_new_transactions(self):
+        response = self.client.post(f'/api/categories/{self.source.id}/archive/')
+        self.assertTrue(response.data['is_archived'])
+        
+        response = self.client.get('/api/categories/')
+        self.assertEqual([c['name'] for c in response.data['results']], ['Groceries'])
+        
+        response = self.client.post('/api/transactions/', {
+            'type': 'expense', 'amount': '5.00', 'category': self.source.id, 'date': '2024-01-10'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_delete_category_with_history_returns_400(self):
+        response = self.client.delete(f'/api/categories/{self.source.id}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CategoryHierarchyTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.food = create_category(cls.user, 'Food')
+        cls.groceries = create_category(cls.user, 'Groceries', parent=cls.food)
+        cls.dining = create_category(cls.user, 'Dining Out', parent=cls.food)
+        cls.rent = create_category(cls.user, 'Rent')
+        create_transactions(cls.user, [
+            (category, amount, date(2024, 3, 5))
+            for category, amount in [(cls.groceries, '40.00'), (cls.dining, '25.00'), (cls.food, '5.00'), (cls.rent, '500.00')]
+        ])
+        
+    def test_materialized_path(self):
+        self.assertEqual(self.groceries.path, f'/{self.food.id}/{self.groceries.id}/')
+        
+    def test_moving_category_reroots_subtree(self):
+        snack = Category.objects.create(user=self.user, name='Snacks', type='expense', parent=self.groceries)
+        self.groceries.parent = self.rent
+        self.groceries.save()
+        snack.refresh_from_db()
+        self.assertEqual(snack.path, f'/{self.rent.id}/{self.groceries.id}/{snack.id}/')
+        
+    def test_parent_cannot_be_own_descendant(self):
+        response = self.client.patch(f'/api/categories/{self.food.id}/', {'parent': self.groceries.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_summary_rollup(self):
+        response = self.client.get('/api/transactions/summary/', {'rollup': 'true'})
+        totals = {item['category']: item['amount'] for item in response.data['expense_by_category']}
+        self.assertEqual(totals, {'Food': 70.0, 'Rent': 500.0})
+        
+        response = self.client.get('/api/transactions/summary/', {'rollup': 'true', 'category': self.food.id})
+        totals = {item['category']: item['amount'] for item in response.data['expense_by_category']}
+        self.assertEqual(totals, {'Groceries': 40.0, 'Dining Out': 25.0, 'Food': 5.0})
+        self.assertEqual(response.data['total_expenses'], '70.00')
+        
+    def test_filter_by_subtree(self):
+        response = self.client.get('/api/transactions/', {'category_tree': self.food.id})
+        self.assertEqual(response.data['count'], 3)
+        
+    def test_parent_budget_counts_descendant_spend(self):
+        budget = Budget.objects.create(user=self.user, month=3, year=2024, amount=Decimal('60.00'), category=self.food)
+        response = self.client.get(f'/api/budgets/{budget.id}/')
+        self.assertEqual(response.data['actual_expenses'], 70.0)
+        
+        response = self.client.get('/api/budgets/forecast/', {'as_of': '2024-03-31'})
+        self.assertEqual(response.data['budgets'][0]['spent_to_date'], 70.0)
+        
+    def test_merge_reparents_children(self):
+        response = self.client.post(f'/api/categories/{self.food.id}/merge/', {'target': self.rent.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.groceries.refresh_from_db()
+        self.assertEqual(self.groceries.parent_id, self.rent.id)
+        self.assertEqual(self.groceries.path, f'/{self.rent.id}/{self.groceries.id}/')
+
+
+class TransactionAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        cls.user = create_user('testuser')
+        cls.category = create_category(cls.user, 'Groceries')
+        
+    def setUp(self):
+        self.client.force_login(self.admin)
+        
+    def _add_transactions(self, count):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, ledger_id=self.category.ledger_id, type='expense', amount=Decimal('1.00'),
+                        category=self.category, date=date(2024, 1, 1))
+            for _ in range(count)
+        ])
+        
+    def test_changelist_query_count_independent_of_rows(self):
+        self._add_transactions(5)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get('/admin/finances/transaction/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self._add_transactions(95)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/admin/finances/transaction/')
+        self.assertEqual(len(small), len(large))
+        self.assertFalse([query['sql'] for query in large if 'DISTINCT' in query['sql']])
+        
+    def test_currency_filter(self):
+        self._add_transactions(2)
+        Transaction.objects.filter(pk=Transaction.objects.first().pk).update(currency='EUR')
+        response = self.client.get('/admin/finances/transaction/', {'currency': 'eur'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        
+    def test_category_filter_scoped_to_selected_user(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        Category.objects.create(user=other, name='Hidden Category', type='expense')
+        self._add_transactions(1)
+        
+        response = self.client.get('/admin/finances/transaction/')
+        self.assertNotContains(response, 'Hidden Category')
+        
+        response = self.client.get('/admin/finances/transaction/', {'username': 'testuser'})
+        self.assertContains(response, f'?category={self.category.id}')
+        self.assertNotContains(response, 'Hidden Category')
+        
+    def test_export_as_csv_action(self):
+        self._add_transactions(3)
+        response = self.client.post('/admin/finances/transaction/', {
+            'action': 'export_as_csv',
+            '_selected_action': Transaction.objects.values_list('id', flat=True),
+        })
+        rows = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(rows), 4)
+
+
+class OptimisticConcurrencyTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.category = create_category(cls.user, 'Groceries')
+        [cls.transaction] = create_transactions(cls.user, [(cls.category, '10.00', date(2024, 1, 1))])
+        cls.url = f'/api/transactions/{cls.transaction.id}/'
+        
+    def test_retrieve_returns_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], '"1"')
+        
+    def test_update_with_current_etag_bumps_version(self):
+        response = self.client.patch(self.url, {'amount': '12.00'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(response.data['version'], 2)
+        
+    def test_update_with_stale_etag_returns_412(self):
+        self.client.patch(self.url, {'amount': '12.00'}, HTTP_IF_MATCH='"1"')
+        response = self.client.patch(self.url, {'amount': '15.00'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.amount, Decimal('12.00'))
+        
+    def test_delete_with_stale_etag_returns_412(self):
+        response = self.client.delete(self.url, HTTP_IF_MATCH='"7"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(Transaction.objects.filter(id=self.transaction.id).exists())
+        
+    def test_budget_update_precondition(self):
+        budget = Budget.objects.create(user=self.user, month=1, year=2024, amount=Decimal('100.00'))
+        response = self.client.patch(f'/api/budgets/{budget.id}/', {'amount': '150.00'}, HTTP_IF_MATCH='"2"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        
+    def test_duplicate_category_is_400_without_insert(self):
+        # Memberships and the ledger's categories; the name is checked in memory
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/categories/', {'name': 'Groceries', 'type': 'expense'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', response.data)
+        
+        other = Category.objects.create(user=self.user, name='Rent', type='expense')
+        response = self.client.patch(f'/api/categories/{other.id}/', {'name': 'Groceries'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_duplicate_budget_is_400(self):
+        Budget.objects.create(user=self.user, month=1, year=2024, amount=Decimal('100.00'), category=self.category)
+        response = self.client.post('/api/budgets/', {
+            'month': 1, 'year': 2024, 'amount': '50.00', 'category': self.category.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentWriterStressTest(TransactionTestCase):
+    """Many threads race to update the same rows against the real test database"""
+    writers = 8
+    
+    def setUp(self):
+        self.user = create_user('testuser')
+        self.category = create_category(self.user, 'Groceries')
+        
+    def _race(self, make_request):
+        barrier = threading.Barrier(self.writers)
+        results = []
+        
+        def writer(i):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                results.append(make_request(client, i).status_code)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+        
+    def test_only_one_conditional_update_wins(self):
+        transaction = Transaction.objects.create(
+            user=self.user, type='expense', amount=Decimal('10.00'),
+            category=self.category, date=date(2024, 1, 1)
+        )
+        results = self._race(lambda client, i: client.patch(
+            f'/api/transactions/{transaction.id}/', {'amount': f'{20 + i}.00'}, HTTP_IF_MATCH='"1"'
+        ))
+        self.assertEqual(sorted(results), [200] + [412] * (self.writers - 1))
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.version, 2)
+        
+    def test_concurrent_duplicate_categories_never_500(self):
+        results = self._race(lambda client, i: client.post(
+            '/api/categories/', {'name': 'Travel', 'type': 'expense'}
+        ))
+        self.assertEqual(sorted(results), [201] + [400] * (self.writers - 1))
+        self.assertEqual(Category.objects.filter(user=self.user, name='Travel').count(), 1)
+
+
+class TransactionArchiveTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.salary = create_category(cls.user, 'Salary', type='income')
+        create_transactions(cls.user, [
+            (cls.groceries, '30.00', date(2021, 3, 5)),
+            (cls.groceries, '20.00', date(2021, 3, 20)),
+            (cls.salary, '1000.00', date(2022, 6, 1)),
+            (cls.groceries, '15.00', date(2024, 2, 1)),
+        ])
+        
+    def _archive(self):
+        call_command('archive_transactions', '--before-year', '2023', stdout=StringIO())
+        
+    def test_archive_cost_does_not_grow_with_rows(self):
+        budget = create_budget(self.user, self.groceries, month=3, year=2021)
+        BudgetSnapshot.objects.create(budget=budget, actual_expenses=Decimal('50.00'), currency='USD')
+        for user, count in ((create_user(), 5), (create_user(), 200)):
+            groceries = create_category(user, 'Groceries')
+            rows = create_transactions(user, [(groceries, '5.00', date(2021, 3, 1 + n % 28)) for n in range(count)])
+            TransactionFlag.objects.create(user=user, transaction=rows[1], duplicate_of=rows[0], kind='duplicate', score=1)
+            with self.subTest(rows=count), self.assertNumQueries(13):
+                archive_user_transactions(user, date(2023, 1, 1))
+            self.assertFalse(Transaction.objects.filter(user=user).exists())
+            self.assertFalse(TransactionFlag.objects.filter(user=user).exists())
+        
+        self._archive()
+        self.assertTrue(BudgetSnapshot.objects.get(budget=budget).is_stale)
+        
+    def test_archive_moves_closed_years(self):
+        self._archive()
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(ArchivedTransaction.objects.count(), 3)
+        self.assertEqual(ArchiveBoundary.objects.get(user=self.user).archived_before, date(2023, 1, 1))
+        
+    def test_summary_unchanged_by_archiving(self):
+        before = self.client.get('/api/transactions/summary/').data
+        partial_before = self.client.get('/api/transactions/summary/', {'start_date': '2021-03-10'}).data
+        self._archive()
+        self.assertEqual(self.client.get('/api/transactions/summary/').data, before)
+        self.assertEqual(
+            self.client.get('/api/transactions/summary/', {'start_date': '2021-03-10'}).data,
+            partial_before
+        )
+        
+    def test_recent_range_skips_archive(self):
+        self._archive()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/transactions/summary/', {'start_date': '2024-01-01'})
+        cold_tables = (ArchivedTransaction._meta.db_table, ArchivedMonthlyTotal._meta.db_table)
+        self.assertFalse(any(table in query['sql'] for query in queries for table in cold_tables))
+        
+    def test_list_unions_archive_when_needed(self):
+        self._archive()
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([row['archived'] for row in response.data['results']], [False, True, True, True])
+        
+        response = self.client.get('/api/transactions/', {'date_from': '2021-01-01', 'type': 'expense'})
+        self.assertEqual(response.data['count'], 3)
+        
+        response = self.client.get('/api/transactions/', {'date_from': '2024-01-01'})
+        live = response.data['results'][0]
+        self.assertFalse(live['archived'])
+        
+    def test_archived_rows_share_the_live_schema(self):
+        live = self.client.get('/api/transactions/', {'date_from': '2024-01-01'}).data['results'][0]
+        self._archive()
+        rows = self.client.get('/api/transactions/').data['results']
+        self.assertEqual([list(row) for row in rows], [list(live)] * 4)
+        self.assertEqual(rows[0], {**live, 'archived': False})
+        
+        archived = ArchivedTransaction.objects.get(date=date(2022, 6, 1))
+        response = self.client.get(f'/api/transactions/{archived.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount_in_base'], '1000.00')
+        self.assertTrue(response.data['archived'])
+        response = self.client.patch(f'/api/transactions/{archived.id}/', {'amount': '1.00'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+    def test_archived_budget_keeps_actuals(self):
+        budget = Budget.objects.create(user=self.user, month=3, year=2021, amount=Decimal('100.00'))
+        self._archive()
+        response = self.client.get(f'/api/budgets/{budget.id}/')
+        self.assertEqual(response.data['actual_expenses'], 50.0)
+        
+    def test_merge_carries_archived_rows(self):
+        self._archive()
+        food = Category.objects.create(user=self.user, name='Food', type='expense')
+        response = self.client.post(f'/api/categories/{self.groceries.id}/merge/', {'target': food.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ArchivedTransaction.objects.filter(category=food).count(), 2)
+
+
+class MultiCurrencyTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.salary = create_category(cls.user, 'Salary', type='income')
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='EUR', date=date(2024, 1, 1), rate=Decimal('1.10')),
+            ExchangeRate(currency='EUR', date=date(2024, 2, 1), rate=Decimal('1.20')),
+        ])
+        create_transactions(cls.user, [
+            (cls.groceries, '10.00', date(2024, 1, 15), 'USD'),
+            (cls.groceries, '20.00', date(2024, 1, 15), 'EUR'),
+            (cls.groceries, '10.00', date(2024, 2, 10), 'EUR'),
+            (cls.salary, '120.00', date(2024, 2, 10), 'USD'),
+        ])
+        
+    def test_summary_converts_with_rate_on_each_date(self):
+        response = self.client.get('/api/transactions/summary/')
+        self.assertEqual(response.data['currency'], 'USD')
+        self.assertEqual(response.data['total_expenses'], '44.00')
+        self.assertEqual(response.data['monthly_trend'][0]['expense'], 32.0)
+        
+    def test_base_currency_switch(self):
+        response = self.client.patch('/api/auth/user/', {'base_currency': 'eur'})
+        self.assertEqual(response.data['base_currency'], 'EUR')
+        response = self.client.get('/api/transactions/summary/')
+        self.assertEqual(response.data['total_income'], '100.00')
+        
+        response = self.client.patch('/api/auth/user/', {'base_currency': 'XYZ'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_budget_actuals_in_base_currency(self):
+        budget = Budget.objects.create(user=self.user, month=1, year=2024, amount=Decimal('50.00'))
+        response = self.client.get(f'/api/budgets/{budget.id}/')
+        self.assertEqual(response.data['actual_expenses'], 32.0)
+        
+    def test_amount_in_base_and_currency_validation(self):
+        response = self.client.get('/api/transactions/', {'date_from': '2024-01-15', 'date_to': '2024-01-15'})
+        converted = {row['currency']: row['amount_in_base'] for row in response.data['results']}
+        self.assertEqual(converted, {'USD': '10.00', 'EUR': '22.00'})
+        
+        data = {'type': 'expense', 'amount': '5.00', 'currency': 'XYZ', 'category': self.groceries.id, 'date': '2024-01-20'}
+        response = self.client.post('/api/transactions/', data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_rejects_dates_before_the_first_rate(self):
+        # Unconvertible rows would silently drop out of the summary totals
+        data = {'type': 'expense', 'amount': '5.00', 'currency': 'EUR', 'category': self.groceries.id, 'date': '2023-12-31'}
+        response = self.client.post('/api/transactions/', data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('date', response.data)
+        
+        transaction = Transaction.objects.get(currency='EUR', date=date(2024, 2, 10))
+        response = self.client.patch(f'/api/transactions/{transaction.id}/', {'date': '2023-12-31'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        data['currency'] = 'USD'
+        response = self.client.post('/api/transactions/', data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+    def test_rate_cache_memoizes_lookups(self):
+        cache = RateCache()
+        with self.assertNumQueries(1):
+            for _ in range(5):
+                self.assertEqual(cache.convert(Decimal('10.00'), 'EUR', 'USD', date(2024, 1, 20)), Decimal('11.00'))
+        self.assertIsNone(cache.convert(Decimal('10.00'), 'GBP', 'USD', date(2024, 1, 20)))
+        
+    def test_load_fx_rates_upserts(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('date,currency,rate\n2024-02-01,eur,1.25\n2024-02-01,GBP,1.27\n')
+        self.addCleanup(os.remove, handle.name)
+        call_command('load_fx_rates', handle.name, stdout=StringIO())
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+        self.assertEqual(ExchangeRate.objects.get(currency='EUR', date=date(2024, 2, 1)).rate, Decimal('1.25'))
+
+
+class TransactionCompareAPITest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.salary = create_category(cls.user, 'Salary', type='income')
+        create_transactions(cls.user, [
+            (cls.groceries, '40.00', date(2023, 2, 10)),
+            (cls.groceries, '50.00', date(2024, 1, 10)),
+            (cls.groceries, '80.00', date(2024, 2, 10)),
+            (cls.salary, '1000.00', date(2024, 2, 1)),
+        ])
+        
+    def _categories(self, data):
+        return {row['category']: row for row in data['categories']}
+        
+    def test_month_over_month(self):
+        response = self.client.get('/api/transactions/compare/', {'preset': 'mom', 'as_of': '2024-02-15'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['periods'][0]['start'], date(2024, 1, 1))
+        self.assertEqual(response.data['periods'][1]['balance'], 920.0)
+        categories = self._categories(response.data)
+        self.assertEqual(categories['Groceries']['totals'], [50.0, 80.0])
+        self.assertEqual(categories['Groceries']['changes'], [{'delta': 30.0, 'percent': 60.0}])
+        self.assertIsNone(categories['Salary']['changes'][0]['percent'])
+        
+    def test_year_over_year_reads_archive(self):
+        params = {'preset': 'yoy', 'as_of': '2024-02-15'}
+        before = self.client.get('/api/transactions/compare/', params).data
+        self.assertEqual(self._categories(before)['Groceries']['changes'][0]['percent'], 100.0)
+        call_command('archive_transactions', '--before-year', '2024', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/transactions/compare/', params).data, before)
+        
+    def test_query_count_independent_of_periods(self):
+        def queries_for(params):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/transactions/compare/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+        
+        custom = {'periods': '2023-02-01:2023-02-28,2024-02-01:2024-02-29'}
+        self.assertEqual(
+            queries_for(custom),
+            queries_for({'preset': 'mom', 'as_of': '2024-02-15', 'count': 24})
+        )
+        
+    def test_invalid_periods(self):
+        for params in [
+            {'periods': '2024-02-01:2024-01-01,2024-03-01:2024-03-31'},
+            {'periods': '2024-02-01:2024-02-29'},
+            {'preset': 'weekly'},
+            {'preset': 'mom', 'count': 1000},
+        ]:
+            response = self.client.get('/api/transactions/compare/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AnomalyDetectionTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        
+    def _rows(self, rows):
+        # bulk_create skips the on-write hook, like an import would
+        return Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, ledger_id=self.groceries.ledger_id, type='expense', category=self.groceries,
+                amount=Decimal(amount), date=day, description=description
+            )
+            for day, amount, description in rows
+        ])
+        
+    def test_batch_flags_near_duplicates_in_window(self):
+        first, duplicate, too_late, different = self._rows([
+            (date(2024, 1, 1), '42.50', 'Whole Foods Market'),
+            (date(2024, 1, 2), '42.50', 'WHOLE FOODS MARKET #12'),
+            (date(2024, 1, 9), '42.50', 'Whole Foods Market'),
+            (date(2024, 1, 2), '42.50', 'Gas station'),
+        ])
+        rows, duplicates, _ = detect_anomalies()
+        self.assertEqual((rows, duplicates), (4, 1))
+        flag = TransactionFlag.objects.get(kind='duplicate')
+        self.assertEqual((flag.transaction_id, flag.duplicate_of_id), (duplicate.id, first.id))
+        
+        # Re-running keeps the existing flag instead of adding another
+        detect_anomalies()
+        self.assertEqual(TransactionFlag.objects.filter(kind='duplicate').count(), 1)
+        
+    def test_batch_flags_outliers_and_builds_stats(self):
+        self._rows([(date(2024, 1, day), str(40 + day % 5), 'Groceries') for day in range(1, 21)])
+        self._rows([(date(2024, 2, 1), '900.00', 'TV')])
+        detect_anomalies()
+        flag = TransactionFlag.objects.get(kind='outlier')
+        self.assertEqual(flag.transaction.description, 'TV')
+        self.assertEqual(CategoryAmountStats.objects.get(category=self.groceries).count, 21)
+        
+    def test_write_hook_uses_running_stats(self):
+        self._rows([(date(2024, 1, day), str(40 + day % 5), f'Shop {day}') for day in range(1, 21)])
+        detect_anomalies()
+        response = self.client.post('/api/transactions/', {
+            'type': 'expense', 'amount': '41.00', 'category': self.groceries.id,
+            'date': '2024-01-02', 'description': 'Shop 1'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/transactions/', {
+            'type': 'expense', 'amount': '2500.00', 'category': self.groceries.id, 'date': '2024-01-03'
+        })
+        kinds = set(TransactionFlag.objects.values_list('kind', flat=True))
+        self.assertEqual(kinds, {'duplicate', 'outlier'})
+        self.assertEqual(CategoryAmountStats.objects.get(category=self.groceries).count, 22)
+        
+    def test_bulk_import_is_checked_like_single_writes(self):
+        self._rows([(date(2024, 1, day), str(40 + day % 5), f'Shop {day}') for day in range(1, 21)])
+        detect_anomalies()
+        response = self.client.post('/api/transactions/bulk/', [
+            {'type': 'expense', 'amount': '41.00', 'category': self.groceries.id, 'date': '2024-01-02', 'description': 'Shop 1'},
+            {'type': 'expense', 'amount': '2500.00', 'category': self.groceries.id, 'date': '2024-01-03'},
+            {'type': 'expense', 'amount': '2500.00', 'category': self.groceries.id, 'date': '2024-01-04'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        flags = TransactionFlag.objects.order_by('transaction_id', 'kind').values_list('kind', 'transaction__date', 'duplicate_of__date')
+        self.assertEqual(list(flags), [
+            ('duplicate', date(2024, 1, 2), date(2024, 1, 1)),
+            ('outlier', date(2024, 1, 3), None),
+            ('duplicate', date(2024, 1, 4), date(2024, 1, 3)),
+            ('outlier', date(2024, 1, 4), None),
+        ])
+        self.assertEqual(CategoryAmountStats.objects.get(category=self.groceries).count, 23)
+        
+    def test_review_flag(self):
+        self._rows([
+            (date(2024, 1, 1), '10.00', 'Coffee'),
+            (date(2024, 1, 1), '10.00', 'Coffee'),
+        ])
+        detect_anomalies()
+        response = self.client.get('/api/flags/', {'status': 'open'})
+        self.assertEqual(response.data['count'], 1)
+        flag_id = response.data['results'][0]['id']
+        response = self.client.patch(f'/api/flags/{flag_id}/', {'status': 'dismissed'})
+        self.assertEqual(response.data['status'], 'dismissed')
+        self.assertIsNotNone(response.data['reviewed_at'])
+        self.assertEqual(self.client.get('/api/flags/', {'status': 'open'}).data['count'], 0)
+        
+    def test_welford_matches_two_pass(self):
+        values = [3.0, 7.5, 1.25, 9.0, 4.0]
+        running = Welford()
+        for value in values:
+            running.add(value)
+        mean = sum(values) / len(values)
+        variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+        self.assertAlmostEqual(running.mean, mean)
+        self.assertAlmostEqual(running.std ** 2, variance)
+
+
+class BudgetSnapshotTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.budget = create_budget(cls.user, cls.groceries, month=3)
+        [cls.spend] = create_transactions(cls.user, [(cls.groceries, '40.00', date(2024, 3, 5))])
+        call_command('close_month', '--year', '2024', '--month', '3', stdout=StringIO())
+        
+    def test_closed_month_served_from_snapshot(self):
+        self.assertEqual(BudgetSnapshot.objects.get(budget=self.budget).actual_expenses, Decimal('40.00'))
+        # Token auth is forced, so the list costs the memberships, base currency, count and page queries only
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/budgets/')
+        budget = response.data['results'][0]
+        self.assertEqual((budget['actual_expenses'], budget['remaining']), (40.0, 60.0))
+        
+    def test_backdated_write_marks_snapshot_stale(self):
+        for amount in ('20.00', '5.00'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/transactions/', {
+                    'type': 'expense', 'amount': amount, 'category': self.groceries.id, 'date': '2024-03-20'
+                })
+        self.assertTrue(BudgetSnapshot.objects.get(budget=self.budget).is_stale)
+        # The first write queues the refresh; the second finds the snapshot stale already
+        self.assertEqual(list(Job.objects.values_list('kind', flat=True)), ['refresh_snapshots'])
+        
+        # Reads aggregate the month afresh without writing
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/budgets/{self.budget.id}/')
+        self.assertEqual(response.data['actual_expenses'], 65.0)
+        self.assertFalse([query['sql'] for query in queries if not query['sql'].startswith('SELECT')])
+        
+        call_command('runworker', '--burst', stdout=StringIO())
+        snapshot = BudgetSnapshot.objects.get(budget=self.budget)
+        self.assertEqual((snapshot.actual_expenses, snapshot.is_stale), (Decimal('65.00'), False))
+        
+    def test_moving_transaction_out_of_closed_month(self):
+        response = self.client.patch(f'/api/transactions/{self.spend.id}/', {'date': date.today().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(f'/api/budgets/{self.budget.id}/')
+        self.assertEqual(response.data['actual_expenses'], 0.0)
+        
+    def test_set_based_deletes_leave_snapshots_to_the_caller(self):
+        with CaptureQueriesContext(connection) as queries, deletions_unrecorded():
+            Transaction.objects.filter(pk=self.spend.pk).delete()
+        self.assertFalse([query['sql'] for query in queries if 'finances_budgetsnapshot' in query['sql']])
+        
+    def test_moving_a_category_under_the_budget(self):
+        snacks = create_category(self.user, 'Snacks')
+        create_transactions(self.user, [(snacks, '10.00', date(2024, 3, 8))])
+        self.client.patch(f'/api/categories/{snacks.id}/', {'parent': self.groceries.id})
+        self.assertTrue(BudgetSnapshot.objects.get(budget=self.budget).is_stale)
+        self.assertEqual(self.client.get(f'/api/budgets/{self.budget.id}/').data['actual_expenses'], 50.0)
+        
+    def test_loading_rates_marks_later_months_stale(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('date,currency,rate\n2024-04-01,EUR,1.10\n')
+        self.addCleanup(os.remove, handle.name)
+        call_command('load_fx_rates', handle.name, stdout=StringIO())
+        self.assertFalse(BudgetSnapshot.objects.get(budget=self.budget).is_stale)
+        
+        with open(handle.name, 'w') as rewritten:
+            rewritten.write('date,currency,rate\n2024-03-01,EUR,1.10\n')
+        call_command('load_fx_rates', handle.name, stdout=StringIO())
+        self.assertTrue(BudgetSnapshot.objects.get(budget=self.budget).is_stale)
+        
+    def test_current_month_cannot_be_closed(self):
+        today = date.today()
+        with self.assertRaises(CommandError):
+            call_command('close_month', '--year', str(today.year), '--month', str(today.month), stdout=StringIO())
+
+
+class JobQueueTest(FinanceAPITestCase):
+    def _register(self, kind, fn):
+        handler(kind)(fn)
+        self.addCleanup(HANDLERS.pop, kind)
+        
+    def _work(self):
+        call_command('runworker', '--burst', stdout=StringIO())
+        
+    def test_enqueue_run_and_poll(self):
+        groceries = Category.objects.create(user=self.user, name='Groceries', type='expense')
+        Budget.objects.create(user=self.user, month=3, year=2024, amount=Decimal('100.00'), category=groceries)
+        response = self.client.post(
+            '/api/jobs/', {'kind': 'forecast', 'params': {'as_of': '2024-03-10'}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'queued')
+        
+        self._work()
+        response = self.client.get(f'/api/jobs/{response.data["id"]}/')
+        self.assertEqual((response.data['status'], response.data['progress']), ('succeeded', 100))
+        self.assertEqual(response.data['result']['budgets'][0]['category_name'], 'Groceries')
+        
+    def test_only_user_kinds_accepted(self):
+        response = self.client.post('/api/jobs/', {'kind': 'noop'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_claim_is_exclusive(self):
+        job = enqueue('noop')
+        self.assertEqual(claim_next('worker-a').pk, job.pk)
+        self.assertIsNone(claim_next('worker-b'))
+        
+    def test_retry_with_backoff_then_fail(self):
+        def flaky(job, report):
+            report(1, 2, 'half way')
+            raise RuntimeError('boom')
+        self._register('flaky', flaky)
+        job = enqueue('flaky', max_attempts=2)
+        
+        run_job(claim_next('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.progress), ('queued', 1, 50))
+        self.assertIsNone(claim_next('worker'))  # backing off
+        
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        run_job(claim_next('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ('failed', 'boom'))
+        
+    def test_invalid_params_fail_without_retry(self):
+        job = enqueue('close_month', user=self.user, params={'year': 'soon'})
+        self._work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        
+    def test_stale_and_cancelled_jobs(self):
+        job = enqueue('noop')
+        claim_next('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=job.created_at - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        
+        response = self.client.post(
+            '/api/jobs/', {'kind': 'detect_anomalies'}, format='json'
+        )
+        response = self.client.post(f'/api/jobs/{response.data["id"]}/cancel/')
+        self.assertEqual(response.data['status'], 'cancelled')
+        response = self.client.post(f'/api/jobs/{response.data["id"]}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    @patch('finances.jobs.HEARTBEAT_INTERVAL', timedelta(seconds=0.05))
+    def test_long_running_job_is_not_requeued(self):
+        def slow(job, report):
+            time.sleep(0.5)
+            # Another worker starting up looks for jobs of dead workers
+            return {'requeued': requeue_stale(timedelta(seconds=0.3))}
+        handler('slow')(slow)
+        self.addCleanup(HANDLERS.pop, 'slow')
+        job = enqueue('slow')
+        
+        run_job(claim_next('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('succeeded', {'requeued': 0}, 1))
+        
+    def test_requeued_job_is_left_to_its_new_worker(self):
+        job = enqueue('noop')
+        claimed = claim_next('stalled-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=job.created_at - timedelta(hours=1))
+        requeue_stale()
+        claim_next('worker')
+        
+        run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'worker'))
+
+
+class RecordingBroker:
+    events = []
+    
+    def publish(self, user_id, event):
+        self.events.append((user_id, event))
+
+
+class LiveEventsTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.user)
+        cls.groceries = create_category(cls.user, 'Groceries')
+        
+    def _stream(self, count, token, publish=None):
+        """Open count connections, optionally publish once all are subscribed, then disconnect"""
+        scope = {'type': 'http', 'path': '/api/events/', 'query_string': f'token={token}'.encode(), 'headers': []}
+        
+        async def scenario():
+            broker = get_broker()
+            hang_up = asyncio.Event()
+            sent = [[] for _ in range(count)]
+            
+            async def receive():
+                await hang_up.wait()
+                return {'type': 'http.disconnect'}
+            
+            def sender(messages):
+                async def send(message):
+                    messages.append(message)
+                return send
+            
+            tasks = [asyncio.ensure_future(event_stream(scope, receive, sender(messages))) for messages in sent]
+            while publish and broker.subscriber_count(self.user.id) < count:
+                await asyncio.sleep(0.01)
+            if publish:
+                broker.publish(self.user.id, publish)
+                while any(len(messages) < 3 for messages in sent):
+                    await asyncio.sleep(0.01)
+            hang_up.set()
+            await asyncio.gather(*tasks)
+            return sent, broker.subscriber_count(self.user.id)
+        
+        return async_to_sync(scenario)()
+        
+    def test_thousands_of_idle_connections(self):
+        sent, remaining = self._stream(2000, self.token.key, publish={'type': 'budget.deleted', 'data': {'id': 7}})
+        self.assertTrue(all(messages[0]['status'] == 200 for messages in sent))
+        self.assertTrue(all(b'event: budget.deleted' in messages[2]['body'] for messages in sent))
+        self.assertEqual(remaining, 0)
+        
+    def test_invalid_token_rejected(self):
+        sent, _ = self._stream(1, 'not-a-token')
+        self.assertEqual(sent[0][0]['status'], 401)
+        
+    @override_settings(EVENTS_BACKEND='finances.tests.RecordingBroker')
+    def test_writes_publish_deltas_after_commit(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        RecordingBroker.events = []
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/', {
+                'type': 'expense', 'amount': '12.50', 'category': self.groceries.id, 'date': '2024-01-05'
+            })
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/transactions/{response.data["id"]}/', {'amount': '15.00'})
+        
+        (_, created), (user_id, updated) = RecordingBroker.events
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual((created['type'], created['data']['amount']), ('transaction.created', Decimal('12.50')))
+        self.assertEqual(updated['type'], 'transaction.updated')
+        self.assertEqual(updated['data']['previous']['amount'], Decimal('12.50'))
+        
+    @override_settings(EVENTS_BACKEND='finances.tests.RecordingBroker')
+    def test_deleting_a_ledger_publishes_one_resync(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        trip = Ledger.objects.create(name='Trip', owner=self.user)
+        LedgerMembership.objects.create(ledger=trip, user=self.user, role='owner')
+        category = Category.objects.create(ledger=trip, user=self.user, name='Fuel', type='expense')
+        create_transactions(self.user, [(category, '5.00', date(2024, 1, day)) for day in (1, 2)])
+        RecordingBroker.events = []
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/ledgers/{trip.pk}/')
+        self.assertEqual(RecordingBroker.events, [(self.user.id, {'type': 'resync'})])
+
+
+class HotCacheTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.rent = create_category(cls.user, 'Rent')
+        create_transactions(cls.user, [
+            (cls.rent, '900.00', date(2024, 1, 1)),
+            (cls.groceries, '40.00', date(2024, 1, 2)),
+            (cls.groceries, '25.00', date(2024, 1, 3)),
+        ])
+        
+    def _without_transaction_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse([query['sql'] for query in queries if 'finances_transaction' in query['sql']])
+        return response
+        
+    def test_widgets_served_from_cache_after_first_read(self):
+        self.client.get('/api/transactions/recent/')
+        recent = self._without_transaction_queries('/api/transactions/recent/?limit=2')
+        self.assertEqual([row['date'] for row in recent.data], ['2024-01-03', '2024-01-02'])
+        top = self._without_transaction_queries('/api/transactions/top_categories/')
+        self.assertEqual(
+            [(row['category'], row['amount']) for row in top.data['categories']],
+            [('Rent', 900.0), ('Groceries', 65.0)]
+        )
+        
+    def test_rebuild_needs_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'set REDIS_URL'):
+            call_command('rebuild_hot_cache', stdout=StringIO())
+        with tempfile.TemporaryDirectory() as location:
+            backend = 'django.core.cache.backends.filebased.FileBasedCache'
+            with override_settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': location}}):
+                out = StringIO()
+                call_command('rebuild_hot_cache', stdout=out)
+                self.assertIn('Rebuilt the hot cache for 1 ledgers', out.getvalue())
+                self._without_transaction_queries('/api/transactions/recent/')
+        
+    def test_writes_update_cache_in_place(self):
+        self.client.get('/api/transactions/recent/')
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post('/api/transactions/', {
+                'type': 'expense', 'amount': '1000.00', 'category': self.groceries.id, 'date': '2024-01-10'
+            })
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/transactions/{Transaction.objects.get(amount=900).id}/')
+        
+        recent = self._without_transaction_queries('/api/transactions/recent/')
+        self.assertEqual(recent.data[0]['id'], created.data['id'])
+        self.assertEqual(len(recent.data), 3)
+        top = self._without_transaction_queries('/api/transactions/top_categories/')
+        self.assertEqual(
+            [(row['category'], row['amount']) for row in top.data['categories']],
+            [('Groceries', 1065.0)]
+        )
+        
+    def _post(self, amount, on_date):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/transactions/', {
+                'type': 'expense', 'amount': amount, 'category': self.groceries.id, 'date': on_date
+            })
+        
+    def test_write_racing_another_patch_drops_the_entry(self):
+        self.client.get('/api/transactions/recent/')
+        ledger_id = self.groceries.ledger_id
+        # Another process holds the entry it is about to store back without this write
+        cache.add(hot_cache.lock_key(ledger_id), 1)
+        key = hot_cache.cache_key(ledger_id, cache.get(hot_cache.generation_key(ledger_id)))
+        other_copy = cache.get(key)
+        created = self._post('7.00', '2024-01-10')
+        cache.set(key, other_copy)
+        cache.delete(hot_cache.lock_key(ledger_id))
+        
+        self.assertEqual(self.client.get('/api/transactions/recent/').data[0]['id'], created.data['id'])
+        
+    def test_write_during_a_rebuild_is_not_lost(self):
+        build_reads = hot_cache.archive.ledger_archived_before
+        
+        def written_meanwhile(ledger):
+            # Commits after the rebuild read the recent rows
+            self.created = self._post('7.00', '2024-01-10')
+            return build_reads(ledger)
+        
+        with patch.object(hot_cache.archive, 'ledger_archived_before', written_meanwhile):
+            self.client.get('/api/transactions/recent/')
+        recent = self.client.get('/api/transactions/recent/')
+        self.assertEqual(recent.data[0]['id'], self.created.data['id'])
+        
+    def test_set_based_deletes_leave_the_entry_to_the_caller(self):
+        with self.captureOnCommitCallbacks() as callbacks, deletions_unrecorded():
+            Transaction.objects.filter(category=self.groceries).delete()
+        self.assertEqual(callbacks, [])
+        
+    def test_invalid_limit_rejected(self):
+        response = self.client.get('/api/transactions/recent/?limit=500')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class QueryCancelled(Exception):
+    """Stands in for the driver error PostgreSQL raises when statement_timeout fires"""
+    pgcode = '57014'
+
+
+def _cancelled_query(*args, **kwargs):
+    raise OperationalError('canceling statement due to statement timeout') from QueryCancelled()
+
+
+class StatementTimeoutTest(FinanceAPITestCase):
+    def test_cancelled_summary_returns_503(self):
+        with patch('finances.views.totals_by_type', side_effect=_cancelled_query):
+            response = self.client.get('/api/transactions/summary/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+    def test_other_database_errors_propagate(self):
+        with patch('finances.views.totals_by_type', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                self.client.get('/api/transactions/summary/')
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTest(FinanceAPITestCase):
+    """
+    The test runner's replica alias is a second connection to the test database.
+    It cannot see rows the primary's open test transaction has not committed,
+    which shows which alias served each read.
+    """
+    databases = {'default', 'replica'}
+    
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        create_transactions(cls.user, [(cls.groceries, '40.00', date(2024, 1, 5))])
+        
+    def test_opted_in_actions_read_from_replica(self):
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], '0.00')
+        self.assertEqual(self.client.get('/api/transactions/').data['count'], 0)
+        
+    def test_other_actions_read_from_primary(self):
+        transaction = Transaction.objects.get(user=self.user)
+        self.assertEqual(self.client.get(f'/api/transactions/{transaction.id}/').status_code, status.HTTP_200_OK)
+        
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.client.post('/api/transactions/', {
+            'type': 'expense', 'amount': '10.00', 'category': self.groceries.id, 'date': '2024-01-06'
+        })
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], '50.00')
+
+
+def _response_count(content):
+    return json.loads(content)['count']
+
+
+class ResponseEncodingTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        create_transactions(cls.user, [(cls.groceries, '10.10', date(2024, 1, day)) for day in range(1, 11)])
+        
+    def test_decimals_render_as_exact_strings(self):
+        self.assertEqual(ORJSONRenderer().render({'amount': Decimal('0.10')}), b'{"amount":"0.10"}')
+        
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_messagepack_round_trip(self):
+        response = self.client.get('/api/transactions/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['results'][0]['amount'], '10.10')
+        
+        body = msgpack.packb({'type': 'expense', 'amount': '5.25', 'category': self.groceries.id, 'date': '2024-02-01'})
+        response = self.client.post('/api/transactions/', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+    def test_large_responses_are_compressed(self):
+        response = self.client.get('/api/transactions/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(_response_count(gzip.decompress(response.content)), 10)
+        if brotli:
+            response = self.client.get('/api/transactions/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(_response_count(brotli.decompress(response.content)), 10)
+
+
+class DeltaSyncTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        cls.dining = create_category(cls.user, 'Dining Out')
+        cls.budget = create_budget(cls.user, cls.groceries)
+        cls.transactions = create_transactions(cls.user, [
+            (cls.groceries, '10.00', date(2024, 1, day)) for day in range(1, 6)
+        ])
+        # Everything existed well before the first sync
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Category, Budget, Transaction):
+            model.objects.update(updated_at=an_hour_ago)
+            
+    def _sync_all(self, token=None, limit=500):
+        pages = []
+        while True:
+            url = f'/api/sync/?limit={limit}' + (f'&since={token}' if token else '')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            token = response.data['next']
+            if not response.data['has_more']:
+                return pages, token
+            
+    def test_full_sync_pages_through_every_row_once(self):
+        pages, _ = self._sync_all(limit=3)
+        self.assertEqual(len(pages[0]['categories']), 2)
+        synced = {
+            name: [row['id'] for page in pages for row in page[name]]
+            for name in ('categories', 'budgets', 'transactions')
+        }
+        self.assertEqual(sorted(synced['categories']), sorted([self.groceries.id, self.dining.id]))
+        self.assertEqual(synced['budgets'], [self.budget.id])
+        self.assertEqual(sorted(synced['transactions']), sorted(t.id for t in self.transactions))
+        
+    def test_delta_has_only_changes_and_deletions(self):
+        _, token = self._sync_all()
+        edited, deleted = self.transactions[:2]
+        self.client.patch(f'/api/transactions/{edited.id}/', {'amount': '12.00'})
+        self.client.delete(f'/api/transactions/{deleted.id}/')
+        
+        pages, token = self._sync_all(token)
+        self.assertEqual([row['id'] for row in pages[0]['transactions']], [edited.id])
+        self.assertEqual(pages[0]['transactions'][0]['amount'], '12.00')
+        self.assertEqual(pages[0]['deleted']['transactions'], [deleted.id])
+        self.assertEqual(pages[0]['categories'], [])
+        
+    def test_merge_marks_moved_rows_changed(self):
+        dining_out = create_transactions(self.user, [(self.dining, '30.00', date(2024, 1, 9))])[0]
+        Transaction.objects.filter(pk=dining_out.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        _, token = self._sync_all()
+        self.client.post(f'/api/categories/{self.dining.id}/merge/', {'target': self.groceries.id})
+        
+        page = self._sync_all(token)[0][0]
+        self.assertEqual(
+            [(row['id'], row['category']) for row in page['transactions']], [(dining_out.id, self.groceries.id)]
+        )
+        self.assertEqual(page['deleted']['categories'], [self.dining.id])
+        
+    def test_archiving_and_account_deletion_leave_no_tombstones(self):
+        archive_user_transactions(self.user, date(2024, 1, 3))
+        self.assertFalse(Tombstone.objects.exists())
+        other = create_user()
+        create_budget(other, create_category(other))
+        other.delete()
+        self.assertFalse(Tombstone.objects.exists())
+        
+    def test_bad_tokens_rejected(self):
+        self.assertEqual(self.client.get('/api/sync/?since=garbage').status_code, status.HTTP_400_BAD_REQUEST)
+        _, token = self._sync_all()
+        other = APIClient()
+        other.force_authenticate(user=create_user())
+        self.assertEqual(other.get(f'/api/sync/?since={token}').status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(SYNC_TOMBSTONE_DAYS=0):
+            self.assertEqual(self.client.get(f'/api/sync/?since={token}').status_code, status.HTTP_410_GONE)
+            
+    def test_prune_tombstones(self):
+        Tombstone.objects.create(
+            ledger_id=self.transactions[0].ledger_id, kind='transaction', object_id=1, deleted_at=timezone.now() - timedelta(days=365)
+        )
+        deleted = self.transactions[0].pk
+        self.transactions[0].delete()
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [deleted])
+
+
+# Ten seconds into a one-minute throttle window
+THROTTLE_NOW = 1_699_999_990
+
+
+def throttle_rates(**rates):
+    rest_framework = settings.REST_FRAMEWORK
+    return override_settings(REST_FRAMEWORK={
+        **rest_framework, 'DEFAULT_THROTTLE_RATES': {**rest_framework['DEFAULT_THROTTLE_RATES'], **rates}
+    })
+
+
+@patch('finances.throttling.time.time', return_value=THROTTLE_NOW)
+class ThrottlingTest(FinanceAPITestCase):
+    def test_rate_limit_headers(self, now):
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response['RateLimit-Limit'], '600')
+        self.assertEqual(response['RateLimit-Remaining'], '599')
+        self.assertEqual(response['RateLimit-Reset'], '50')
+        self.assertEqual(response['RateLimit-Policy'], '600;w=60')
+        
+    @throttle_rates(user='25/min')
+    def test_expensive_endpoints_cost_more(self, now):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/transactions/summary/').status_code, status.HTTP_200_OK)
+        refused = self.client.get('/api/transactions/summary/')
+        self.assertEqual(refused.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(refused['Retry-After'], '50')
+        # The refused request was refunded, so cheap calls still fit in the budget
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['RateLimit-Remaining'], '4')
+        
+    def test_sync_pages_cost_the_export_rate(self, now):
+        response = self.client.get('/api/sync/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['RateLimit-Remaining'], str(600 - settings.THROTTLE_COSTS['export']))
+        
+    @throttle_rates(user='20/min')
+    def test_previous_window_fades_out(self, now):
+        for _ in range(2):
+            self.client.get('/api/transactions/summary/')
+        # Halfway through the next window half of the previous usage still counts
+        now.return_value = THROTTLE_NOW + 50 + 30
+        self.assertEqual(self.client.get('/api/categories/')['RateLimit-Remaining'], '9')
+        
+    @throttle_rates(auth='2/min')
+    def test_login_limited_per_ip(self, now):
+        client = APIClient()
+        credentials = {'username': 'testuser', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(client.post('/api/auth/login/', credentials).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            client.post('/api/auth/login/', credentials).status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(
+            client.post('/api/auth/login/', credentials, REMOTE_ADDR='10.0.0.2').status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+
+class LedgerTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.partner = create_user('partner')
+        cls.household = Ledger.objects.create(name='Household', owner=cls.user)
+        LedgerMembership.objects.create(ledger=cls.household, user=cls.user, role='owner')
+        LedgerMembership.objects.create(ledger=cls.household, user=cls.partner, role='editor')
+        cls.rent = create_category(cls.user, 'Rent', ledger=cls.household)
+        create_transactions(cls.user, [(cls.rent, '900.00', date(2024, 1, 1))])
+        
+    def _client(self, user, ledger=None):
+        client = APIClient(HTTP_X_LEDGER=str(ledger.pk) if ledger else '')
+        client.force_authenticate(user=user)
+        return client
+        
+    def test_members_share_rows_and_personal_ledgers_stay_private(self):
+        partner = self._client(self.partner, self.household)
+        response = partner.post('/api/transactions/', {
+            'type': 'expense', 'amount': '40.00', 'category': self.rent.id, 'date': '2024-01-02'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        shared = self._client(self.user, self.household).get('/api/transactions/').data['results']
+        self.assertEqual(sorted(row['amount'] for row in shared), ['40.00', '900.00'])
+        self.assertEqual(self.client.get('/api/transactions/').data['count'], 0)
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], '0.00')
+        
+    def test_viewers_read_only_and_outsiders_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f'/api/ledgers/{self.household.pk}/members/{self.partner.pk}/', {'role': 'viewer'}
+            )
+        viewer = self._client(self.partner, self.household)
+        self.assertEqual(viewer.get('/api/categories/').status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            viewer.post('/api/categories/', {'name': 'Pets', 'type': 'expense'}).status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        
+        outsider = create_user()
+        for header in (str(self.household.pk), 'household'):
+            client = APIClient(HTTP_X_LEDGER=header)
+            client.force_authenticate(user=outsider)
+            self.assertEqual(client.get('/api/transactions/').status_code, status.HTTP_404_NOT_FOUND)
+            
+    def test_categories_from_another_ledger_rejected(self):
+        personal = create_category(self.user, 'Groceries')
+        response = self._client(self.user, self.household).post('/api/transactions/', {
+            'type': 'expense', 'amount': '5.00', 'category': personal.id, 'date': '2024-01-02'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category', response.data)
+        
+    def test_revoked_access_expires_in_other_processes(self):
+        partner = self._client(self.partner, self.household)
+        self.assertEqual(partner.get('/api/transactions/').status_code, status.HTTP_200_OK)
+        # Outside captureOnCommitCallbacks the drop never runs, as in a process that did not make the change
+        LedgerMembership.objects.filter(user=self.partner, ledger=self.household).delete()
+        self.assertEqual(partner.get('/api/transactions/').status_code, status.HTTP_200_OK)
+        later = time.time() + settings.LEDGER_ACCESS_CACHE_SECONDS + 1
+        with patch('time.time', return_value=later):
+            self.assertEqual(partner.get('/api/transactions/').status_code, status.HTTP_404_NOT_FOUND)
+        
+    def test_manage_members(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ledgers/', {'name': 'Trip'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['role'], 'owner')
+        trip = Ledger.objects.get(pk=response.data['id'])
+        self.assertEqual(trip.categories.count(), 12)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.client.post(f'/api/ledgers/{trip.pk}/members/', {'username': 'partner', 'role': 'viewer'})
+        self.assertEqual(added.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self.client.post(f'/api/ledgers/{trip.pk}/members/', {'username': 'partner'}).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        partner = self._client(self.partner)
+        self.assertEqual(
+            [ledger['role'] for ledger in partner.get('/api/ledgers/').data['results']],
+            ['owner', 'editor', 'viewer']
+        )
+        self.assertEqual(partner.delete(f'/api/ledgers/{trip.pk}/').status_code, status.HTTP_403_FORBIDDEN)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            left = partner.delete(f'/api/ledgers/{trip.pk}/members/{self.partner.pk}/')
+        self.assertEqual(left.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self._client(self.partner, trip).get('/api/categories/').status_code, status.HTTP_404_NOT_FOUND
+        )
+        create_transactions(self.user, [(trip.categories.first(), '5.00', date(2024, 1, 1))])
+        self.assertEqual(self.client.delete(f'/api/ledgers/{trip.pk}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Transaction.objects.filter(ledger_id=trip.pk).exists())
+        
+    def test_personal_ledger_cannot_be_shared_or_deleted(self):
+        personal = Ledger.objects.get(owner=self.user, is_personal=True)
+        response = self.client.post(f'/api/ledgers/{personal.pk}/members/', {'username': 'partner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.delete(f'/api/ledgers/{personal.pk}/').status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_access_resolved_once_per_request(self):
+        client = self._client(self.partner, self.household)
+        
+        def queries_for(url):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(client.get(url).status_code, status.HTTP_200_OK)
+            return [query['sql'] for query in queries.captured_queries]
+        
+        cold = queries_for('/api/transactions/')
+        self.assertEqual(sum('ledgermembership' in sql for sql in cold), 1)
+        create_transactions(self.user, [(self.rent, '1.00', date(2024, 2, day)) for day in range(1, 29)])
+        warm = queries_for('/api/transactions/')
+        # Cached access: no membership lookups at all, however many rows the page holds
+        self.assertEqual(len(warm), len(cold) - 1)
+        self.assertFalse(any('ledgermembership' in sql for sql in warm))
+
+
+class AuditLogTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.food = create_category(cls.user, 'Food')
+        cls.rent = create_category(cls.user, 'Rent')
+        
+    def test_request_logs_diffs_with_one_insert(self):
+        items = [
+            {'type': 'expense', 'amount': '10.00', 'category': self.food.id, 'date': f'2024-01-0{day}'}
+            for day in range(1, 4)
+        ]
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post('/api/transactions/bulk/', items, format='json').data
+        inserts = [query for query in queries.captured_queries if 'INSERT INTO "finances_auditentry"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditEntry.objects.filter(action='c').count(), 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/transactions/{created[0]["id"]}/', {'amount': '12.50', 'date': '2024-01-01'})
+        entry = AuditEntry.objects.first()
+        self.assertEqual((entry.kind, entry.action, entry.actor_id), ('transaction', 'u', self.user.id))
+        self.assertEqual(entry.changes, {'amount': ['10.00', '12.50']})
+        
+    def test_old_values_are_read_on_update_only(self):
+        self.assertFalse(hasattr(Category.objects.get(pk=self.food.pk), '_audit_previous'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/categories/{self.food.id}/', {'name': 'Groceries'})
+        self.assertEqual(AuditEntry.objects.get(kind='category').changes, {'name': ['Food', 'Groceries']})
+        
+    def test_rolled_back_writes_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                Category.objects.create(user=self.user, name='Pets', type='expense')
+                raise ValueError
+        self.assertFalse(AuditEntry.objects.exists())
+        
+    def test_category_operations_log_moved_rows(self):
+        moved = create_transactions(self.user, [(self.food, '5.00', date(2024, 1, 1))])[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/categories/{self.food.id}/merge/', {'target': self.rent.id})
+        self.assertEqual(
+            AuditEntry.objects.get(kind='transaction', object_id=moved.pk).changes,
+            {'category': [self.food.id, self.rent.id]}
+        )
+        deleted = AuditEntry.objects.get(kind='category', object_id=self.food.id)
+        self.assertEqual((deleted.action, deleted.changes['name']), ('d', 'Food'))
+        
+    def test_history_and_activity_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post('/api/transactions/', {
+                'type': 'expense', 'amount': '8.00', 'category': self.food.id, 'date': '2024-01-05'
+            }).data
+            self.client.delete(f'/api/transactions/{created["id"]}/')
+        
+        history = self.client.get('/api/audit/', {'kind': 'transaction', 'object_id': created['id']}).data
+        self.assertEqual([entry['action'] for entry in history['results']], ['deleted', 'created'])
+        later = (timezone.now() + timedelta(minutes=1)).isoformat()
+        self.assertEqual(self.client.get('/api/audit/', {'since': later}).data['count'], 0)
+        other = APIClient(HTTP_X_LEDGER=str(Ledger.objects.personal_for(create_user().pk).pk))
+        other.force_authenticate(user=self.user)
+        self.assertEqual(other.get('/api/audit/').status_code, status.HTTP_404_NOT_FOUND)
+        
+    def test_archiving_is_not_logged_as_deletion(self):
+        create_transactions(self.user, [(self.food, '5.00', date(2021, 1, 1)), (self.food, '6.00', date(2021, 2, 1))])
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_user_transactions(self.user, date(2023, 1, 1))
+        self.assertFalse(AuditEntry.objects.filter(action='d').exists())
+        
+    def test_set_based_category_writes_are_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = create_default_categories(self.user, Ledger.objects.create(name='Household', owner=self.user))
+        self.assertEqual(
+            AuditEntry.objects.filter(kind='category', action='c', object_id__in=[c.pk for c in created]).count(),
+            len(created)
+        )
+        
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/finances/category/', {
+                'action': 'archive_categories', '_selected_action': [self.food.id, self.rent.id],
+            })
+        entries = AuditEntry.objects.filter(kind='category', action='u')
+        self.assertEqual(sorted(entry.object_id for entry in entries), sorted([self.food.id, self.rent.id]))
+        self.assertEqual({entry.actor_id for entry in entries}, {admin.id})
+        self.assertEqual(entries[0].changes, {'is_archived': [False, True]})
+        
+    def test_entries_are_append_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_category(self.user, 'Pets')
+        entry = AuditEntry.objects.get()
+        with self.assertRaises(TypeError):
+            entry.save()
+        with self.assertRaises(TypeError):
+            AuditEntry.objects.all().delete()
+
+
+class SavingsGoalTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.savings = create_category(cls.user, 'Savings')
+        cls.interest = create_category(cls.user, 'Interest', type='income')
+        cls.food = create_category(cls.user, 'Food')
+        
+    def _goal(self, **fields):
+        data = {
+            'name': 'Holiday', 'target_amount': '1200.00', 'start_date': '2024-01-01',
+            'deadline': '2024-12-31', 'categories': [self.savings.id, self.interest.id], **fields
+        }
+        response = self.client.post('/api/goals/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return SavingsGoal.objects.get(pk=response.data['id'])
+        
+    def _saved(self, goal):
+        goal.refresh_from_db()
+        return goal.saved
+        
+    def test_writes_move_progress_without_summing_history(self):
+        create_transactions(self.user, [
+            (self.savings, '100.00', date(2024, 1, 5)),
+            (self.savings, '500.00', date(2023, 12, 31)),
+        ])
+        goal = self._goal()
+        self.assertEqual(self._saved(goal), Decimal('100.00'))
+        
+        with CaptureQueriesContext(connection) as queries:
+            created = self.client.post('/api/transactions/', {
+                'type': 'income', 'amount': '20.00', 'category': self.interest.id, 'date': '2024-02-01'
+            }).data
+        self.assertFalse(any('SUM(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self._saved(goal), Decimal('120.00'))
+        
+        self.client.patch(f'/api/transactions/{created["id"]}/', {'amount': '25.00'})
+        self.assertEqual(self._saved(goal), Decimal('125.00'))
+        self.client.delete(f'/api/transactions/{created["id"]}/')
+        self.assertEqual(self._saved(goal), Decimal('100.00'))
+        
+        self.client.post('/api/transactions/bulk/', [
+            {'type': 'expense', 'amount': '50.00', 'category': self.savings.id, 'date': '2024-03-01'},
+            {'type': 'expense', 'amount': '9.00', 'category': self.food.id, 'date': '2024-03-01'},
+        ], format='json')
+        self.assertEqual(self._saved(goal), Decimal('150.00'))
+        
+    def test_progress_of_all_goals_in_one_query(self):
+        today = timezone.localdate()
+        create_transactions(self.user, [(self.savings, '100.00', today)])
+        start = (today - timedelta(days=9)).isoformat()
+        self._goal(target_amount='400.00', start_date=start, deadline=(today + timedelta(days=61)).isoformat())
+        self._goal(name='Car', start_date=start, deadline=(today + timedelta(days=20)).isoformat())
+        self._goal(
+            name='Done', target_amount='50.00', start_date=start, deadline=(today + timedelta(days=90)).isoformat()
+        )
+        
+        self.client.get('/api/goals/progress/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/goals/progress/')
+        car, holiday, done = response.data
+        # 100 saved over 10 days: 300 to go takes 30 more days, inside the 61 left
+        self.assertEqual(holiday['remaining'], '300.00')
+        self.assertEqual(holiday['percent'], 25.0)
+        self.assertEqual(holiday['required_monthly'], '149.69')
+        self.assertEqual(holiday['projected_completion'], (today + timedelta(days=30)).isoformat())
+        self.assertTrue(holiday['on_track'])
+        # Under a month left: the whole remainder is due
+        self.assertEqual(car['required_monthly'], '1100.00')
+        self.assertFalse(car['on_track'])
+        self.assertEqual((done['percent'], done['projected_completion'], done['on_track']), (100.0, None, True))
+        
+    def test_merge_marks_goal_stale_and_read_recomputes(self):
+        create_transactions(self.user, [(self.food, '40.00', date(2024, 2, 1))])
+        goal = self._goal()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/categories/{self.food.id}/merge/', {'target': self.savings.id})
+        goal.refresh_from_db()
+        self.assertTrue(goal.is_stale)
+        
+        response = self.client.get('/api/goals/progress/')
+        self.assertEqual(response.data[0]['saved'], '40.00')
+        self.assertFalse(SavingsGoal.objects.get(pk=goal.pk).is_stale)
+        
+    def test_links_changed_elsewhere_are_seen(self):
+        goal = self._goal()
+        # Warms the ledger's links
+        self.client.post('/api/transactions/', {
+            'type': 'income', 'amount': '1.00', 'category': self.interest.id, 'date': '2024-02-01'
+        })
+        # Re-linked without running on-commit hooks, as another process would
+        goal.categories.add(self.food)
+        self.client.post('/api/transactions/', {
+            'type': 'expense', 'amount': '40.00', 'category': self.food.id, 'date': '2024-02-01'
+        })
+        self.assertEqual(self._saved(goal), Decimal('41.00'))
+        self.assertEqual(self._saved(goal), recompute_goal(goal).saved)
+        
+    def test_archiving_keeps_progress(self):
+        create_transactions(self.user, [
+            (self.interest, '100.00', date(2023, 6, 1)),
+            (self.interest, '100.00', date(2023, 7, 1)),
+            (self.interest, '100.00', date(2024, 2, 1)),
+        ])
+        goal = self._goal(start_date='2023-01-01')
+        self.assertEqual(self._saved(goal), Decimal('300.00'))
+        archive_user_transactions(self.user, date(2024, 1, 1))
+        goal.refresh_from_db()
+        self.assertEqual((goal.saved, goal.is_stale), (Decimal('300.00'), False))
+        self.assertEqual(recompute_goal(goal).saved, Decimal('300.00'))
+        
+    def test_converted_progress_matches_recompute(self):
+        ExchangeRate.objects.create(currency='EUR', date=date(2024, 1, 1), rate=Decimal('1.004'))
+        goal = self._goal()
+        for day in (1, 2, 3):
+            self.client.post('/api/transactions/', {
+                'type': 'income', 'amount': '1.00', 'currency': 'EUR', 'category': self.interest.id,
+                'date': f'2024-02-0{day}',
+            })
+        # Each row is rounded to 1.00 as it is added, so 3.00 rather than 3.012 rounded once
+        self.assertEqual(self._saved(goal), Decimal('3.00'))
+        self.assertEqual(recompute_goal(goal).saved, Decimal('3.00'))
+        self.assertEqual(verify_users([self.user.id], ['goals'])['goals'], (1, []))
+        
+    def test_categories_must_belong_to_the_ledger(self):
+        other = create_category(create_user(), 'Elsewhere')
+        response = self.client.post('/api/goals/', {
+            'name': 'Bike', 'target_amount': '300.00', 'deadline': '2030-01-01', 'categories': [other.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('categories', response.data)
+
+
+class StartupTest(TestCase):
+    def test_loading_the_app_leaves_numpy_to_the_first_forecast(self):
+        # A fresh interpreter, since this one has imported everything already
+        script = (
+            'import sys, django; django.setup(); '
+            'from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print("numpy" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'budget_tracker.settings'},
+        )
+        self.assertEqual(result.stdout.strip(), 'False')
+        
+    def test_asgi_app_does_not_keep_connections(self):
+        script = (
+            'import budget_tracker.asgi; from django.conf import settings; '
+            'print(settings.DATABASES["default"]["CONN_MAX_AGE"])'
+        )
+        env = {key: value for key, value in os.environ.items() if key not in ('DB_CONN_MAX_AGE', 'SERVER_INTERFACE')}
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**env, 'DJANGO_SETTINGS_MODULE': 'budget_tracker.settings'},
+        )
+        self.assertEqual(result.stdout.strip(), '0')
+
+
+class VerifyFinancesTest(FinanceAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groceries = create_category(cls.user, 'Groceries')
+        create_transactions(cls.user, [
+            (cls.groceries, '30.00', date(2021, 3, 5)),
+            (cls.groceries, '20.00', date(2021, 3, 20)),
+            (cls.groceries, '40.00', date(2024, 3, 5)),
+        ])
+        create_budget(cls.user, cls.groceries, month=3, year=2021)
+        cls.budget = create_budget(cls.user, None, month=3, ledger_id=cls.groceries.ledger_id)
+        call_command('archive_transactions', '--before-year', '2023', stdout=StringIO())
+        for year in (2021, 2024):
+            call_command('close_month', '--year', str(year), '--month', '3', stdout=StringIO())
+        cls.goal = SavingsGoal.objects.create(
+            ledger_id=cls.groceries.ledger_id, user=cls.user, name='Pantry', target_amount=Decimal('500.00'),
+            currency='USD', start_date=date(2021, 1, 1), deadline=date(2030, 1, 1),
+        )
+        cls.goal.categories.add(cls.groceries)
+        recompute_goal(cls.goal)
+        
+    def _verify(self, *args):
+        out = StringIO()
+        call_command('verify_finances', *args, stdout=out)
+        return out.getvalue()
+        
+    def test_consistent_data_is_confirmed(self):
+        output = self._verify()
+        self.assertIn('archived_totals: 1 checked, 0 mismatched', output)
+        self.assertIn('budget_snapshots: 2 checked, 0 mismatched', output)
+        self.assertIn('goals: 1 checked, 0 mismatched', output)
+        
+    def test_drift_is_reported_then_repaired(self):
+        ArchivedMonthlyTotal.objects.update(count=9)
+        BudgetSnapshot.objects.filter(budget=self.budget).update(actual_expenses=Decimal('1.00'))
+        SavingsGoal.objects.update(saved=Decimal('5.00'))
+        with self.assertRaisesMessage(CommandError, '3 mismatches found'):
+            self._verify()
+        
+        output = self._verify('--repair')
+        self.assertIn(f'user {self.user.id} 2021-03', output)
+        self.assertEqual(ArchivedMonthlyTotal.objects.get().count, 2)
+        self.assertTrue(BudgetSnapshot.objects.get(budget=self.budget).is_stale)
+        self.assertTrue(SavingsGoal.objects.get(pk=self.goal.pk).is_stale)
+        # Stale values are left to their next read, so the rerun finds nothing to repair
+        self.assertIn('goals: 0 checked', self._verify())
+        self.assertEqual(self.client.get(f'/api/budgets/{self.budget.id}/').data['actual_expenses'], 40.0)
+        
+    def test_amounts_moved_between_categories_are_reported(self):
+        other = create_category(self.user, 'Household')
+        total = ArchivedMonthlyTotal.objects.get()
+        ArchivedMonthlyTotal.objects.create(
+            user=self.user, year=2021, month=3, category=other, type='expense', currency=total.currency,
+            total=Decimal('20.00'), count=1,
+        )
+        ArchivedMonthlyTotal.objects.filter(pk=total.pk).update(total=Decimal('30.00'), count=1)
+        results = verify_users([self.user.id], ['archived_totals'])
+        self.assertEqual(results['archived_totals'], (1, [(self.user.id, 2021, 3)]))
+        
+    def test_consistent_months_are_compared_without_their_rows(self):
+        # One grouped fingerprint query per side, whatever the number of rows
+        with self.assertNumQueries(2):
+            verify_users([self.user.id], ['archived_totals'])
+        
+    def test_repair_reads_the_month_again(self):
+        ArchivedMonthlyTotal.objects.update(count=9)
+        check = CHECKS['archived_totals']
+        compare = check.fresh
+        
+        def archived_meanwhile(user_ids):
+            # A row archived after the check read the month
+            rows = compare(user_ids)
+            ArchivedTransaction.objects.create(
+                id=10 ** 6, user=self.user, type='expense', amount=Decimal('5.00'),
+                category=self.groceries, date=date(2021, 3, 9), created_at=timezone.now(),
+            )
+            return rows
+        
+        with patch.object(check, 'fresh', archived_meanwhile):
+            verify_users([self.user.id], ['archived_totals'], repair=True)
+        total = ArchivedMonthlyTotal.objects.get()
+        self.assertEqual((total.count, total.total), (3, Decimal('55.00')))
+        
+    def test_chunks_and_single_user(self):
+        other = create_user()
+        create_transactions(other, [(create_category(other, 'Rent'), '700.00', date(2024, 5, 1))])
+        output = self._verify('--chunk-size', '1', '--check', 'archived_totals', '--user', self.user.username)
+        self.assertIn('archived_totals: 1 checked', output)
+        self.assertNotIn('goals', output)
+
+
+class VerifyFinancesParallelTest(TransactionTestCase):
+    def test_workers_verify_and_repair_every_chunk(self):
+        users = [create_user() for _ in range(3)]
+        for user in users:
+            create_transactions(user, [(create_category(user, 'Groceries'), '30.00', date(2021, 3, 5))])
+            archive_user_transactions(user, date(2023, 1, 1))
+        ArchivedMonthlyTotal.objects.filter(user=users[1]).update(count=7)
+        
+        out = StringIO()
+        call_command('verify_finances', '--workers', '2', '--chunk-size', '1', '--repair', stdout=out)
+        self.assertIn('archived_totals: 3 checked, 1 mismatched, repaired', out.getvalue())
+        self.assertEqual(ArchivedMonthlyTotal.objects.get(user=users[1]).count, 1)
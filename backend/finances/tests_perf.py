@@ -0,0 +1,71 @@
+"""
+Query budgets for the main endpoints against a 100k-transaction dataset.
+
+Tagged ``perf`` and skipped by default; run with
+``python manage.py test finances --tag perf``. The dataset is seeded once per
+test process in ``setUpTestData``, and every endpoint must stay within a fixed
+number of queries however many rows it reads.
+"""
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .factories import create_budget
+from .models import Category
+from .seeding import seed_transactions, seed_user
+
+ROWS = 100_000
+
+# Count and page queries plus per-request lookups (base currency, archive boundary).
+# Ledger access is cached, so only the first request pays its one memberships query.
+QUERY_BUDGETS = {
+    '/api/categories/': 3,
+    '/api/transactions/': 4,
+    '/api/transactions/?type=expense&ordering=-amount': 4,
+    '/api/transactions/summary/': 7,
+    '/api/transactions/summary/?rollup=true': 8,
+    '/api/transactions/compare/?preset=yoy&count=3': 3,
+    # The hot cache starts empty, so the first of these rebuilds it
+    '/api/transactions/recent/': 4,
+    '/api/transactions/top_categories/': 4,
+    # Open-month budgets add one actuals query each; the dataset has 8 of them
+    '/api/budgets/': 12,
+    '/api/budgets/current_month/': 11,
+    '/api/budgets/forecast/': 3,
+    '/api/flags/': 2,
+    '/api/jobs/': 2,
+    # One range scan per stream reached plus the base currency; transactions fill the page
+    '/api/sync/?limit=2000': 4,
+}
+
+
+@tag('perf')
+class EndpointQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user('perfuser')
+        seed_transactions(cls.user, ROWS, batch_size=10_000)
+        today = date.today()
+        for category in Category.objects.filter(user=cls.user, type='expense'):
+            create_budget(cls.user, category, '500.00', month=today.month, year=today.year)
+            
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        
+    def test_query_budgets(self):
+        for url, budget in QUERY_BUDGETS.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    '\n'.join(query['sql'] for query in queries.captured_queries)
+                )
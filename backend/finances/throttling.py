@@ -0,0 +1,157 @@
+"""
+Cost-weighted request throttling.
+
+Every request spends units from a per-user budget (per client IP when
+anonymous) set by ``DEFAULT_THROTTLE_RATES``; ordinary reads and writes cost
+one unit, while views marked with ``@throttle_cost`` spend the amount named in
+``settings.THROTTLE_COSTS``. Login and registration use their own strict
+per-IP ``auth`` rate.
+
+Unlike DRF's throttles, which keep a list of request timestamps per client,
+usage is a pair of counters in the Django cache: the current and the previous
+window, weighted by how much of the previous window still overlaps the last
+``duration`` seconds. Each request is one atomic ``incr`` plus one read,
+whatever the rate. ``RateLimitHeadersMiddleware`` reports the budget in
+``RateLimit-*`` response headers.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def throttle_cost(kind):
+    """
+    Mark a view or action as costing ``settings.THROTTLE_COSTS[kind]`` units.
+
+    Function views take it above ``@api_view``, whose generated handler methods
+    are what ``request_cost`` finds.
+    """
+    def decorator(view):
+        cls = getattr(view, 'cls', None)
+        if cls is None:
+            view.throttle_cost = kind
+        else:
+            for method in cls.http_method_names:
+                handler = getattr(cls, method, None)
+                if handler is not None:
+                    handler.throttle_cost = kind
+        return view
+    return decorator
+
+
+def request_cost(request, view):
+    # Viewset actions and function views keep their handler under the action or method name
+    handler = getattr(view, getattr(view, 'action', None) or request.method.lower(), None)
+    kind = getattr(handler, 'throttle_cost', None)
+    return settings.THROTTLE_COSTS[kind] if kind else 1
+
+
+class CostRateThrottle(SimpleRateThrottle):
+    """Sliding-window counter throttle charging each request its cost"""
+
+    def get_rate(self):
+        # Read at request time so rate changes in settings apply without a restart
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = time.time()
+        window = int(self.now // self.duration)
+        current_key = f'{self.key}:{window}'
+        self.cost = cost = request_cost(request, view)
+        self.previous = cache.get(f'{self.key}:{window - 1}', 0)
+        cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.current = cache.incr(current_key, cost)
+        except ValueError:
+            # The counter expired between add and incr
+            cache.set(current_key, cost, self.duration * 2)
+            self.current = cost
+
+        allowed = self._used() <= self.num_requests
+        if not allowed:
+            # Refund, so a client hammering the endpoint is admitted again once it backs off
+            self.current = cache.decr(current_key, cost)
+        _record(request, self)
+        return allowed
+
+    def _elapsed(self):
+        """Fraction of the current window that has passed"""
+        return (self.now % self.duration) / self.duration
+
+    def _used(self):
+        return self.previous * (1 - self._elapsed()) + self.current
+
+    def remaining(self):
+        return max(0, math.floor(self.num_requests - self._used()))
+
+    def reset(self):
+        """Seconds until the current window closes"""
+        return math.ceil(self.duration * (1 - self._elapsed()))
+
+    def wait(self):
+        # The previous window's share fades linearly; if that is not enough, wait for the next window
+        room = self.num_requests - self.current - self.cost
+        if self.previous and room > 0:
+            fade = (1 - room / self.previous) * self.duration - (self.now % self.duration)
+            return max(fade, 1)
+        return self.reset()
+
+
+class UserCostThrottle(CostRateThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return f'throttle:{self.scope}:{request.user.pk}'
+
+
+class AnonCostThrottle(CostRateThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
+
+
+class AuthRateThrottle(CostRateThrottle):
+    """Per-IP limit for login and registration, which are open to anyone"""
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
+
+
+def _record(request, throttle):
+    # Keep the tightest budget on the Django request for RateLimitHeadersMiddleware
+    current = getattr(request._request, 'rate_limit', None)
+    if current is None or throttle.remaining() < current.remaining():
+        request._request.rate_limit = throttle
+
+
+class RateLimitHeadersMiddleware:
+    """Adds RateLimit-Limit/Remaining/Reset/Policy headers to throttled API responses"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        throttle = getattr(request, 'rate_limit', None)
+        if throttle is not None:
+            response['RateLimit-Limit'] = str(throttle.num_requests)
+            response['RateLimit-Remaining'] = str(throttle.remaining())
+            response['RateLimit-Reset'] = str(throttle.reset())
+            response['RateLimit-Policy'] = f'{throttle.num_requests};w={throttle.duration}'
+        return response
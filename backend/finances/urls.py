@@ -1,20 +1,27 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    CategoryViewSet, TransactionViewSet, BudgetViewSet,
-    register_view, login_view, logout_view, current_user_view
+    CategoryViewSet, TransactionViewSet, BudgetViewSet, SavingsGoalViewSet, TransactionFlagViewSet, JobViewSet,
+    LedgerViewSet, AuditEntryViewSet,
+    register_view, login_view, logout_view, current_user_view, sync_view
 )
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'budgets', BudgetViewSet, basename='budget')
+router.register(r'goals', SavingsGoalViewSet, basename='goal')
+router.register(r'flags', TransactionFlagViewSet, basename='flag')
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'ledgers', LedgerViewSet, basename='ledger')
+router.register(r'audit', AuditEntryViewSet, basename='audit')
 
 urlpatterns = [
     path('auth/register/', register_view, name='register'),
     path('auth/login/', login_view, name='login'),
     path('auth/logout/', logout_view, name='logout'),
     path('auth/user/', current_user_view, name='current-user'),
+    path('sync/', sync_view, name='sync'),
     path('', include(router.urls)),
 ]
 
@@ -0,0 +1,259 @@
+"""
+Consistency checks between derived finance data and the rows it is derived from.
+
+Each check reads a chunk of users twice: the derived values as stored, and the
+same values aggregated afresh from the source rows, both keyed by user and
+month. Neither side is read row by row: each key is reduced to one fingerprint
+(row count, sum of amounts, sum of amounts weighted by category, budget or goal
+id, ...), grouped in the database where the values are stored, and only the
+keys whose fingerprints differ are reported and, when asked to, repaired.
+
+    archived_totals   ArchivedMonthlyTotal against ArchivedTransaction;
+                      repaired by rebuilding the month's totals
+    budget_snapshots  fresh BudgetSnapshot values against the budget's actual
+                      spend; repaired by marking the month's snapshots stale
+    goals             SavingsGoal.saved against its transactions, per user;
+                      repaired by marking the goals stale
+
+Checks run in that order, so budget snapshots are compared against archived
+totals that have just been repaired. Archived totals are rebuilt from rows read
+inside the repair's transaction, with the month's totals locked, so detail rows
+are only loaded for months that differ. Stale snapshots are recomputed by the
+refresh_snapshots job and stale goals by their next read, so a repair never
+overwrites a value that a concurrent write is updating. Memory is bounded by the chunk: nothing is held
+across chunks except counts.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from .currency import converted_amount, converted_monthly_total
+from .goals import saved_amount
+from .models import (
+    ArchiveBoundary, ArchivedMonthlyTotal, ArchivedTransaction, Budget, BudgetSnapshot, Profile, SavingsGoal,
+    Transaction,
+)
+from .snapshots import invalidate, month_bounds
+
+CENTS = Decimal('0.01')
+
+
+def _cents(value):
+    return str(Decimal(value or 0).quantize(CENTS))
+
+
+def _group(pairs):
+    """{key: [row]} from (key, row) pairs"""
+    grouped = defaultdict(list)
+    for key, row in pairs:
+        grouped[key].append(row)
+    return grouped
+
+
+class ArchivedTotalsCheck:
+    """
+    Per month: rows counted, total, income, total and rows weighted by category
+    id. Sums weighted by category catch amounts moved between categories that
+    leave the month's total unchanged.
+    """
+    name = 'archived_totals'
+    keys = ('user_id', 'year', 'month')
+    fields = ('category_id', 'type', 'currency')
+
+    def derived(self, user_ids):
+        rows = ArchivedMonthlyTotal.objects.filter(user_id__in=user_ids).values_list(*self.keys).annotate(
+            counted=Sum('count'), summed=Sum('total'), income=Sum('total', filter=Q(type='income')),
+            by_category=Sum(F('total') * F('category_id')), counted_by_category=Sum(F('count') * F('category_id')),
+        ).order_by()
+        return self._fingerprints(rows)
+
+    def fresh(self, user_ids):
+        rows = ArchivedTransaction.objects.filter(user_id__in=user_ids).annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date')
+        ).values_list(*self.keys).annotate(
+            counted=Count('id'), summed=Sum('amount'), income=Sum('amount', filter=Q(type='income')),
+            by_category=Sum(F('amount') * F('category_id')), counted_by_category=Sum('category_id'),
+        ).order_by()
+        return self._fingerprints(rows)
+
+    def _fingerprints(self, rows):
+        return {
+            (u, y, m): (count, _cents(total), _cents(income), _cents(by_category), count_by_category or 0)
+            for u, y, m, count, total, income, by_category, count_by_category in rows
+        }
+
+    def repair(self, key):
+        user_id, year, month = key
+        totals = ArchivedMonthlyTotal.objects.filter(user_id=user_id, year=year, month=month)
+        with transaction.atomic():
+            # Merges repoint these rows, so holding their locks keeps one from landing mid-rebuild
+            list(totals.select_for_update().values_list('pk'))
+            rows = ArchivedTransaction.objects.filter(
+                user_id=user_id, date__year=year, date__month=month
+            ).values_list(*self.fields).annotate(sum_total=Sum('amount'), sum_count=Count('id')).order_by()
+            totals.delete()
+            ArchivedMonthlyTotal.objects.bulk_create([
+                ArchivedMonthlyTotal(
+                    user_id=user_id, year=year, month=month, category_id=category_id, type=type,
+                    currency=currency, total=total, count=count,
+                )
+                for category_id, type, currency, total, count in rows
+            ])
+
+
+def _add(fingerprints, key, pk, value):
+    """Fold the value stored for pk into the (count, total, total weighted by pk) fingerprint of key"""
+    count, total, weighted = fingerprints.get(key, (0, Decimal('0'), Decimal('0')))
+    value = Decimal(_cents(value))
+    fingerprints[key] = (count + 1, total + value, weighted + value * pk)
+
+
+def _normalized(fingerprints):
+    return {
+        key: (count, _cents(total), _cents(weighted), *rest)
+        for key, (count, total, weighted, *rest) in fingerprints.items()
+    }
+
+
+class BudgetSnapshotsCheck:
+    """
+    Fresh snapshots against budget_actual, computed for the whole chunk at once.
+
+    Expense totals are read grouped by ledger, month and category path (live rows)
+    or user, month and category path (archived totals), once per base currency, and
+    each budget sums the paths under its category, as budget_actual does. A month's
+    fingerprint also counts the snapshots held in the user's base currency.
+    """
+    name = 'budget_snapshots'
+
+    def derived(self, user_ids):
+        base = Coalesce(F('budget__user__finance_profile__base_currency'), Value(settings.DEFAULT_CURRENCY))
+        rows = BudgetSnapshot.objects.filter(is_stale=False, budget__user_id__in=user_ids).values_list(
+            'budget__user_id', 'budget__year', 'budget__month'
+        ).annotate(
+            counted=Count('pk'), summed=Sum('actual_expenses'), weighted=Sum(F('actual_expenses') * F('budget_id')),
+            in_base=Count('pk', filter=Q(currency=base)),
+        ).order_by()
+        return _normalized({(u, y, m): rest for u, y, m, *rest in rows})
+
+    def fresh(self, user_ids):
+        budgets = list(
+            Budget.objects.filter(snapshot__is_stale=False, user_id__in=user_ids)
+            .select_related('category', 'ledger').order_by()
+        )
+        bases = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'base_currency'))
+        boundaries = dict(ArchiveBoundary.objects.filter(
+            user_id__in={budget.ledger.owner_id for budget in budgets if budget.ledger.is_personal}
+        ).values_list('user_id', 'archived_before'))
+
+        by_base = defaultdict(list)
+        for budget in budgets:
+            by_base[bases.get(budget.user_id) or settings.DEFAULT_CURRENCY].append(budget)
+
+        fresh = {}
+        for base, group in by_base.items():
+            live, archived = self._totals(group, base)
+            for budget in group:
+                start_date, _ = month_bounds(budget.year, budget.month)
+                total = self._within(budget, live.get((budget.ledger_id, budget.year, budget.month), ()))
+                boundary = boundaries.get(budget.ledger.owner_id) if budget.ledger.is_personal else None
+                if boundary and start_date < boundary:
+                    total += self._within(budget, archived.get((budget.user_id, budget.year, budget.month), ()))
+                _add(fresh, (budget.user_id, budget.year, budget.month), budget.pk, round(total, 2))
+        # Fresh snapshots are all in the base currency
+        return _normalized({key: (*fingerprint, fingerprint[0]) for key, fingerprint in fresh.items()})
+
+    def _totals(self, budgets, base):
+        first = min(month_bounds(budget.year, budget.month)[0] for budget in budgets)
+        end = max(month_bounds(budget.year, budget.month)[1] for budget in budgets)
+        live = Transaction.objects.filter(
+            type='expense', ledger_id__in={budget.ledger_id for budget in budgets}, date__gte=first, date__lt=end
+        ).annotate(year=ExtractYear('date'), month=ExtractMonth('date')).values_list(
+            'ledger_id', 'year', 'month', 'category__path'
+        ).annotate(total=Sum(converted_amount(base))).order_by()
+        archived = ArchivedMonthlyTotal.objects.filter(
+            type='expense', user_id__in={budget.user_id for budget in budgets}
+        ).values_list('user_id', 'year', 'month', 'category__path').annotate(
+            sum_total=Sum(converted_monthly_total(base))
+        ).order_by()
+        return (
+            _group(((owner, y, m), (path, total or 0)) for owner, y, m, path, total in live),
+            _group(((owner, y, m), (path, total or 0)) for owner, y, m, path, total in archived),
+        )
+
+    def _within(self, budget, totals):
+        # Overall budgets count every category; others their whole subtree
+        prefix = budget.category.path if budget.category_id else ''
+        return sum((total for path, total in totals if path.startswith(prefix)), Decimal('0'))
+
+    def repair(self, key):
+        user_id, year, month = key
+        invalidate(BudgetSnapshot.objects.filter(budget__user_id=user_id, budget__year=year, budget__month=month))
+
+
+class GoalsCheck:
+    """Saved amounts of fresh goals against the sum goals.recompute would store"""
+    name = 'goals'
+
+    def derived(self, user_ids):
+        rows = SavingsGoal.objects.filter(is_stale=False, user_id__in=user_ids).values_list('user_id').annotate(
+            counted=Count('pk'), summed=Sum('saved'), weighted=Sum(F('saved') * F('pk'))
+        ).order_by()
+        return _normalized({(user_id,): rest for user_id, *rest in rows})
+
+    def fresh(self, user_ids):
+        goals = list(SavingsGoal.objects.filter(is_stale=False, user_id__in=user_ids).order_by())
+        by_currency = defaultdict(list)
+        for goal in goals:
+            by_currency[goal.currency].append(goal.pk)
+
+        totals = defaultdict(Decimal)
+        for currency, goal_ids in by_currency.items():
+            for model in (Transaction, ArchivedTransaction):
+                rows = model.objects.filter(
+                    category__savings_goals__in=goal_ids,
+                    date__gte=F('category__savings_goals__start_date'),
+                ).values_list('category__savings_goals').annotate(total=Sum(saved_amount(currency))).order_by()
+                for goal_id, total in rows:
+                    totals[goal_id] += total or 0
+        fresh = {}
+        for goal in goals:
+            _add(fresh, (goal.user_id,), goal.pk, totals[goal.pk])
+        return _normalized(fresh)
+
+    def repair(self, key):
+        SavingsGoal.objects.filter(user_id=key[0], is_stale=False).update(is_stale=True)
+
+
+CHECKS = {check.name: check for check in (ArchivedTotalsCheck(), BudgetSnapshotsCheck(), GoalsCheck())}
+
+
+def verify_users(user_ids, names=tuple(CHECKS), repair=False):
+    """
+    Run the named checks for user_ids.
+
+    Returns ``{name: (number of keys checked, sorted mismatched keys)}``; with
+    repair, the mismatched keys have been repaired.
+    """
+    results = {}
+    for name in names:
+        check = CHECKS[name]
+        derived, fresh = check.derived(user_ids), check.fresh(user_ids)
+        keys = derived.keys() | fresh.keys()
+        mismatched = sorted(key for key in keys if derived.get(key) != fresh.get(key))
+        if repair:
+            for key in mismatched:
+                check.repair(key)
+        results[name] = (len(keys), mismatched)
+    return results
+
+
+def verify_range(first_id, end_id, names=tuple(CHECKS), repair=False):
+    """verify_users for the users with first_id <= id < end_id; the unit of work of a worker process"""
+    user_ids = list(User.objects.filter(pk__gte=first_id, pk__lt=end_id).values_list('pk', flat=True))
+    return verify_users(user_ids, names, repair) if user_ids else {name: (0, []) for name in names}
@@ -1,24 +1,63 @@
-from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework import mixins, viewsets, status, filters
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import PermissionDenied
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db.models import Sum, Q
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from datetime import datetime, date
 from decimal import Decimal
-from .models import Category, Transaction, Budget
+from .models import (
+    ArchivedTransaction, AuditEntry, Category, Job, Ledger, LedgerMembership, Profile, SavingsGoal, Transaction,
+    TransactionFlag, Budget
+)
 from .serializers import (
     CategorySerializer, TransactionSerializer, BudgetSerializer,
-    UserSerializer, FinancialSummarySerializer
+    UserSerializer, FinancialSummarySerializer, TransactionRowSerializer, TransactionFlagSerializer,
+    JobSerializer, SyncBudgetSerializer, LedgerSerializer, LedgerMemberSerializer, AuditEntrySerializer,
+    SavingsGoalSerializer, GoalProgressSerializer
+)
+from .filters import AuditEntryFilter, TransactionFilter
+from .category_ops import (
+    CategoryOperationError, create_default_categories, merge_categories, reassign_transactions, set_archived
+)
+from .forecasting import FORECAST_METHODS, forecast_budgets
+from .anomalies import check_transactions
+from .archive import archived_row, archived_source, combined_rows, ledger_archived_before, needs_archive
+from .summaries import (
+    COMPARE_PRESETS, TransactionSource, category_breakdown, compare_periods, monthly_trend,
+    preset_periods, subtree_breakdown, totals_by_type
 )
-from .filters import TransactionFilter
+from .currency import converted_amount, is_known_currency, request_base_currency
+from .jobs import cancel as cancel_job
+from . import audit, goals, hot_cache
+from .database import summary_timeout
+from .events import publish_resync
+from .ledgers import LedgerPermission, memberships, request_ledger
+from .replicas import ReplicaReadsMixin
+from .snapshots import mark_stale
+from .sync import SyncTokenError, SyncTokenExpired, deletions_unrecorded, sync_page
+from .throttling import AuthRateThrottle, throttle_cost
+from .concurrency import VersionedModelMixin, unique_violation_as_validation_error
+
+DUPLICATE_CATEGORY = {'name': 'This ledger already has a category with this name.'}
+DUPLICATE_BUDGET = {'non_field_errors': ['A budget for this category and month already exists.']}
+DUPLICATE_MEMBER = {'username': 'This user is already a member of the ledger.'}
+MAX_COMPARE_PERIODS = 36
+MAX_SYNC_PAGE = 2000
+MAX_BULK_ITEMS = 1000
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthRateThrottle])
 def register_view(request):
     """
     User registration endpoint
@@ -55,23 +94,7 @@ def register_view(request):
         )
         
         # Create default categories for new user
-        default_categories = [
-            ('Salary', 'income'),
-            ('Freelance', 'income'),
-            ('Investments', 'income'),
-            ('Other Income', 'income'),
-            ('Groceries', 'expense'),
-            ('Rent', 'expense'),
-            ('Utilities', 'expense'),
-            ('Transportation', 'expense'),
-            ('Entertainment', 'expense'),
-            ('Healthcare', 'expense'),
-            ('Dining Out', 'expense'),
-            ('Shopping', 'expense'),
-        ]
-        
-        for name, cat_type in default_categories:
-            Category.objects.create(user=user, name=name, type=cat_type)
+        create_default_categories(user)
         
         # Generate token
         token = Token.objects.create(user=user)
@@ -91,6 +114,7 @@ def register_view(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthRateThrottle])
 def login_view(request):
     """
     Login endpoint that returns authentication token
@@ -133,162 +157,398 @@ def logout_view(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['GET'])
+@api_view(['GET', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def current_user_view(request):
     """
-    Get current authenticated user information
+    Get current authenticated user information, or update the base currency
     """
+    if request.method == 'PATCH':
+        base_currency = str(request.data.get('base_currency', '')).upper()
+        if not is_known_currency(base_currency):
+            return Response(
+                {'error': 'Unknown currency. Load exchange rates for it first.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        Profile.objects.update_or_create(user=request.user, defaults={'base_currency': base_currency})
+    
     serializer = UserSerializer(request.user)
     return Response(serializer.data)
 
 
+@throttle_cost('export')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LedgerPermission])
+def sync_view(request):
+    """
+    Ledger categories, budgets and transactions changed or deleted since the ?since= token.
+    Keep requesting with the returned token while has_more is true.
+    """
+    limit = request.query_params.get('limit', '500')
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_SYNC_PAGE:
+        return Response(
+            {'error': f'limit must be between 1 and {MAX_SYNC_PAGE}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        changes, token, has_more = sync_page(
+            request_ledger(request).id, request.query_params.get('since'), int(limit)
+        )
+    except SyncTokenExpired as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_410_GONE)
+    except SyncTokenError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    context = {'request': request}
+    return Response({
+        'categories': CategorySerializer(changes['categories'], many=True, context=context).data,
+        'budgets': SyncBudgetSerializer(changes['budgets'], many=True, context=context).data,
+        'transactions': TransactionSerializer(changes['transactions'], many=True, context=context).data,
+        'deleted': changes['deleted'],
+        'next': token,
+        'has_more': has_more,
+    })
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing categories
     """
     serializer_class = CategorySerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, LedgerPermission]
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ['type']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
+        queryset = Category.objects.filter(ledger_id=request_ledger(self.request).id)
+        if self.action == 'list' and self.request.query_params.get('include_archived') != 'true':
+            queryset = queryset.filter(is_archived=False)
+        return queryset
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with unique_violation_as_validation_error(DUPLICATE_CATEGORY):
+            serializer.save(user=self.request.user, ledger_id=request_ledger(self.request).id)
+    
+    def perform_update(self, serializer):
+        with unique_violation_as_validation_error(DUPLICATE_CATEGORY):
+            serializer.save()
+    
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {'error': 'Category has transactions. Merge, reassign or archive it instead.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def _run_category_operation(self, request, operation):
+        target_id = str(request.data.get('target', ''))
+        target = None
+        if target_id.isdigit():
+            target = Category.objects.filter(ledger_id=request_ledger(request).id, pk=target_id).first()
+        
+        if target is None:
+            return Response(
+                {'error': 'A valid target category is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = operation(self.get_object(), target)
+        except CategoryOperationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=True, methods=['post'])
+    def reassign(self, request, pk=None):
+        """
+        Move all transactions of this category to the target category
+        """
+        return self._run_category_operation(request, reassign_transactions)
+    
+    @action(detail=True, methods=['post'])
+    def merge(self, request, pk=None):
+        """
+        Merge this category (transactions and budgets) into the target and delete it
+        """
+        return self._run_category_operation(request, merge_categories)
+    
+    @action(detail=True, methods=['post'])
+    def archive(self, request, pk=None):
+        """
+        Archive (or restore with archived=false) a category
+        """
+        archived = str(request.data.get('archived', 'true')).lower() not in ('false', '0')
+        return Response(set_archived(self.get_object(), archived))
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadsMixin, VersionedModelMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing transactions with filtering and pagination
     """
     serializer_class = TransactionSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, LedgerPermission]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = TransactionFilter
     ordering_fields = ['date', 'amount', 'created_at']
     ordering = ['-date', '-created_at']
+    replica_actions = ('list', 'summary', 'compare')
     
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).select_related('category')
+        return Transaction.objects.filter(ledger_id=request_ledger(self.request).id).select_related('category')
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user, ledger_id=request_ledger(self.request).id)
+    
+    @action(detail=False, methods=['post'])
+    @throttle_cost('import')
+    def bulk(self, request):
+        """
+        Create up to MAX_BULK_ITEMS transactions from a list, all or none
+        """
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False, max_length=MAX_BULK_ITEMS
+        )
+        serializer.is_valid(raise_exception=True)
+        
+        # bulk_create skips the per-row signals, so the log, goals, caches and review
+        # flags they maintain are updated once for the batch
+        ledger_id = request_ledger(request).id
+        with transaction.atomic():
+            created = Transaction.objects.bulk_create([
+                Transaction(user=request.user, ledger_id=ledger_id, **item)
+                for item in serializer.validated_data
+            ])
+            audit.record_created(Transaction, created)
+            goals.transactions_created(ledger_id, created)
+            check_transactions(created)
+            mark_stale(ledger_id, *{item['date'] for item in serializer.validated_data})
+            publish_resync(ledger_id)
+            hot_cache.invalidate(ledger_id)
+        return Response(self.get_serializer(created, many=True).data, status=status.HTTP_201_CREATED)
+    
+    def _parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None
+    
+    def list(self, request, *args, **kwargs):
+        ledger = request_ledger(request)
+        boundary = ledger_archived_before(ledger)
+        if not needs_archive(boundary, self._parse_date(request.query_params.get('date_from'))):
+            return super().list(request, *args, **kwargs)
+        
+        # The requested range reaches into closed years: union live and archived rows
+        hot = self.filter_queryset(self.get_queryset())
+        cold = TransactionFilter(
+            request.query_params,
+            queryset=ArchivedTransaction.objects.filter(user_id=ledger.owner_id),
+            request=request
+        ).qs
+        ordering = filters.OrderingFilter().get_ordering(request, hot, self)
+        page = self.paginate_queryset(combined_rows(hot, cold, ordering))
+        return self.get_paginated_response(
+            TransactionRowSerializer(page, many=True, context=self.get_serializer_context()).data
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Archived ids stay listed, so they can be read here too (but not written)
+            ledger = request_ledger(request)
+            pk = kwargs['pk']
+            row = archived_row(ledger.owner_id, pk) if pk.isdigit() and ledger_archived_before(ledger) else None
+            if row is None:
+                raise
+            return Response(TransactionRowSerializer(row, context=self.get_serializer_context()).data)
     
     @action(detail=False, methods=['get'])
+    @throttle_cost('summary')
+    @summary_timeout
     def summary(self, request):
         """
         Get financial summary with totals and category breakdowns
         """
         # Get query parameters for date filtering
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
+        start_date = self._parse_date(request.query_params.get('start_date'))
+        end_date = self._parse_date(request.query_params.get('end_date'))
         
         # Base queryset
         queryset = self.get_queryset()
         
         # Apply date filters if provided
         if start_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__gte=start_date)
-            except ValueError:
-                pass
-        
+            queryset = queryset.filter(date__gte=start_date)
         if end_date:
-            try:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__lte=end_date)
-            except ValueError:
-                pass
-        
-        # Calculate totals
-        income_total = queryset.filter(type='income').aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        expense_total = queryset.filter(type='expense').aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        balance = income_total - expense_total
-        
-        # Expense breakdown by category
-        expense_by_category = queryset.filter(type='expense').values(
-            'category__name', 'category__id'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')
+            queryset = queryset.filter(date__lte=end_date)
+        sources = [TransactionSource(queryset)]
         
-        expense_categories = [
-            {
-                'category': item['category__name'],
-                'category_id': item['category__id'],
-                'amount': float(item['total'])
-            }
-            for item in expense_by_category
-        ]
+        # Closed years are only read when the range starts before the archive boundary
+        ledger = request_ledger(request)
+        boundary = ledger_archived_before(ledger)
+        if needs_archive(boundary, start_date):
+            sources.append(archived_source(ledger.owner_id, boundary, start_date, end_date))
         
-        # Income breakdown by category
-        income_by_category = queryset.filter(type='income').values(
-            'category__name', 'category__id'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')
+        # Restrict to a category subtree if requested
+        parent = None
+        category_id = request.query_params.get('category', '')
+        if category_id.isdigit():
+            parent = Category.objects.filter(ledger_id=ledger.id, pk=category_id).first()
+            if parent:
+                sources = [source.filter(category__path__startswith=parent.path) for source in sources]
         
-        income_categories = [
-            {
-                'category': item['category__name'],
-                'category_id': item['category__id'],
-                'amount': float(item['total'])
-            }
-            for item in income_by_category
-        ]
+        # Every source sums in the user's base currency, converting inside the query
+        base = request_base_currency(request)
+        sources = [source.in_currency(base) for source in sources]
         
-        # Monthly trend (last 6 months)
-        from django.db.models.functions import TruncMonth
-        monthly_data = queryset.annotate(
-            month=TruncMonth('date')
-        ).values('month', 'type').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        # Organize monthly data
-        monthly_dict = {}
-        for item in monthly_data:
-            month_str = item['month'].strftime('%Y-%m')
-            if month_str not in monthly_dict:
-                monthly_dict[month_str] = {'month': month_str, 'income': 0, 'expense': 0}
-            monthly_dict[month_str][item['type']] = float(item['total'])
+        # Calculate totals
+        totals = totals_by_type(sources)
         
-        monthly_trend = list(monthly_dict.values())
+        if request.query_params.get('rollup') == 'true':
+            # Roll leaf categories up into whole subtrees
+            expense_categories = subtree_breakdown(sources, 'expense', ledger.id, parent)
+            income_categories = subtree_breakdown(sources, 'income', ledger.id, parent)
+        else:
+            expense_categories = category_breakdown(sources, 'expense')
+            income_categories = category_breakdown(sources, 'income')
         
         summary_data = {
-            'total_income': income_total,
-            'total_expenses': expense_total,
-            'balance': balance,
+            'currency': base,
+            'total_income': totals['income'],
+            'total_expenses': totals['expense'],
+            'balance': totals['income'] - totals['expense'],
             'expense_by_category': expense_categories,
             'income_by_category': income_categories,
-            'monthly_trend': monthly_trend,
+            'monthly_trend': monthly_trend(sources),
         }
         
         serializer = FinancialSummarySerializer(summary_data)
         return Response(serializer.data)
+    
+    def _compare_periods(self, params):
+        """Periods from ?periods=start:end,... or ?preset=mom|yoy&as_of=&count="""
+        if params.get('periods'):
+            periods = []
+            for period in params['periods'].split(','):
+                start, end = (datetime.strptime(part, '%Y-%m-%d').date() for part in period.split(':'))
+                if start > end:
+                    raise ValueError
+                periods.append((start, end))
+            return periods
+        
+        preset = params.get('preset', 'mom')
+        if preset not in COMPARE_PRESETS:
+            raise ValueError
+        as_of = self._parse_date(params.get('as_of')) or date.today()
+        count = int(params.get('count', 2))
+        # Out-of-range counts are rejected by the caller's length check
+        return preset_periods(preset, as_of, count) if count <= MAX_COMPARE_PERIODS else []
+    
+    @action(detail=False, methods=['get'])
+    @throttle_cost('summary')
+    @summary_timeout
+    def compare(self, request):
+        """
+        Compare category totals across periods against the first (baseline) period
+        """
+        try:
+            periods = self._compare_periods(request.query_params)
+        except ValueError:
+            return Response(
+                {'error': 'Use periods=YYYY-MM-DD:YYYY-MM-DD,... or preset=mom|yoy with an integer count'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 2 <= len(periods) <= MAX_COMPARE_PERIODS:
+            return Response(
+                {'error': f'Compare between 2 and {MAX_COMPARE_PERIODS} periods'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start_date = min(start for start, _ in periods)
+        end_date = max(end for _, end in periods)
+        sources = [TransactionSource(
+            self.get_queryset().filter(date__gte=start_date, date__lte=end_date)
+        )]
+        ledger = request_ledger(request)
+        boundary = ledger_archived_before(ledger)
+        if needs_archive(boundary, start_date):
+            sources.append(archived_source(ledger.owner_id, boundary, start_date, end_date, periods))
+        
+        base = request_base_currency(request)
+        totals, categories = compare_periods(
+            [source.in_currency(base) for source in sources], periods
+        )
+        return Response({
+            'currency': base,
+            'periods': totals,
+            'categories': categories,
+        })
+    
+    def _limit(self, default, maximum):
+        value = self.request.query_params.get('limit', '')
+        if not value:
+            return default
+        if not value.isdigit() or not 1 <= int(value) <= maximum:
+            raise ValueError
+        return int(value)
+    
+    @action(detail=False, methods=['get'])
+    def recent(self, request):
+        """
+        Newest transactions for the dashboard, served from the per-ledger hot cache
+        """
+        try:
+            limit = self._limit(10, hot_cache.RECENT_SIZE)
+        except ValueError:
+            return Response(
+                {'error': f'limit must be between 1 and {hot_cache.RECENT_SIZE}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(hot_cache.recent_transactions(request_ledger(request), limit))
+    
+    @action(detail=False, methods=['get'])
+    def top_categories(self, request):
+        """
+        Largest all-time expense categories, served from the per-ledger hot cache
+        """
+        try:
+            limit = self._limit(hot_cache.TOP_CATEGORIES, 50)
+        except ValueError:
+            return Response({'error': 'limit must be between 1 and 50'}, status=status.HTTP_400_BAD_REQUEST)
+        currency, categories = hot_cache.top_categories(request_ledger(request), limit)
+        return Response({'currency': currency, 'categories': categories})
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(ReplicaReadsMixin, VersionedModelMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing budgets
     """
     serializer_class = BudgetSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, LedgerPermission]
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ['month', 'year', 'category']
     ordering_fields = ['year', 'month', 'amount']
     ordering = ['-year', '-month']
+    replica_actions = ('list', 'current_month', 'forecast')
     
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user).select_related('category')
+        return Budget.objects.filter(ledger_id=request_ledger(self.request).id).select_related(
+            'category', 'snapshot', 'ledger'
+        )
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with unique_violation_as_validation_error(DUPLICATE_BUDGET):
+            serializer.save(user=self.request.user, ledger_id=request_ledger(self.request).id)
+    
+    def perform_update(self, serializer):
+        with unique_violation_as_validation_error(DUPLICATE_BUDGET):
+            super().perform_update(serializer)
     
     @action(detail=False, methods=['get'])
     def current_month(self, request):
@@ -299,4 +559,247 @@ class BudgetViewSet(viewsets.ModelViewSet):
         budgets = self.get_queryset().filter(month=today.month, year=today.year)
         serializer = self.get_serializer(budgets, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @throttle_cost('summary')
+    @summary_timeout
+    def forecast(self, request):
+        """
+        Project month-end spend and overspend dates for the month containing as_of
+        """
+        as_of = request.query_params.get('as_of')
+        method = request.query_params.get('method', 'linear')
+        history = request.query_params.get('history', '3')
+        
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else date.today()
+            history = int(history)
+        except ValueError:
+            return Response(
+                {'error': 'as_of must be YYYY-MM-DD and history must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if method not in FORECAST_METHODS:
+            return Response(
+                {'error': f'method must be one of: {", ".join(FORECAST_METHODS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        budgets = self.get_queryset().filter(month=as_of.month, year=as_of.year)
+        transactions = Transaction.objects.filter(ledger_id=request_ledger(request).id)
+        forecasts = forecast_budgets(
+            budgets, transactions, as_of,
+            history=min(max(history, 0), 24),
+            method=method,
+            amount=converted_amount(request_base_currency(request)),
+        )
+        return Response({
+            'as_of': as_of,
+            'method': method,
+            'budgets': forecasts,
+        })
+
+
+class SavingsGoalViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing savings goals
+    """
+    serializer_class = SavingsGoalSerializer
+    permission_classes = [IsAuthenticated, LedgerPermission]
+    
+    def get_queryset(self):
+        return SavingsGoal.objects.filter(ledger_id=request_ledger(self.request).id).prefetch_related('categories')
+    
+    def perform_create(self, serializer):
+        # Progress starts from the history already recorded; writes keep it current from here on
+        with transaction.atomic():
+            goals.recompute(serializer.save(
+                user=self.request.user,
+                ledger_id=request_ledger(self.request).id,
+                currency=request_base_currency(self.request),
+            ))
+    
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            goals.recompute(serializer.save())
+    
+    @action(detail=False, methods=['get'])
+    def progress(self, request):
+        """
+        Progress, required monthly pace and projected completion date of every goal
+        """
+        ledger_goals = list(SavingsGoal.objects.filter(ledger_id=request_ledger(request).id))
+        for goal in ledger_goals:
+            if goal.is_stale:
+                goals.recompute(goal)
+        return Response(GoalProgressSerializer(ledger_goals, many=True).data)
 
+
+class TransactionFlagViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.UpdateModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Review queue of suspected duplicate and outlier transactions
+    """
+    serializer_class = TransactionFlagSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+    
+    def get_queryset(self):
+        return TransactionFlag.objects.filter(user=self.request.user).select_related(
+            'transaction__category'
+        )
+    
+    def perform_update(self, serializer):
+        serializer.save(reviewed_at=timezone.now())
+
+
+class JobViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Enqueue background jobs and poll their status, progress and result
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+    
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+    
+    @throttle_cost('job')
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Cancel a job that has not started yet
+        """
+        job = self.get_object()
+        if not cancel_job(job):
+            return Response(
+                {'error': 'Only queued jobs can be cancelled'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+
+
+class AuditEntryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Audit log of the ledger's categories, transactions and budgets, newest first
+    """
+    serializer_class = AuditEntrySerializer
+    permission_classes = [IsAuthenticated, LedgerPermission]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AuditEntryFilter
+    
+    def get_queryset(self):
+        return AuditEntry.objects.filter(ledger_id=request_ledger(self.request).id)
+
+
+class LedgerViewSet(viewsets.ModelViewSet):
+    """
+    Ledgers the user belongs to, and their members. Only the owner changes a ledger.
+    """
+    serializer_class = LedgerSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return Ledger.objects.filter(pk__in=memberships(self.request.user.pk))
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['access'] = memberships(self.request.user.pk)
+        return context
+    
+    def _check_owner(self, ledger):
+        if not memberships(self.request.user.pk)[ledger.pk].is_owner:
+            raise PermissionDenied('Only the owner can change this ledger.')
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            ledger = serializer.save(owner=self.request.user)
+            LedgerMembership.objects.create(ledger=ledger, user=self.request.user, role='owner')
+            create_default_categories(self.request.user, ledger)
+    
+    def perform_update(self, serializer):
+        self._check_owner(serializer.instance)
+        serializer.save()
+    
+    def destroy(self, request, *args, **kwargs):
+        ledger = self.get_object()
+        self._check_owner(ledger)
+        if ledger.is_personal:
+            return Response(
+                {'error': 'Personal ledgers cannot be deleted'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # The whole ledger goes, so its rows need no tombstones or audit entries.
+        # Transactions go first since they protect their categories.
+        with transaction.atomic(), deletions_unrecorded(), audit.unrecorded():
+            # Members are read now, before their memberships go with the ledger
+            publish_resync(ledger.pk)
+            ledger.transactions.all().delete()
+            ledger.delete()
+            hot_cache.invalidate(ledger.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['get', 'post'])
+    def members(self, request, pk=None):
+        """
+        List the ledger's members, or add one by username (owner only)
+        """
+        ledger = self.get_object()
+        if request.method == 'GET':
+            members = ledger.memberships.select_related('user')
+            return Response(LedgerMemberSerializer(members, many=True).data)
+        
+        self._check_owner(ledger)
+        if ledger.is_personal:
+            return Response(
+                {'error': 'Personal ledgers cannot be shared. Create a shared ledger instead.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = LedgerMemberSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with unique_violation_as_validation_error(DUPLICATE_MEMBER):
+            serializer.save(ledger=ledger)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['patch', 'delete'], url_path=r'members/(?P<user_id>[0-9]+)')
+    def member(self, request, pk=None, user_id=None):
+        """
+        Change a member's role (owner only), or remove a member; members may remove themselves
+        """
+        ledger = self.get_object()
+        membership = get_object_or_404(ledger.memberships, user_id=user_id)
+        if not (request.method == 'DELETE' and membership.user_id == request.user.pk):
+            self._check_owner(ledger)
+        if membership.role == 'owner':
+            return Response(
+                {'error': 'The owner cannot be changed or removed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if request.method == 'DELETE':
+            membership.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = LedgerMemberSerializer(membership, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the API server: ``gunicorn budget_tracker.asgi:application``.
+
+With ``preload_app`` (the default) the master loads Django and warms it up once,
+then forks the workers. They start with every module imported instead of each
+importing the same modules on its own when its first request arrives. Every
+setting can be overridden from the environment; raise ``WEB_CONCURRENCY`` only
+with shared state, as the README's hot cache and live events sections describe.
+"""
+import os
+
+from decouple import config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Caches, throttle counters and live events are per process unless REDIS_URL and a
+# cross-process EVENTS_BACKEND are set, so only then does the default go past one worker
+shared_state = bool(config('REDIS_URL', default='')) and (
+    config('EVENTS_BACKEND', default='finances.events.LocalBroker') != 'finances.events.LocalBroker'
+)
+workers = config('WEB_CONCURRENCY', default=2 if shared_state else 1, cast=int)
+worker_class = config('GUNICORN_WORKER_CLASS', default='uvicorn.workers.UvicornWorker')
+preload_app = config('GUNICORN_PRELOAD', default=True, cast=bool)
+timeout = config('GUNICORN_TIMEOUT', default=30, cast=int)
+
+
+def on_starting(server):
+    if server.cfg.preload_app:
+        from budget_tracker.warmup import warm_up
+        warm_up()
+
+
+def post_fork(server, worker):
+    # Workers must not share a connection the master may have opened while loading
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
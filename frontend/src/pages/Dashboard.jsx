@@ -1,27 +1,123 @@
 import { useState, useEffect, useRef } from 'react'
 import * as d3 from 'd3'
 import api from '../services/api'
+import { subscribeToChanges } from '../services/events'
 import './Dashboard.css'
 
+// Add (sign 1) or remove (sign -1) one transaction from a list of category totals
+const adjustCategories = (items, transaction, sign) => {
+  const amount = sign * parseFloat(transaction.amount)
+  const existing = items.find((item) => item.category_id === transaction.category)
+  const updated = existing
+    ? items.map((item) => item === existing ? { ...item, amount: item.amount + amount } : item)
+    : [...items, { category: transaction.category_name, category_id: transaction.category, amount }]
+  return updated
+    .filter((item) => item.amount > 0.005)
+    .sort((a, b) => b.amount - a.amount)
+}
+
+// Apply a transaction delta to the summary, or return null when only a refetch can
+// (e.g. a transaction in another currency than the summary's)
+const applyTransaction = (summary, transaction, sign) => {
+  if (!summary || transaction.currency !== summary.currency) {
+    return null
+  }
+  const amount = sign * parseFloat(transaction.amount)
+  const isIncome = transaction.type === 'income'
+  const totalIncome = parseFloat(summary.total_income) + (isIncome ? amount : 0)
+  const totalExpenses = parseFloat(summary.total_expenses) + (isIncome ? 0 : amount)
+
+  const month = transaction.date.slice(0, 7)
+  const trend = summary.monthly_trend.some((entry) => entry.month === month)
+    ? summary.monthly_trend
+    : [...summary.monthly_trend, { month, income: 0, expense: 0 }].sort((a, b) => a.month.localeCompare(b.month))
+
+  return {
+    ...summary,
+    total_income: totalIncome.toFixed(2),
+    total_expenses: totalExpenses.toFixed(2),
+    balance: (totalIncome - totalExpenses).toFixed(2),
+    income_by_category: isIncome
+      ? adjustCategories(summary.income_by_category, transaction, sign)
+      : summary.income_by_category,
+    expense_by_category: isIncome
+      ? summary.expense_by_category
+      : adjustCategories(summary.expense_by_category, transaction, sign),
+    monthly_trend: trend.map((entry) => entry.month === month
+      ? { ...entry, [transaction.type]: entry[transaction.type] + amount }
+      : entry),
+  }
+}
+
 const Dashboard = () => {
   const [summary, setSummary] = useState(null)
+  const [recent, setRecent] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const chartRef = useRef(null)
+  const summaryRef = useRef(null)
 
   useEffect(() => {
     fetchSummary()
+    fetchRecent()
   }, [])
 
+  // Redraw after every load and live patch; the ref lets the event handler read the latest summary
   useEffect(() => {
+    summaryRef.current = summary
     if (summary && summary.expense_by_category.length > 0) {
       drawChart()
     }
   }, [summary])
 
-  const fetchSummary = async () => {
+  // Keep the summary current from live change events instead of refetching
+  useEffect(() => {
+    const handleChange = (type, data) => {
+      // The recent list is served from the server's hot cache, so refetching it is cheap
+      if (type.startsWith('transaction.') || type === 'category.updated') {
+        fetchRecent()
+      }
+      const current = summaryRef.current
+      if (!current) {
+        return
+      }
+      let next = current
+      if (type === 'category.updated') {
+        const rename = (items) => items.map((item) => item.category_id === data.id ? { ...item, category: data.name } : item)
+        next = {
+          ...current,
+          income_by_category: rename(current.income_by_category),
+          expense_by_category: rename(current.expense_by_category),
+        }
+      } else if (type.startsWith('transaction.')) {
+        if (type === 'transaction.deleted') {
+          next = applyTransaction(next, data, -1)
+        } else if (type === 'transaction.updated') {
+          next = data.previous ? applyTransaction(next, { ...data, ...data.previous }, -1) : null
+        }
+        if (next && type !== 'transaction.deleted') {
+          next = applyTransaction(next, data, 1)
+        }
+      }
+
+      if (next === null) {
+        fetchSummary(true)
+      } else if (next !== current) {
+        summaryRef.current = next
+        setSummary(next)
+      }
+    }
+    return subscribeToChanges(handleChange, () => {
+      fetchSummary(true)
+      fetchRecent()
+    })
+  }, [])
+
+  const fetchSummary = async (silent = false) => {
     try {
-      setLoading(true)
+      if (!silent) {
+        setLoading(true)
+      }
       const response = await api.get('/transactions/summary/')
       setSummary(response.data)
       setError(null)
@@ -33,6 +129,15 @@ const Dashboard = () => {
     }
   }
 
+  const fetchRecent = async () => {
+    try {
+      const response = await api.get('/transactions/recent/', { params: { limit: 5 } })
+      setRecent(response.data)
+    } catch (err) {
+      console.error(err)
+    }
+  }
+
   const drawChart = () => {
     // Clear previous chart
     d3.select(chartRef.current).selectAll('*').remove()
@@ -184,6 +289,23 @@ const Dashboard = () => {
               <p className="no-data">No expenses recorded</p>
             )}
           </div>
+          <div className="category-list">
+            <h3>Recent Transactions</h3>
+            {recent.length > 0 ? (
+              <ul>
+                {recent.map((item) => (
+                  <li key={item.id}>
+                    <span>{item.date} · {item.description || item.category_name}</span>
+                    <span className={item.type === 'income' ? 'amount-green' : 'amount-red'}>
+                      {parseFloat(item.amount).toFixed(2)} {item.currency}
+                    </span>
+                  </li>
+                ))}
+              </ul>
+            ) : (
+              <p className="no-data">No transactions yet</p>
+            )}
+          </div>
         </div>
       </div>
     </div>
@@ -1,5 +1,6 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import api from '../services/api'
+import { subscribeToChanges } from '../services/events'
 import TransactionForm from '../components/TransactionForm'
 import TransactionList from '../components/TransactionList'
 import TransactionFilters from '../components/TransactionFilters'
@@ -23,6 +24,47 @@ const Transactions = () => {
     fetchTransactions()
   }, [filters, currentPage])
 
+  // The event handler is registered once, so it reads the latest view state from refs
+  const viewRef = useRef({ filters, currentPage, transactions })
+  const refetchRef = useRef(null)
+  useEffect(() => {
+    viewRef.current = { filters, currentPage, transactions }
+    refetchRef.current = fetchTransactions
+  })
+
+  // Apply live changes to the visible page instead of polling
+  useEffect(() => {
+    const handleChange = (type, data) => {
+      if (type.startsWith('category.')) {
+        fetchCategories()
+        return
+      }
+      if (!type.startsWith('transaction.')) {
+        return
+      }
+
+      const { filters: activeFilters, currentPage: page, transactions: visible } = viewRef.current
+      const unfiltered = Object.values(activeFilters).every((value) => !value)
+      if (type === 'transaction.updated') {
+        setTransactions((current) => current.map((item) => item.id === data.id ? { ...item, ...data } : item))
+      } else if (type === 'transaction.deleted') {
+        setTransactions((current) => current.filter((item) => item.id !== data.id))
+        setPagination((current) => ({ ...current, count: Math.max(0, current.count - 1) }))
+      } else if (visible.some((item) => item.id === data.id)) {
+        // Our own write, already picked up by the refetch after saving
+        return
+      } else if (unfiltered && page === 1) {
+        // Newest first: a new transaction belongs on the first page
+        setTransactions((current) => [data, ...current].sort((a, b) => b.date.localeCompare(a.date)).slice(0, 10))
+        setPagination((current) => ({ ...current, count: current.count + 1 }))
+      } else {
+        // Whether it matches the filters or page is decided by the server
+        refetchRef.current()
+      }
+    }
+    return subscribeToChanges(handleChange, () => refetchRef.current())
+  }, [])
+
   const fetchCategories = async () => {
     try {
       console.log('Fetching categories...')
@@ -28,5 +28,6 @@ api.interceptors.response.use(
   }
 )
 
+export { API_BASE_URL }
 export default api
 
@@ -0,0 +1,32 @@
+import { API_BASE_URL } from './api'
+
+const CHANGE_EVENTS = ['transaction', 'budget', 'category'].flatMap(
+  (model) => ['created', 'updated', 'deleted'].map((action) => `${model}.${action}`)
+)
+
+// Listen for the current user's change events from /api/events/.
+// onChange(type, data) receives each delta; onResync() means deltas were missed
+// and the caller should refetch. Returns a function that closes the stream.
+export const subscribeToChanges = (onChange, onResync) => {
+  const token = localStorage.getItem('token')
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {}
+  }
+
+  // EventSource cannot send headers, so the token goes in the query string
+  const source = new EventSource(`${API_BASE_URL}/events/?token=${encodeURIComponent(token)}`)
+  const handleChange = (event) => onChange(event.type, JSON.parse(event.data).data)
+  CHANGE_EVENTS.forEach((type) => source.addEventListener(type, handleChange))
+  source.addEventListener('resync', () => onResync())
+
+  // After a reconnect, anything sent while disconnected was lost
+  let connected = false
+  source.onopen = () => {
+    if (connected) {
+      onResync()
+    }
+    connected = true
+  }
+
+  return () => source.close()
+}